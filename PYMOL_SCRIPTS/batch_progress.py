@@ -0,0 +1,213 @@
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+
+class BatchProgress:
+    """
+    Progress of a batch whose total work is known up front (e.g. PDBs x methods of the predictions,
+    ORs of the consensus or of the PyMol scripts): done / failed / skipped / in-flight jobs,
+    the throughput over the last WINDOW jobs and the ETA derived from it.
+
+        with BatchProgress("consensus", total=len(ors)) as progress:
+            for sub in ors:
+                if up_to_date(sub):
+                    progress.skip(sub)
+                    continue
+                with progress.job(sub):      # an exception marks the job failed and is re-raised
+                    build(sub)
+
+    Without the with-block, finish() ends the batch; batches still running at exit are recorded as aborted.
+    The state is logged at most every REPORT_SECONDS (and when the batch ends). After configure() the
+    batches of the run are also written to {log_dir}/progress_{run_name}.json (replaced atomically,
+    at most every WRITE_SECONDS), for other tools to poll:
+
+        {"run": "main_250131_1200", "updated": "2025-01-31 12:30:00",
+         "batches": {"predictions": {"total": 800, "done": 120, "failed": 2, "skipped": 0, "in_flight": ["HsOR1_1:cspf"],
+                                     "remaining": 678, "status": "running", "started": "2025-01-31 12:00:00",
+                                     "elapsed_seconds": 1800.0, "jobs_per_minute": 4.1, "eta_seconds": 9922.0,
+                                     "eta": "2025-01-31 15:15:22", "last_error": null}}}
+    """
+
+    REPORT_SECONDS = 10.0
+    WRITE_SECONDS = 1.0
+    # Jobs of the moving average throughput (skipped jobs take no time and are not counted)
+    WINDOW = 20
+
+    _path: str | None = None
+    _run: str | None = None
+    _batches: dict[str, "BatchProgress"] = {}
+    _lock = threading.RLock()
+    _written = 0.0
+    _registered = False
+
+    @classmethod
+    def configure(cls, log_dir, run_name: str) -> str:
+        """Starts writing the status of this run's batches to {log_dir}/progress_{run_name}.json, returns the path."""
+        os.makedirs(log_dir, exist_ok=True)
+        cls._run = run_name
+        cls._path = os.path.join(log_dir, f"progress_{run_name}.json")
+        cls._batches = {}
+        if not cls._registered:
+            atexit.register(cls.abort_running)
+            cls._registered = True
+        return cls._path
+
+    @classmethod
+    def abort_running(cls) -> None:
+        for batch in list(cls._batches.values()):
+            batch.finish("aborted")
+
+    def __init__(self, name: str, total: int, unit: str = "jobs"):
+        self.name = name
+        self.total = total
+        self.unit = unit
+        self.done = 0
+        self.failed = 0
+        self.skipped = 0
+        self.in_flight: dict[str, float] = {}
+        self.last_error: str | None = None
+        self.status = "running"
+        self.started = datetime.now()
+        self.start = time.monotonic()
+        self.end: float | None = None
+        self.finish_times: deque[float] = deque(maxlen=self.WINDOW + 1)
+        self.reported = self.start
+        with self._lock:
+            type(self)._batches[name] = self
+        self._changed(force=True)
+
+    def __enter__(self) -> "BatchProgress":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.finish("aborted" if exc_type is not None else "finished")
+
+    @property
+    def remaining(self) -> int:
+        return max(self.total - self.done - self.failed - self.skipped, 0)
+
+    def jobs_per_second(self) -> float | None:
+        """Moving average throughput: jobs finished over the last WINDOW jobs (since the start for the first ones)"""
+        times = self.finish_times
+        if not times:
+            return None
+        if len(times) == times.maxlen:
+            jobs, seconds = len(times) - 1, times[-1] - times[0]
+        else:
+            jobs, seconds = len(times), times[-1] - self.start
+        return jobs / seconds if seconds > 0 else None
+
+    def eta_seconds(self) -> float | None:
+        rate = self.jobs_per_second()
+        if self.remaining == 0:
+            return 0.0
+        return self.remaining / rate if rate else None
+
+    def started_job(self, name: str) -> None:
+        with self._lock:
+            self.in_flight[name] = time.monotonic()
+        self._changed()
+
+    def finished_job(self, name: str, error: str | None = None) -> None:
+        with self._lock:
+            self.in_flight.pop(name, None)
+            self.finish_times.append(time.monotonic())
+            if error is None:
+                self.done += 1
+            else:
+                self.failed += 1
+                self.last_error = f"{name}: {error}"
+        self._changed()
+
+    def skip(self, name: str) -> None:
+        """A job with nothing to do (e.g. up to date), counts as completed but not in the throughput"""
+        with self._lock:
+            self.in_flight.pop(name, None)
+            self.skipped += 1
+        self._changed()
+
+    @contextmanager
+    def job(self, name: str):
+        self.started_job(name)
+        try:
+            yield
+        except BaseException as e:
+            self.finished_job(name, f"{type(e).__name__}: {e}")
+            raise
+        self.finished_job(name)
+
+    def finish(self, status: str = "finished") -> None:
+        with self._lock:
+            if self.status != "running":
+                return
+            self.status = status
+            self.end = time.monotonic()
+        self._changed(force=True)
+
+    def state(self) -> dict:
+        rate = self.jobs_per_second()
+        eta = self.eta_seconds()
+        return {
+            "total": self.total,
+            "done": self.done,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "in_flight": list(self.in_flight),
+            "remaining": self.remaining,
+            "status": self.status,
+            "started": self.started.strftime("%Y-%m-%d %H:%M:%S"),
+            "elapsed_seconds": round((self.end or time.monotonic()) - self.start, 1),
+            "jobs_per_minute": round(60 * rate, 2) if rate else None,
+            "eta_seconds": round(eta, 1) if eta is not None else None,
+            "eta": (datetime.now() + timedelta(seconds=eta)).strftime("%Y-%m-%d %H:%M:%S") if eta is not None else None,
+            "last_error": self.last_error,
+        }
+
+    def describe(self) -> str:
+        state = self.state()
+        completed = self.done + self.failed + self.skipped
+        text = (f"{self.name}: {completed}/{self.total} {self.unit} ({self.done} done, {self.failed} failed, "
+                f"{self.skipped} skipped, {len(self.in_flight)} in flight)")
+        if state["jobs_per_minute"] is not None:
+            text += f", {state['jobs_per_minute']:.2f} {self.unit}/min"
+        if self.status != "running":
+            text += f", {self.status} in {timedelta(seconds=round(state['elapsed_seconds']))}"
+        elif state["eta_seconds"] is not None:
+            text += f", ETA {timedelta(seconds=round(state['eta_seconds']))} ({state['eta']})"
+        return text
+
+    def _changed(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if force or now - self.reported >= self.REPORT_SECONDS:
+            if force and self.status == "running" and self.done + self.failed + self.skipped == 0:
+                logger.info("%s: %d %s to process", self.name, self.total, self.unit)
+            else:
+                logger.info("%s", self.describe())
+            self.reported = now
+        type(self)._write_status(force)
+
+    @classmethod
+    def _write_status(cls, force: bool = False) -> None:
+        with cls._lock:
+            now = time.monotonic()
+            if cls._path is None or (not force and now - cls._written < cls.WRITE_SECONDS):
+                return
+            cls._written = now
+            status = {"run": cls._run, "updated": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                      "batches": {name: batch.state() for name, batch in cls._batches.items()}}
+            tmp_path = f"{cls._path}.tmp"
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(status, f, indent=2)
+                os.replace(tmp_path, cls._path)
+            except OSError as e:
+                logger.warning(f"Could not write progress status {cls._path}: {e}")
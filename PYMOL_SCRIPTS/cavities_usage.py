@@ -1,3 +1,10 @@
+import fnmatch
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+
 class CavitiesUsage:
     # Allowed values for non-"REST" keys
     ALLOWED_VALUES = ('1', '2', '3', '4', '5')
@@ -13,45 +20,61 @@ class CavitiesUsage:
         Raises:
             ValueError: If the structure or values are invalid.
         """
-        # Allow empty dictionaries (e.g., empty YAML or only comments)
-        if not yaml_dict:
-            return True
+        # All the entries are validated while compiling the resolver
+        cls.compile(yaml_dict)
+        return True
 
-        if not isinstance(yaml_dict, list):
-            raise ValueError("Expected a list of dictionaries.")
+    @classmethod
+    def verify_entry(cls, item) -> tuple[str, str]:
+        """
+        Verifies a single '- KEY: "MASK"' entry, returns (key, value).
 
-        for item in yaml_dict:
-            if not isinstance(item, dict) or len(item) != 1:
-                raise ValueError(f"Each item must be a single-key dictionary: got {item}")
+        Raises:
+            ValueError: If the structure or values are invalid.
+        """
+        if not isinstance(item, dict) or len(item) != 1:
+            raise ValueError(f"Each item must be a single-key dictionary: got {item}")
 
-            key, value = next(iter(item.items()))
+        key, value = next(iter(item.items()))
 
-            # Check key type
-            if not isinstance(key, str):
-                raise ValueError(f"Key '{key}' is not a string.")
+        # Check key type
+        if not isinstance(key, str):
+            raise ValueError(f"Key '{key}' is not a string.")
 
-            # Check value type
-            if not isinstance(value, str):
-                raise ValueError(f"Value for key '{key}' is not a string. ({value})")
+        # Check value type
+        if not isinstance(value, str):
+            raise ValueError(f"Value for key '{key}' is not a string. ({value})")
 
-            # For "REST" key "0" value is allowed - to skip all non-specified ORs
-            if key == "REST" and value == "0":
-                return True
+        # For "REST" key "0" value is allowed - to skip all non-specified ORs
+        if key == "REST" and value == "0":
+            return key, value
 
-            # Check value length
-            if len(value) != 4:
-                raise ValueError(f"Value for key '{key}' must be 4 characters long. Got: '{value}'")
+        # Check value length
+        if len(value) != 4:
+            raise ValueError(f"Value for key '{key}' must be 4 characters long. Got: '{value}'")
 
-            # Check value content
-            if not all(c in cls.ALLOWED_VALUES for c in value):
-                raise ValueError(
-                    f"Value for key '{key}' contains invalid characters: '{value}'. Allowed: {cls.ALLOWED_VALUES}.")
+        # Check value content
+        if not all(c in cls.ALLOWED_VALUES for c in value):
+            raise ValueError(
+                f"Value for key '{key}' contains invalid characters: '{value}'. Allowed: {cls.ALLOWED_VALUES}.")
 
-        return True
+        return key, value
+
+    @classmethod
+    def compile(cls, yaml_dict) -> "CavityMaskResolver":
+        """
+        Validates the use_cavities.yaml object once and builds the resolver for it.
+        An already compiled resolver is returned as is, None (empty YAML) gives an empty resolver.
+        """
+        if isinstance(yaml_dict, CavityMaskResolver):
+            return yaml_dict
+        return CavityMaskResolver(yaml_dict)
 
     from typing import List, Dict
     @classmethod
     def has_rest_zero(cls, yaml_dict: List[Dict[str, str]]) -> bool:
+        if isinstance(yaml_dict, CavityMaskResolver):
+            return yaml_dict.rest_zero
         return any(key == "REST" and value == "0"
                    for item in yaml_dict
                    for key, value in item.items()
@@ -72,3 +95,99 @@ class CavitiesUsage:
             if target_key in item:
                 return item[target_key]
         return None  # Key not found
+
+
+
+class CavityMaskResolver:
+    """
+    Compiled use_cavities.yaml: resolves the cavity mask of any OR without walking the YAML list.
+
+    Keys are resolved in this order:
+        1. exact OR names                        - hash index, O(1)
+        2. family rules, in the order of the file, the first matching wins:
+              glob patterns (containing * ? or [...]), e.g.  - HsOR1A*: "1112"
+              regular expressions prefixed by 're:',   e.g.  - "re:HsOR(5|7)\\d+_1": "2111"
+        3. REST: the mask for all the other ORs, or "0" to skip them
+    Resolved masks are cached per OR name.
+    """
+
+    REST_KEY = "REST"
+    REGEX_PREFIX = "re:"
+    GLOB_CHARS = ("*", "?", "[")
+
+    def __init__(self, yaml_dict=None):
+        if yaml_dict and not isinstance(yaml_dict, list):
+            raise ValueError("Expected a list of dictionaries.")
+
+        self.exact: dict[str, str] = {}
+        self.rules: list[tuple[str, re.Pattern, str]] = []
+        self.rest_mask: str | None = None
+        self.rest_zero = False
+        self._cache: dict[str, tuple[bool, str | None]] = {}
+
+        for item in yaml_dict or []:
+            key, value = CavitiesUsage.verify_entry(item)
+
+            if key == self.REST_KEY:
+                if self.rest_zero or self.rest_mask is not None:
+                    logger.warning(f"Duplicate REST entry in cavities masks: '{value}' ignored, the first one is used")
+                elif value == "0":
+                    self.rest_zero = True
+                else:
+                    self.rest_mask = value
+            elif key.startswith(self.REGEX_PREFIX):
+                try:
+                    pattern = re.compile(key[len(self.REGEX_PREFIX):])
+                except re.error as e:
+                    raise ValueError(f"Key '{key}' is not a valid regular expression: {e}")
+                self.rules.append((key, pattern, value))
+            elif any(c in key for c in self.GLOB_CHARS):
+                self.rules.append((key, re.compile(fnmatch.translate(key)), value))
+            elif key in self.exact:
+                logger.warning(f"Duplicate cavities mask for '{key}': '{value}' ignored, the first one '{self.exact[key]}' is used")
+            else:
+                self.exact[key] = value
+
+    def __bool__(self):
+        return bool(self.exact or self.rules or self.rest_mask is not None or self.rest_zero)
+
+    @property
+    def exact_keys(self) -> list[str]:
+        return list(self.exact)
+
+    def _match(self, or_name: str) -> tuple[bool, str | None]:
+        """Returns (matched explicitly by an exact key or a family rule, mask), cached per OR name."""
+        if or_name in self._cache:
+            return self._cache[or_name]
+
+        mask = self.exact.get(or_name)
+        matched = mask is not None
+        if not matched:
+            for _, pattern, value in self.rules:
+                if pattern.fullmatch(or_name):
+                    mask, matched = value, True
+                    break
+        if not matched and not self.rest_zero:
+            mask = self.rest_mask
+
+        self._cache[or_name] = (matched, mask)
+        return matched, mask
+
+    def resolve(self, or_name: str) -> str | None:
+        """Cavity mask for the OR, None if the default strategy is to be applied (or the OR is skipped by REST: "0")."""
+        return self._match(or_name)[1]
+
+    def is_explicit(self, or_name: str) -> bool:
+        """True if the OR has its own entry: an exact key or a matching family rule."""
+        return self._match(or_name)[0]
+
+    def select(self, or_names: list[str]) -> list[str]:
+        """
+        ORs to process: with REST: "0" only the exact keys (in the file order) and the ORs matching a family rule,
+        otherwise all of or_names.
+        """
+        if not self.rest_zero:
+            return list(or_names)
+
+        exact_set = set(self.exact)
+        return self.exact_keys + [name for name in or_names if name not in exact_set and self.is_explicit(name)]
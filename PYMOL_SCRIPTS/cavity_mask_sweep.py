@@ -0,0 +1,170 @@
+import itertools
+import logging
+import os
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+from consensus_builder import ConsensusBuilder
+from pymol_scripts_exception import PymolScriptsException
+
+logger = logging.getLogger(__name__)
+
+
+class CavityMaskSweep:
+    """
+    Exhaustive search over all cavity masks of an OR (5 cavities ^ 4 methods = 625 masks).
+
+    All cavities of all four methods are loaded once and represented as bitsets over the OR residues
+    (python int, bit i set if residue i belongs to the cavity), so agreement of any mask is computed
+    with bitwise AND / OR and popcount only.
+    Metrics:
+        jaccard      - mean pairwise Jaccard index |A & B| / |A | B| over the 6 method pairs
+        intersection - sum of pairwise intersection sizes |A & B| over the 6 method pairs
+    """
+
+    METHOD_KEYS = ["cspf", "cvpl", "p2rk", "pupp"]
+    METRICS = ("jaccard", "intersection")
+    CAVITY_NUMBERS = (1, 2, 3, 4, 5)
+
+    @classmethod
+    def load_cavity_bitsets(cls, sub_path) -> dict[str, dict[int, int]]:
+        """
+        Reads the 4 method workbooks of the OR once and returns method -> {cavity number -> residue bitset}.
+        Cavities missing in a workbook (or empty) are not present in the result.
+        """
+        files_found = ConsensusBuilder.find_method_files(sub_path, cls.METHOD_KEYS)
+
+        residue_bits: dict[str, int] = {}
+        bitsets: dict[str, dict[int, int]] = {}
+        for key in cls.METHOD_KEYS:
+            fpath = files_found[key]
+            if fpath == '':
+                raise PymolScriptsException(f"Missing required file containing '{key}' in {sub_path}, cannot sweep cavity masks")
+
+            bitsets[key] = {}
+            for cavity_number, (seq_ids, _) in ConsensusBuilder.read_all_cavities(fpath).items():
+                bits = 0
+                for seq_id in seq_ids:
+                    # Seq IDs may come as int or str depending on the method workbook
+                    residue = str(int(seq_id)) if isinstance(seq_id, (int, float)) else str(seq_id).strip()
+                    bit = residue_bits.setdefault(residue, len(residue_bits))
+                    bits |= 1 << bit
+                if bits:
+                    bitsets[key][cavity_number] = bits
+
+        return bitsets
+
+    @classmethod
+    def rank_masks(cls, bitsets: dict[str, dict[int, int]], metric: str = "jaccard") -> pd.DataFrame:
+        """
+        Scores every mask (cspf, cvpl, p2rk, pupp cavity numbers) and returns them ranked, best first.
+        Pairwise agreement is computed once per pair of cavities (6 pairs x 25 cavity combinations),
+        each mask score is then the sum of its 6 pair scores.
+        """
+        if metric not in cls.METRICS:
+            raise PymolScriptsException(f"Unknown cavity mask sweep metric '{metric}', allowed: {cls.METRICS}")
+
+        pairs = list(itertools.combinations(range(len(cls.METHOD_KEYS)), 2))
+        pair_scores: dict[tuple[int, int], dict[tuple[int, int], float]] = {}
+        for i, j in pairs:
+            table = {}
+            for ci, bits_i in bitsets[cls.METHOD_KEYS[i]].items():
+                for cj, bits_j in bitsets[cls.METHOD_KEYS[j]].items():
+                    common = (bits_i & bits_j).bit_count()
+                    if metric == "jaccard":
+                        table[(ci, cj)] = common / (bits_i | bits_j).bit_count()
+                    else:
+                        table[(ci, cj)] = float(common)
+            pair_scores[(i, j)] = table
+
+        rows = []
+        available = [sorted(bitsets[key]) for key in cls.METHOD_KEYS]
+        for mask in itertools.product(*available):
+            score = sum(pair_scores[(i, j)][(mask[i], mask[j])] for i, j in pairs)
+            if metric == "jaccard":
+                score /= len(pairs)
+
+            common_all = bitsets["cspf"][mask[0]] & bitsets["cvpl"][mask[1]] & bitsets["p2rk"][mask[2]] & bitsets["pupp"][mask[3]]
+            rows.append({
+                "mask": "".join(str(c) for c in mask),
+                "score": round(score, 4),
+                "common_all": common_all.bit_count(),
+                "cspf": mask[0],
+                "cvpl": mask[1],
+                "p2rk": mask[2],
+                "pupp": mask[3],
+            })
+
+        df = pd.DataFrame(rows, columns=["mask", "score", "common_all", "cspf", "cvpl", "p2rk", "pupp"])
+        # Ties are resolved by the 4-method common residues, then by the lowest cavity numbers
+        df = df.sort_values(["score", "common_all", "mask"], ascending=[False, False, True], ignore_index=True)
+        df.insert(0, "rank", range(1, len(df) + 1))
+        return df
+
+    @classmethod
+    def sweep_multi_or_folder(cls, pm_input_dir: str, metric: str = "jaccard", top: int = 10) -> tuple[str, str]:
+        """
+        Runs the sweep for every OR subdirectory of pm_input_dir.
+        Writes (next to pm_input_dir, in the data lake):
+            mask_sweep_{timestamp}.xlsx                - 'Best masks' sheet and the top ranked masks per OR
+            use_cavities_suggested_{timestamp}.yaml    - best mask per OR in use_cavities.yaml format
+
+        Returns paths of both files.
+        """
+        started = datetime.now()
+        ranked_per_or: dict[str, pd.DataFrame] = {}
+
+        for sub in sorted(os.listdir(pm_input_dir)):
+            sub_path = Path(pm_input_dir) / sub
+            if not sub_path.is_dir():
+                continue
+
+            try:
+                bitsets = cls.load_cavity_bitsets(sub_path)
+            except PymolScriptsException as e:
+                logger.warning(f"Cavity mask sweep skipped for {sub}: {e}")
+                continue
+
+            empty_methods = [key for key in cls.METHOD_KEYS if not bitsets[key]]
+            if empty_methods:
+                logger.warning(f"Cavity mask sweep skipped for {sub}: no cavities found for {empty_methods}")
+                continue
+
+            ranked = cls.rank_masks(bitsets, metric)
+            ranked_per_or[sub] = ranked
+            best = ranked.iloc[0]
+            logger.info(f"Cavity mask sweep for {sub}: {len(ranked)} masks scored, best mask {best['mask']} ({metric} {best['score']})")
+
+        if not ranked_per_or:
+            raise PymolScriptsException(f"No OR subdirectory of {pm_input_dir} could be swept")
+
+        data_lake_dir = os.path.dirname(os.path.normpath(pm_input_dir))
+        timestamp = started.strftime("%y%m%d_%H%M%S")
+        xlsx_path = os.path.join(data_lake_dir, f"mask_sweep_{timestamp}.xlsx")
+        yaml_path = os.path.join(data_lake_dir, f"use_cavities_suggested_{timestamp}.yaml")
+
+        best_rows = []
+        top_rows = []
+        for or_name, ranked in ranked_per_or.items():
+            best_rows.append({"OR": or_name, **ranked.iloc[0].to_dict()})
+            top_rows.append(ranked.head(top).assign(OR=or_name))
+
+        top_df = pd.concat(top_rows, ignore_index=True)
+        top_df = top_df[["OR"] + [c for c in top_df.columns if c != "OR"]]
+        with pd.ExcelWriter(xlsx_path, engine='openpyxl') as writer:
+            pd.DataFrame(best_rows).to_excel(writer, sheet_name="Best masks", index=False)
+            top_df.to_excel(writer, sheet_name=f"Top {top} masks", index=False)
+
+        with open(yaml_path, "w") as f:
+            f.write(f"# Suggested cavity masks, generated by the cavity mask sweep ({metric}) at {started.strftime('%Y-%m-%d %H:%M:%S')}\n")
+            f.write("# Review and copy the wanted lines to use_cavities.yaml\n")
+            f.write("#  OR\t        cspf cvpl p2rk pupp\n")
+            for row in best_rows:
+                f.write(f"- {row['OR']}: \"{row['mask']}\"  # {metric} {row['score']}, common to all 4: {row['common_all']}\n")
+
+        elapsed = (datetime.now() - started).total_seconds()
+        logger.info(f"Cavity mask sweep completed for {len(ranked_per_or)} ORs in {elapsed:.2f} s")
+        logger.info(f"Ranked masks written to {xlsx_path}, suggested masks written to {yaml_path}")
+        return xlsx_path, yaml_path
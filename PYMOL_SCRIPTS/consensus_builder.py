@@ -1,18 +1,23 @@
 from enum import Enum
-from datetime import datetime
 import os
 
 import pandas as pd
-from pandas import ExcelFile
 from pathlib import Path
 import logging
 import stat
 
-from pandas.core.common import consensus_name_attr
-
 from keyboard_input_handler import handle_pm_input_folders
 from pymol_scripts_exception import PymolScriptsException
-from cavities_usage import CavitiesUsage
+from cavities_usage import CavitiesUsage, CavityMaskResolver
+from batch_progress import BatchProgress
+from consensus_facts import ConsensusFactTable
+from consensus_manifest import ConsensusManifest
+from lake_repository import LakeRepository
+from run_manifest import RunManifest
+from stage_timer import StageTimer
+from consensus_result import ConsensusResult
+from consensus_rules import ConsensusRules, ConsensusRuleSet
+from pymol_selection import PymolSelection
 from score_handler import ScoreHandler
 
 
@@ -43,9 +48,101 @@ class ConsensusBuilder:
             # st_file_attributes does not exist on non-Windows
             return False
 
+    @classmethod
+    def find_method_files(cls, sub_path, required_keys: list[str]) -> dict[str, str]:
+        """
+        Searches the OR subdirectory for .xlsx files starting with the subdir name and containing
+        one of the required_keys ('cspf', 'cvpl', 'p2rk', 'pupp') in the filename.
+
+        Returns dictionary key -> file path ('' if the file for a key was not found).
+        Hidden files are excluded, a warning is written for unexpected .xlsx files (neither key nor consensus).
+        """
+        sub = os.path.basename(os.path.normpath(sub_path))
+        files_found = {k: '' for k in required_keys}
+
+        # Searching for non-expected files - not containing cspf,svpl,p2rk or pupp
+        # (just warning will be written if found),
+        # hidden excluded from the check, not starting from subdir name also excluded from the check
+        for fname in os.listdir(sub_path):
+            fpath = os.path.join(sub_path, fname)
+            if not fname.lower().endswith(".xlsx"):
+                continue
+
+            if ConsensusBuilder.is_file_hidden(fpath):
+                continue
+
+            # filename must start with subdir name
+            if not fname.lower().startswith(sub.lower()):
+                continue
+
+            # match keys
+            lower = fname.lower()
+            found = False
+            for key in required_keys:
+                if key in lower:
+                    files_found[key] = fpath
+                    found = True
+                    break
+
+            if not found and not "consensus" in lower:
+                logger.warning(f"file {fname} does not match any prediction key: {key}, and even is not consensus file, looks like something wrong in {sub_path}")
+        # Check completed
+
+        return files_found
+
+    @classmethod
+    def read_method_workbook(cls, fpath: str) -> dict[str, pd.DataFrame]:
+        """Reads all worksheets of a method workbook in one go: sheet name -> DataFrame."""
+        return pd.read_excel(fpath, sheet_name=None)
+
+    @classmethod
+    def read_all_cavities(cls, fpath: str) -> dict[int, tuple[list[int], list[str]]]:
+        """
+        Reads all 'Cavity 1'...'Cavity 5' worksheets of a method workbook in one go.
+
+        Returns dictionary: cavity number -> (seq_ids, aa_names), taken from the 3rd ('Seq ID')
+        and 4th ('AA') columns, missing worksheets are not present in the dictionary.
+        """
+        sheets = cls.read_method_workbook(fpath)
+        cavities = {}
+        for i in range(1, 6):
+            df = sheets.get(f"Cavity {i}")
+            if df is None:
+                continue
+            if df.shape[1] < 4:
+                logger.warning(f"Warning: File {fpath}, sheet Cavity {i} has fewer than 4 columns")
+                continue
+            cavities[i] = (df.iloc[:, 2].dropna().tolist(), df.iloc[:, 3].dropna().tolist())
+
+        return cavities
+
+    @classmethod
+    def cavity_seq_ids(cls, sheets: dict[str, pd.DataFrame]) -> dict[int, list]:
+        """
+        Residues of the 'Cavity 1'...'Cavity 5' worksheets of a read method workbook (see PymolSelection.residues_from_sheet),
+        the same residues pm_coloring.read_input_xlsx_files takes for the PyMol scripts.
+        """
+        return {i: PymolSelection.residues_from_sheet(sheets[f"Cavity {i}"])
+                for i in range(1, 6)
+                if f"Cavity {i}" in sheets and "Seq ID" in sheets[f"Cavity {i}"].columns}
+
+    @classmethod
+    def get_mask_to_apply(cls, sub: str, use_cavities_dict) -> str | None:
+        """
+        Returns the cavity mask (e.g. "1121") to apply for the OR sub, None if the default strategy is to be used.
+        use_cavities_dict is the compiled CavityMaskResolver (a raw use_cavities.yaml list is compiled on the fly).
+        """
+        # If use_cavities_dictionary is defined, the corresponding cavities should be applied for any strategy:
+        # explicit OR key, then OR family rules, then the REST mask (in case if it is not "0")
+        if not use_cavities_dict:
+            return None
+        return CavitiesUsage.compile(use_cavities_dict).resolve(sub)
+
     from typing import List, Dict
     @classmethod
-    def extract_seq_id_for_proper_cavity(cls, sub_path, strategy: StrategyName, use_cavities_dict: List[Dict[str, str]]=None) ->dict[str,tuple[int,list[int],list[str]]]:
+    @StageTimer.timed("extract_seq_id_for_proper_cavity", or_arg="sub_path")
+    def extract_seq_id_for_proper_cavity(cls, sub_path, strategy: StrategyName, use_cavities_dict: CavityMaskResolver | List[Dict[str, str]]=None,
+                                         workbooks: dict[str, dict[str, pd.DataFrame]] = None) ->dict[str,tuple[int,list[int],list[str]]]:
         """
         Searches  for 4 .xlsx files:
         containing 'cspf', 'cvpl', 'p2rk', 'pupp' in filenames AND starting with the subdir name.
@@ -56,22 +153,24 @@ class ConsensusBuilder:
             - prints warning if selected sheet != 'Cavity 1'
             - extracts the 3rd column ('Seq ID') as a list (truncated to actual rows)
 
+        workbooks (method key -> worksheets, see read_method_workbook) are used instead of reading the files again,
+        if they were already read by the caller.
+
         Returns dictionary:
             { 'cspf': [...], 'cvpl': [...], 'p2rk': [...], 'pupp': [...] }
         """
 
         ######### Internal method to search for a longest cavity worksheet #####################
         ########################################################################################
-        def get_longest_cavity_sheet(xls_file: ExcelFile)->tuple[str, int, int] | tuple[None, None, int]:
+        def get_longest_cavity_sheet(sheets: dict[str, pd.DataFrame])->tuple[str, int, int] | tuple[None, None, int]:
             max_rows = -1
             selected_sheet = None
             selected_cavity_number = None
 
             for i in range(1, 6):
                 sheet_name = f"Cavity {i}"
-                if sheet_name in xls_file.sheet_names:
-                    df = xls_file.parse(sheet_name)
-                    num_rows = len(df)
+                if sheet_name in sheets:
+                    num_rows = len(sheets[sheet_name])
                     if num_rows > max_rows:
                         max_rows = num_rows
                         selected_sheet = sheet_name
@@ -96,13 +195,13 @@ class ConsensusBuilder:
 
         ################### INTERNAL METHOD  select_cavity_sheet_by_strategy##########
         ##############################################################################
-        def select_cavity_sheet_by_strategy(strategy: StrategyName, xls: ExcelFile , key: str, required_keys: list[str])->tuple[str,int] | tuple[None, None]:
+        def select_cavity_sheet_by_strategy(strategy: StrategyName, xls: dict[str, pd.DataFrame], key: str, required_keys: list[str])->tuple[str,int] | tuple[None, None]:
             """
             Selects the cavity sheet based on the strategy and key.
 
             Args:
                 strategy (StrategyName): The strategy to use for selecting the cavity sheet.
-                xls: The Excel file object or data structure.
+                xls: Worksheets of the method workbook (sheet name -> DataFrame).
                 key: The key to check for special handling.
                 required_keys (list): List of required keys for special handling.
 
@@ -139,62 +238,24 @@ class ConsensusBuilder:
         # Getting or_name from the full path:
         sub = os.path.basename(os.path.normpath(sub_path))
         # Cavity mask should be defined for a sub, if use_cavities_dictionary is not None, strategy is to be used as a default mask
-        mask_to_apply: str | None = None
-        # If use_cavities_dictionary is defined, the corresponding cavities should be applied for any strategy
-
-        if use_cavities_dict:
-            # 1. First - need to check whether the sub_path is present explicitely. If yes
-            mask_to_apply = CavitiesUsage.get_value_for_key(yaml_dict=use_cavities_dict, target_key=sub)
-            # 2. If not present, apply the rest mask in case if it is not "O"
-            if None == mask_to_apply and not ConsensusBuilder.has_rest_zero(use_cavities_dict):
-                mask_to_apply = CavitiesUsage.get_value_for_key(yaml_dict=use_cavities_dict, target_key="REST")
-                pass
-        #ENDIF ENDIF
+        mask_to_apply = ConsensusBuilder.get_mask_to_apply(sub, use_cavities_dict)
 
         required_keys = ["cspf", "cvpl", "p2rk", "pupp"]
         results = {k: (-1,[]) for k in required_keys}
-        files_found = {k: '' for k in required_keys}
-
-        # Searching for non-expected files - not containing cspf,svpl,p2rk or pupp
-        # (just warning will be written if found),
-        # hidden excluded from the check, not starting from subdir name also excluded from the check
-        for fname in os.listdir(sub_path):
-            fpath = os.path.join(sub_path, fname)
-            if not fname.lower().endswith(".xlsx"):
-                continue
-
-            if ConsensusBuilder.is_file_hidden(fpath):
-                continue
-
-            # filename must start with subdir name
-            if not fname.lower().startswith(sub.lower()):
-                continue
-
-            # match keys
-            lower = fname.lower()
-            found = False
-            for key in required_keys:
-                if key in lower:
-                    files_found[key] = fpath
-                    found = True
-                    break
-
-            if not found and not "consensus" in lower:
-                logger.warning(f"file {fname} does not match any prediction key: {key}, and even is not consensus file, looks like something wrong in {sub_path}")
-        # Check completed
+        files_found = ConsensusBuilder.find_method_files(sub_path, required_keys)
 
         # INFO about strategy or explicit mask choice
         if None == mask_to_apply:
-            logger.info(f"\n!!!!or_name {sub} has no explicit mask, default strategy will be applied!!!")
+            logger.info("\n!!!!or_name %s has no explicit mask, default strategy will be applied!!!", sub)
         else:
-            logger.info(f"\n+++++++++for or_name {sub} using mask_to_apply {mask_to_apply}+++++++")
+            logger.info("\n+++++++++for or_name %s using mask_to_apply %s+++++++", sub, mask_to_apply)
 
         # process each of the 4 files
         for key, fpath in files_found.items():
             if fpath == '':
                 raise PymolScriptsException(f"Missing required file containing '{key}' in {sub_path}, not all files provided, cannot build consensus")
 
-            xls = pd.ExcelFile(fpath)
+            xls = workbooks[key] if workbooks and key in workbooks else ConsensusBuilder.read_method_workbook(fpath)
             selected_sheet = None
             selected_cavity_number = None
             # max_rows = -1
@@ -208,12 +269,15 @@ class ConsensusBuilder:
                 selected_cavity_number_str = mask_to_apply[zero_based_index]
                 selected_cavity_number= int (selected_cavity_number_str)
                 selected_sheet = get_cavity_sheet(selected_cavity_number)
-                logger.info(f"For OR_name {sub} choosing cavity {selected_cavity_number}  for key '{key}', cavity mask '{mask_to_apply}'")
+                logger.info("For OR_name %s choosing cavity %s  for key '%s', cavity mask '%s'",
+                            sub, selected_cavity_number, key, mask_to_apply)
 
             if selected_sheet != "Cavity 1":
                 logger.warning(f": {fpath} used '{selected_sheet}' instead of 'Cavity 1'")
 
-            df = xls.parse(selected_sheet)
+            if selected_sheet not in xls:
+                raise ValueError(f"Worksheet named '{selected_sheet}' not found in {fpath}")
+            df = xls[selected_sheet]
 
             # extract 3rd column ('Seq ID') and 4th ('AA')
             if df.shape[1] < 4:
@@ -228,35 +292,27 @@ class ConsensusBuilder:
         return results
 
     @classmethod
-    def consensus_function(cls, cspf: int, cvpl: int, p2rk: int, pupp: int,
-                           consensus_method: int) -> int:
-
-        if consensus_method == 1:
-            # default
-            return 1 if (cspf == 1 or p2rk == 1 or (cvpl == 1 and pupp == 1)) else 0
-        elif consensus_method == 2:
-            # exclude pupp, any other has 1
-            return 1 if  cspf + cvpl + p2rk >= 1 else 0
-
-        raise PymolScriptsException(f"Consensus Method {consensus_method} is incorrect, not implemented")
-
-
-
-
-    @classmethod
+    @StageTimer.timed("write_consensus_file", or_arg="sub")
     def write_consensus_file(cls,
                              sub: str,
                              best_cavity_ids: dict[str, tuple[int, list[int], list[str]]],
                              scores_map: dict[str, list[tuple[str, int, float]]],
                              output_dir: str,
-                             consensus_method: int) -> None:
+                             consensus_method: int,
+                             rule_set: ConsensusRuleSet = None) -> pd.DataFrame:
         """
         Creates an Excel consensus file for the given subdirectory.
         Output file: {sub}_consensus.xlsx
 
         Columns:
-            Seq ID | cspf | cvpl | p2rk | pupp
+            Seq ID | AA | plddt | cspf | cvpl | p2rk | pupp | consensus | consensus_<rule name>...
+
+        The 'consensus' column is built with the rule of consensus_method (1 or 2),
+        rule_set (if given) is evaluated instead, all its rules are written as separate columns in one pass.
+        Returns the written consensus table.
         """
+        if rule_set is None:
+            rule_set = ConsensusRules.build_rule_set(consensus_method)
 
         # Extract all (Seq ID, aa_name) tuples from all four prediction methods
         all_tuples = set()
@@ -275,33 +331,15 @@ class ConsensusBuilder:
         # Sort the tuples by seq_id in ascending order
         sorted_tuples = sorted(all_tuples, key=lambda x: x[0])
 
-        # Prepare table structure
-        rows = []
-        for seq_tuple in sorted_tuples:
-            cspf = 1 if seq_tuple[0] in best_cavity_ids.get("cspf", (None, []))[1] else 0
-            cvpl = 1 if seq_tuple[0] in best_cavity_ids.get("cvpl", (None, []))[1] else 0
-            p2rk = 1 if seq_tuple[0] in best_cavity_ids.get("p2rk", (None, []))[1] else 0
-            pupp = 1 if seq_tuple[0] in best_cavity_ids.get("pupp", (None, []))[1] else 0
-
-            # Consensus rule:
-            # chosen according to the method number (1,2 or 3)
-            consensus = ConsensusBuilder.consensus_function(cspf, cvpl, p2rk, pupp, consensus_method)
-            #1 if (cspf == 1 or p2rk == 1 or (cvpl == 1 and pupp == 1)) else 0
-
-            row = {
-                "Seq ID": seq_tuple[0],
-                "AA": seq_tuple[1],
-                "plddt": seq_tuple[2],
-                "cspf": cspf,
-                "cvpl": cvpl,
-                "p2rk": p2rk,
-                "pupp": pupp,
-                "consensus": consensus
-            }
-            rows.append(row)
-
-        # Create DataFrame
-        df = pd.DataFrame(rows, columns=["Seq ID","AA", "plddt", "cspf", "cvpl", "p2rk", "pupp", "consensus"])
+        # Prepare table structure: membership flag of each residue per prediction method
+        df = pd.DataFrame(sorted_tuples, columns=["Seq ID", "AA", "plddt"])
+        for method_key in ConsensusRules.METHOD_COLUMNS:
+            method_seq_ids = best_cavity_ids.get(method_key, (None, []))[1]
+            df[method_key] = df["Seq ID"].isin(method_seq_ids).astype(int)
+
+        # Consensus rules: all compiled rules are evaluated over the whole table at once
+        rule_columns = rule_set.evaluate(df)
+        df = pd.concat([df, rule_columns], axis=1)
 
         # Create subdirectory inside output_dir
         sub_output_dir = os.path.join(output_dir, sub)
@@ -309,38 +347,73 @@ class ConsensusBuilder:
 
         # Save Excel file inside that subdirectory
         out_path = os.path.join(sub_output_dir, f"{sub}_consensus.xlsx")
-        df.to_excel(out_path, index=False)
+        # Written under a temporary name and renamed: the previous file may be hard-linked into PM_OUTPUT
+        tmp_path = os.path.join(sub_output_dir, f".{sub}_consensus.tmp.xlsx")
+        df.to_excel(tmp_path, index=False)
+        os.replace(tmp_path, out_path)
 
-        logger.info(f"Consensus method used during preparation: {consensus_method}")
-        logger.info(f"Consensus file saved: {out_path} at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        logger.info("Consensus method used during preparation: %s, rules: %s", consensus_method, rule_set.as_dict())
+        logger.info("Consensus file saved: %s", out_path)
+        return df
 
     @classmethod
     def process_multi_or_folder(cls, pm_input_dir,
                                 best_cavity_strategy,
                                 use_cavities_dict=None,
                                 interactive_node=False,
-                                consensus_method_number = 1)->list[dict[str, str]]:
+                                consensus_method_number = 1,
+                                consensus_rules: dict[str, str] = None,
+                                fact_table: ConsensusFactTable = None,
+                                run_id: str = None,
+                                force: bool = False,
+                                repository: LakeRepository = None,
+                                or_names: list[str] = None)->tuple[CavityMaskResolver | None, dict[str, ConsensusResult]]:
         """
         Scans 1st-level subdirectories of the Selenium Output: sel_output_dir (except containing 'temp' and 'OLD'), extracts best cavities ids,
         Then constructs a consensus file according to the chosen strategy and writes it to pm_input_dir
         (there  are two possible consensus methods, by default is chosen 1)
+        consensus_rules (name -> expression, e.g. from [consensus_rules] of pm_config.ini) are written as
+        extra 'consensus_<name>' columns, all rules are compiled once per run
+        If fact_table is given, the consensus rows of all processed ORs are appended to it as run run_id
+        ORs whose inputs (method workbooks, pdb, cavity mask, strategy, rules) did not change since the last run
+        are skipped (see ConsensusManifest), force=True rebuilds all of them
         sel_output_dir works as a source (input) directory, pm_input_dir - as an output for consensus file
         Nevertheless the scores from pdb files are being read (sourced) from the pm_input_dir
+        use_cavities_dict is the use_cavities.yaml list or its compiled CavityMaskResolver,
+        returns the resolver of the finally applied masks (None if the default strategy was chosen for all)
+        and OR name -> ConsensusResult of the ORs built in this run, to be handed over to prepare_for_pymol
+        If repository (e.g. SqliteLakeRepository) is given, the method tables and pLDDT scores of the ORs it holds
+        are read from it instead of the workbooks and the PDB, and the built consensus is stored into it as well
+        or_names limits the run to these OR subdirectories (e.g. the ORs just staged), by default all of PM_INPUT
         """
 
         # Before iterate: select OR_NAMES (OR subdirectories) to process from PM_INPUT
-        pm_input_subdirs = os.listdir(pm_input_dir)
+        pm_input_subdirs = list(or_names) if or_names is not None else os.listdir(pm_input_dir)
 
         # Switching between interactive user mode
         skip_keyboard_input = not interactive_node
         subdir_names_to_iterate, final_cavities_dict = handle_pm_input_folders(pm_input_dir, pm_input_subdirs, use_cavities_dict, skip_keyboard_input)
+        # Cavity masks are validated and indexed once, every OR is then resolved by a dictionary lookup
+        if final_cavities_dict is not None:
+            final_cavities_dict = CavitiesUsage.compile(final_cavities_dict)
 
         # There might be several strategies to choose the best cavity (from the first 5 in 4 preriction methods)
         strategy = StrategyName(best_cavity_strategy)
 
+        # Consensus rules are compiled once and reused for all ORs
+        rule_set = ConsensusRules.build_rule_set(consensus_method_number, consensus_rules)
+
+        # Consensus rows of this run for the cross-OR fact table
+        run_facts = []
+        # In-memory results of the built ORs, PyMol scripts are generated from them without re-reading the files
+        results: dict[str, ConsensusResult] = {}
+        progress = BatchProgress("consensus", len(subdir_names_to_iterate), "ORs")
+
         # Creating an empty dictionary for each OR (.pdb file) to keep residue scores
         pdb_aa_scores: dict[str, list[tuple[str, int, float]]] = {}
 
+        repository_ors = set(repository.or_names()) if repository is not None else set()
+
         # iterate over first-level subdirectories
         for sub in subdir_names_to_iterate:
 
@@ -358,6 +431,7 @@ class ConsensusBuilder:
                 logger.warning(f"Expected exactly one .pdb file in {sub_path}, "
                                             f"found {len(pdb_files)}, skipping the {sub_path.name}, \n"
                                                  f"please, find {expected_pdb} and put it manually to {sub_path.name} and rerun the script")
+                progress.finished_job(sub, f"found {len(pdb_files)} .pdb files")
                 continue
 
             elif not (pdb_files[0] == expected_pdb):
@@ -365,20 +439,72 @@ class ConsensusBuilder:
                                             f"found {pdb_files[0].name}",
                                             f"please, find {expected_pdb} and put it manually to {sub_path.name} and rerun the script"
                                             )
+                progress.finished_job(sub, f"found {pdb_files[0].name} instead of {expected_pdb.name}")
                 continue
 
 
-            ScoreHandler.collect_subdir_plddt(sub, pm_input_dir, pdb_aa_scores)
+            # Skip the OR if its consensus was already built from exactly the same inputs
+            manifest = None
+            method_files = ConsensusBuilder.find_method_files(sub_path, list(ConsensusRules.METHOD_COLUMNS))
+            if all(method_files.values()):
+                input_files = {**method_files, "pdb": str(expected_pdb)}
+                # Hashes already recorded by the earlier stages are reused
+                run_manifest = RunManifest.read(sub_path)
+                known = {key: RunManifest.known_record(run_manifest, path) for key, path in input_files.items()}
+                manifest = ConsensusManifest.build(sub_path, input_files,
+                                                   ConsensusBuilder.get_mask_to_apply(sub, final_cavities_dict),
+                                                   strategy.value, consensus_method_number, rule_set.as_dict(),
+                                                   known={key: record for key, record in known.items() if record})
+                consensus_path = sub_path / f"{sub}_consensus.xlsx"
+                if not force and ConsensusManifest.is_consensus_current(sub_path, manifest, consensus_path):
+                    logger.info("Inputs of %s did not change since the last run, consensus is up to date, skipping", sub)
+                    # Refresh the recorded file timestamps, so unchanged (e.g. re-copied) files are not hashed again
+                    if manifest != ConsensusManifest.read(sub_path):
+                        ConsensusManifest.write(sub_path, manifest)
+                    progress.skip(sub)
+                    continue
+
+            if sub in repository_ors:
+                pdb_aa_scores[sub] = repository.read_plddt(sub)
+            else:
+                ScoreHandler.collect_subdir_plddt(sub, pm_input_dir, pdb_aa_scores)
             try:
-                best_cavity_ids = ConsensusBuilder.extract_seq_id_for_proper_cavity(sub_path, strategy, final_cavities_dict) # use_cavities_dict - previous version
-                ConsensusBuilder.write_consensus_file(sub, best_cavity_ids, pdb_aa_scores, pm_input_dir,
-                                                      consensus_method=consensus_method_number)
+                with progress.job(sub), RunManifest.stage(sub_path, "consensus") as run_parts:
+                    # Every method workbook is read once, for the consensus and for the PyMol scripts
+                    if sub in repository_ors:
+                        workbooks = repository.read_method_tables(sub)
+                    else:
+                        workbooks = {key: ConsensusBuilder.read_method_workbook(fpath) for key, fpath in method_files.items() if fpath}
+                    best_cavity_ids = ConsensusBuilder.extract_seq_id_for_proper_cavity(sub_path, strategy, final_cavities_dict, workbooks) # use_cavities_dict - previous version
+                    consensus_df = ConsensusBuilder.write_consensus_file(sub, best_cavity_ids, pdb_aa_scores, pm_input_dir,
+                                                                         consensus_method=consensus_method_number,
+                                                                         rule_set=rule_set)
+                    if repository is not None:
+                        repository.write_tables(sub, "consensus", {"Sheet1": consensus_df})
+                    results[sub] = ConsensusResult(sub, method_files,
+                                                   {key: ConsensusBuilder.cavity_seq_ids(sheets) for key, sheets in workbooks.items()},
+                                                   {key: best_cavity_ids[key][0] for key in ConsensusRules.METHOD_COLUMNS},
+                                                   consensus_df)
+                    mask_used = "".join(str(best_cavity_ids[key][0]) for key in ConsensusRules.METHOD_COLUMNS)
+                    if fact_table is not None:
+                        run_facts.append(ConsensusFactTable.to_facts(sub, consensus_df, mask_used, run_id))
+                    if manifest is not None:
+                        ConsensusManifest.write(sub_path, manifest)
+                    run_parts["consensus"] = RunManifest.file_record(sub_path / f"{sub}_consensus.xlsx",
+                                                                     rows=len(consensus_df),
+                                                                     consensus_size=int(consensus_df["consensus"].sum()),
+                                                                     mask=mask_used)
                 print("")
             except PymolScriptsException as e:
                 logger.error(f"Exception while processing {sub_path}: {e}")
                 logger.warning(f"Could not create consensus file for {sub}")
         # END for cycle
-        return final_cavities_dict
+        progress.finish()
+
+        if fact_table is not None:
+            fact_table.append(run_facts, run_id)
+
+        return final_cavities_dict, results
     # END of process_multi_or_folder
 
 
@@ -0,0 +1,137 @@
+import glob
+import logging
+import os
+import sys
+import time
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+class ConsensusFactTable:
+    """
+    Cross-OR consensus fact table kept in the data lake as an append-only set of parquet files:
+        {data_lake_dir}/consensus_facts/run_{run_id}.parquet
+
+    Every pm_main.py run appends one file with one row per (OR, residue) of all the consensus files built in this run,
+    files are never rewritten. Queries read only the needed columns and, by default, keep for every OR
+    only the rows of its latest run (so rebuilt ORs are not counted twice).
+
+    parquet support requires pyarrow (pip install pyarrow).
+    """
+
+    FACTS_DIR = "consensus_facts"
+    COLUMNS = ["or_name", "seq_id", "aa", "plddt", "cspf", "cvpl", "p2rk", "pupp", "consensus", "mask", "run_id"]
+
+    def __init__(self, data_lake_dir: str):
+        self.facts_dir = os.path.join(data_lake_dir, self.FACTS_DIR)
+
+    @classmethod
+    def to_facts(cls, or_name: str, consensus_df: pd.DataFrame, mask: str, run_id: str) -> pd.DataFrame:
+        """Converts a consensus table (as written to {OR}_consensus.xlsx) into fact table rows."""
+        facts = pd.DataFrame({
+            "or_name": or_name,
+            "seq_id": pd.to_numeric(consensus_df["Seq ID"], errors="coerce").astype("Int64"),
+            "aa": consensus_df["AA"].astype(str),
+            "plddt": consensus_df["plddt"].astype(float),
+            "cspf": consensus_df["cspf"].astype("int8"),
+            "cvpl": consensus_df["cvpl"].astype("int8"),
+            "p2rk": consensus_df["p2rk"].astype("int8"),
+            "pupp": consensus_df["pupp"].astype("int8"),
+            "consensus": consensus_df["consensus"].astype("int8"),
+            "mask": mask,
+            "run_id": run_id,
+        }, columns=cls.COLUMNS)
+        return facts
+
+    def append(self, facts: list[pd.DataFrame], run_id: str) -> str | None:
+        """Writes the facts of one run as a new parquet file, returns its path (None if nothing to write)."""
+        facts = [f for f in facts if not f.empty]
+        if not facts:
+            logger.info("Consensus fact table: no new facts in this run")
+            return None
+
+        os.makedirs(self.facts_dir, exist_ok=True)
+        path = os.path.join(self.facts_dir, f"run_{run_id}.parquet")
+        if os.path.exists(path):
+            raise FileExistsError(f"Consensus fact table already has run {run_id}: {path}")
+
+        df = pd.concat(facts, ignore_index=True)
+        # Written under a temporary name first, so a crashed run never leaves a partial run file
+        tmp_path = path + ".tmp"
+        df.to_parquet(tmp_path, engine="pyarrow", index=False)
+        os.replace(tmp_path, path)
+
+        logger.info(f"Consensus fact table: {len(df)} rows of {df['or_name'].nunique()} ORs appended to {path}")
+        return path
+
+    def load(self, columns: list[str] | None = None, filters: list[tuple] | None = None,
+             latest_only: bool = True) -> pd.DataFrame:
+        """
+        Reads the fact table.
+
+        Args:
+            columns: columns to read (all by default); or_name and run_id are always read.
+            filters: pyarrow filters, e.g. [("seq_id", "==", 104), ("consensus", "==", 1)],
+                     applied while reading, so only matching rows are materialized.
+            latest_only: keep only rows of the latest run of every OR.
+        """
+        files = sorted(glob.glob(os.path.join(self.facts_dir, "run_*.parquet")))
+        if not files:
+            return pd.DataFrame(columns=columns or self.COLUMNS)
+
+        read_columns = None
+        if columns is not None:
+            read_columns = list(dict.fromkeys(["or_name", "run_id"] + list(columns)))
+
+        df = pd.read_parquet(files, engine="pyarrow", columns=read_columns, filters=filters)
+        if latest_only:
+            # The latest run per OR is found on unfiltered data, filtered rows alone could hide a newer run
+            df = df.merge(self._latest_runs(files), on=["or_name", "run_id"])
+
+        return df[columns] if columns is not None else df
+
+    @staticmethod
+    def _latest_runs(files: list[str]) -> pd.DataFrame:
+        runs = pd.read_parquet(files, engine="pyarrow", columns=["or_name", "run_id"]).drop_duplicates()
+        return runs.groupby("or_name", as_index=False)["run_id"].max()
+
+    def query(self, filters: list[tuple] | None = None, group_by: list[str] | str | None = None,
+              agg: dict | str = "size", latest_only: bool = True) -> pd.DataFrame | pd.Series:
+        """
+        Filter and (optionally) group the facts.
+            query(filters=[("consensus", "==", 1)], group_by="seq_id")                   -> number of consensus rows per residue
+            query(group_by="or_name", agg={"consensus": "sum", "plddt": "mean"})         -> per OR aggregates
+        """
+        df = self.load(filters=filters, latest_only=latest_only)
+        if group_by is None:
+            return df
+        grouped = df.groupby(group_by)
+        return grouped.size() if agg == "size" else grouped.agg(agg)
+
+    def ors_with_residue_in_consensus(self, seq_id: int) -> list[str]:
+        """Which ORs put residue seq_id in consensus."""
+        df = self.load(columns=["or_name"], filters=[("seq_id", "==", seq_id), ("consensus", "==", 1)])
+        return sorted(df["or_name"].unique())
+
+    def consensus_size_distribution(self) -> pd.Series:
+        """Number of ORs per consensus size (number of consensus residues of an OR)."""
+        df = self.load(columns=["or_name", "consensus"])
+        sizes = df.groupby("or_name")["consensus"].sum()
+        return sizes.value_counts().sort_index().rename_axis("consensus_size").rename("or_count")
+
+
+if __name__ == "__main__":
+    # Quick queries: python consensus_facts.py <data_lake_dir> residue <seq_id> | sizes
+    if len(sys.argv) < 3:
+        print("Usage: python consensus_facts.py <data_lake_dir> residue <seq_id> | sizes")
+        sys.exit(1)
+
+    table = ConsensusFactTable(sys.argv[1])
+    started = time.perf_counter()
+    if sys.argv[2] == "residue":
+        print(table.ors_with_residue_in_consensus(int(sys.argv[3])))
+    elif sys.argv[2] == "sizes":
+        print(table.consensus_size_distribution().to_string())
+    print(f"Query time: {time.perf_counter() - started:.3f} s")
@@ -0,0 +1,110 @@
+import hashlib
+import json
+import logging
+import os
+
+from file_staging import file_hash_record
+
+logger = logging.getLogger(__name__)
+
+
+class ConsensusManifest:
+    """
+    Per-OR record of what the consensus of an OR was built from:
+    content hashes of the 4 method workbooks and of the PDB, the applied cavity mask, the strategy
+    and the consensus rules. Stored as a hidden json file in the PM_INPUT OR folder, and copied to the
+    PM_OUTPUT OR folder once the PyMol scripts are generated from that consensus.
+
+    An OR whose fingerprint did not change since the last run is skipped by
+    ConsensusBuilder.process_multi_or_folder and prepare_for_pymol (unless forced).
+    """
+
+    MANIFEST_NAME = ".consensus_manifest.json"
+    VERSION = 1
+
+    @classmethod
+    def read(cls, or_dir) -> dict | None:
+        path = os.path.join(or_dir, cls.MANIFEST_NAME)
+        if not os.path.isfile(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read consensus manifest {path}: {e}, it will be rebuilt")
+            return None
+
+    @classmethod
+    def write(cls, or_dir, manifest: dict) -> None:
+        path = os.path.join(or_dir, cls.MANIFEST_NAME)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def build(cls, or_dir, input_files: dict[str, str], mask_to_apply: str | None, strategy: str,
+              consensus_method: int, rules: dict[str, str], known: dict[str, dict] | None = None) -> dict:
+        """
+        Builds the manifest of the current inputs.
+        input_files: key ('cspf', ..., 'pdb') -> path
+        known: key -> file record with 'sha256', 'size', 'mtime_ns' already computed elsewhere
+        (e.g. by RunManifest), used like the records of the previous manifest
+        """
+        previous = cls.read(or_dir) or {}
+        previous_inputs = previous.get("inputs", {})
+        known = known or {}
+
+        inputs = {}
+        for key, path in sorted(input_files.items()):
+            hint = previous_inputs.get(key) or known.get(key)
+            if hint is not None:
+                hint = {k: hint.get(k) for k in ("sha256", "size", "mtime_ns")}
+            record = file_hash_record(path, hint)
+            inputs[key] = {**record, "file": os.path.basename(path)}
+
+        return {
+            "version": cls.VERSION,
+            "inputs": inputs,
+            "mask": mask_to_apply,
+            "strategy": strategy,
+            "consensus_method": consensus_method,
+            "rules": rules,
+        }
+
+    @classmethod
+    def fingerprint(cls, manifest: dict | None) -> str | None:
+        """Hash of everything the result depends on (file content hashes, not their timestamps)."""
+        if manifest is None:
+            return None
+        relevant = {
+            "version": manifest.get("version"),
+            "inputs": {key: record.get("sha256") for key, record in manifest.get("inputs", {}).items()},
+            "mask": manifest.get("mask"),
+            "strategy": manifest.get("strategy"),
+            "consensus_method": manifest.get("consensus_method"),
+            "rules": manifest.get("rules"),
+        }
+        return hashlib.sha256(json.dumps(relevant, sort_keys=True).encode("utf-8")).hexdigest()
+
+    @classmethod
+    def is_consensus_current(cls, or_dir, manifest: dict, consensus_path) -> bool:
+        """True if the consensus file exists and was built from exactly the same inputs."""
+        if not os.path.isfile(consensus_path):
+            return False
+        return cls.fingerprint(cls.read(or_dir)) == cls.fingerprint(manifest)
+
+    @classmethod
+    def is_output_current(cls, input_or_dir, output_or_dir) -> bool:
+        """True if the PyMol output of the OR was generated from the current consensus manifest."""
+        input_manifest = cls.read(input_or_dir)
+        if input_manifest is None or not os.path.isdir(output_or_dir):
+            return False
+        return cls.fingerprint(cls.read(output_or_dir)) == cls.fingerprint(input_manifest)
+
+    @classmethod
+    def mark_output(cls, input_or_dir, output_or_dir) -> None:
+        """Records (after a successful generation) which consensus manifest the PyMol output was built from."""
+        input_manifest = cls.read(input_or_dir)
+        if input_manifest is not None:
+            cls.write(output_or_dir, input_manifest)
@@ -0,0 +1,55 @@
+import os
+
+import pandas as pd
+
+
+class ConsensusResult:
+    """
+    In-memory result of the consensus stage for one OR:
+    the cavity selected per prediction method, the residues of all cavities of every method workbook
+    and the consensus table.
+
+    ConsensusBuilder.process_multi_or_folder returns it for every OR it has built, prepare_for_pymol
+    generates the PyMol scripts from it directly, so the workbooks of an OR are read only once per run.
+    """
+
+    def __init__(self, or_name: str,
+                 method_files: dict[str, str],
+                 cavities: dict[str, dict[int, list]],
+                 selected_cavities: dict[str, int],
+                 consensus_df: pd.DataFrame):
+        """
+        Args:
+            or_name: OR subdirectory name.
+            method_files: method key ('cspf', ...) -> workbook path.
+            cavities: method key -> {cavity number -> residues, (chain, seq id) or seq id strings}.
+            selected_cavities: method key -> cavity number used for the consensus.
+            consensus_df: the table written to {or_name}_consensus.xlsx.
+        """
+        self.or_name = or_name
+        self.method_files = method_files
+        self.cavities = cavities
+        self.selected_cavities = selected_cavities
+        self.consensus_df = consensus_df
+
+    @property
+    def consensus_seq_ids(self) -> list[str]:
+        consensus_rows = self.consensus_df[self.consensus_df["consensus"] == 1]
+        return consensus_rows["Seq ID"].dropna().astype(str).tolist()
+
+    def to_pymol_data(self) -> dict[str, dict[str, list]]:
+        """
+        Returns the data in the format of pm_coloring.read_input_xlsx_files:
+            { '{OR}_cspf': {'cav_1': [...], ..., 'cav_5': [...]}, ..., '{OR}_consensus': {'consensus': [...]} }
+        """
+        all_files_data = {}
+        for key, fpath in self.method_files.items():
+            file_key = os.path.basename(fpath).split('_residues')[0]
+            all_files_data[file_key] = {f"cav_{cavity_number}": seq_ids
+                                        for cavity_number, seq_ids in sorted(self.cavities.get(key, {}).items())}
+
+        all_files_data[f"{self.or_name}_consensus"] = {"consensus": self.consensus_seq_ids}
+        return all_files_data
+
+    def __repr__(self):
+        return f"ConsensusResult({self.or_name!r}, selected cavities {self.selected_cavities})"
@@ -0,0 +1,172 @@
+import ast
+import logging
+
+import numpy as np
+import pandas as pd
+
+from pymol_scripts_exception import PymolScriptsException
+
+logger = logging.getLogger(__name__)
+
+
+class CompiledRule:
+    """
+    A consensus rule compiled once from its text expression into a vectorized evaluator.
+    Evaluation takes the whole residue table at once (one numpy array per method column).
+    """
+
+    def __init__(self, name: str, expression: str, code):
+        self.name = name
+        self.expression = expression
+        self._code = code
+
+    def evaluate(self, columns: dict[str, np.ndarray], size: int) -> np.ndarray:
+        result = eval(self._code, {"__builtins__": {}}, columns)
+        # A constant rule (e.g. "1") gives a scalar, it is broadcasted to the table size
+        result = np.broadcast_to(np.asarray(result), (size,))
+        return (result != 0).astype(np.int8)
+
+    def __repr__(self):
+        return f"CompiledRule({self.name!r}: {self.expression!r})"
+
+
+class _RuleNormalizer(ast.NodeTransformer):
+    """
+    Verifies that the rule AST contains only method columns, integer constants and the allowed operators,
+    rewrites python boolean words (and/or/not) and '~' into their element-wise equivalents.
+    """
+
+    ALLOWED_BINOPS = (ast.BitOr, ast.BitAnd, ast.BitXor, ast.Add, ast.Sub, ast.Mult)
+    ALLOWED_CMPOPS = (ast.Gt, ast.GtE, ast.Lt, ast.LtE, ast.Eq, ast.NotEq)
+
+    def __init__(self, expression: str, allowed_names: tuple[str, ...]):
+        self.expression = expression
+        self.allowed_names = allowed_names
+
+    def _fail(self, reason: str):
+        raise PymolScriptsException(f"Consensus rule '{self.expression}' is incorrect: {reason}")
+
+    def generic_visit(self, node):
+        if not isinstance(node, (ast.Expression, ast.BinOp, ast.UnaryOp, ast.BoolOp, ast.Compare,
+                                 ast.Name, ast.Constant, ast.Load,
+                                 ast.operator, ast.cmpop, ast.unaryop, ast.boolop)):
+            self._fail(f"'{type(node).__name__}' is not allowed")
+        return super().generic_visit(node)
+
+    def visit_Name(self, node):
+        if node.id not in self.allowed_names:
+            self._fail(f"unknown column '{node.id}', allowed: {self.allowed_names}")
+        return node
+
+    def visit_Constant(self, node):
+        if isinstance(node.value, bool) or not isinstance(node.value, int):
+            self._fail(f"only integer constants are allowed, got {node.value!r}")
+        return node
+
+    def visit_BinOp(self, node):
+        if not isinstance(node.op, self.ALLOWED_BINOPS):
+            self._fail(f"operator '{type(node.op).__name__}' is not allowed")
+        return self.generic_visit(node)
+
+    def visit_Compare(self, node):
+        if len(node.ops) != 1:
+            self._fail("chained comparisons are not supported, use '&' to combine them")
+        if not isinstance(node.ops[0], self.ALLOWED_CMPOPS):
+            self._fail(f"comparison '{type(node.ops[0]).__name__}' is not allowed")
+        return self.generic_visit(node)
+
+    def visit_BoolOp(self, node):
+        # 'a and b or c' -> '(a & b) | c', evaluated element-wise
+        op = ast.BitAnd() if isinstance(node.op, ast.And) else ast.BitOr()
+        values = [self.visit(value) for value in node.values]
+        result = values[0]
+        for value in values[1:]:
+            result = ast.BinOp(left=result, op=op, right=value)
+        return result
+
+    def visit_UnaryOp(self, node):
+        operand = self.visit(node.operand)
+        if isinstance(node.op, (ast.Invert, ast.Not)):
+            # '~a' / 'not a' -> 'a == 0' (bitwise inversion of 0/1 integers would give -1/-2)
+            return ast.Compare(left=operand, ops=[ast.Eq()], comparators=[ast.Constant(value=0)])
+        if isinstance(node.op, ast.USub):
+            node.operand = operand
+            return node
+        self._fail(f"unary operator '{type(node.op).__name__}' is not allowed")
+
+
+class ConsensusRules:
+    """
+    Consensus rules are boolean expressions over the prediction method columns, e.g.
+        cspf | p2rk | (cvpl & pupp)
+        cspf + cvpl + p2rk >= 2
+    Each rule is compiled once and evaluated over the whole consensus table in a single pass.
+    """
+
+    METHOD_COLUMNS = ("cspf", "cvpl", "p2rk", "pupp")
+
+    # Rules behind the consensus method numbers (-m option of pm_main.py)
+    BUILTIN_RULES = {
+        1: "cspf | p2rk | (cvpl & pupp)",    # default
+        2: "cspf + cvpl + p2rk >= 1",        # exclude pupp, any other has 1
+    }
+
+    PRIMARY_COLUMN = "consensus"
+
+    @classmethod
+    def compile(cls, name: str, expression: str) -> CompiledRule:
+        try:
+            tree = ast.parse(expression.strip(), mode="eval")
+        except SyntaxError as e:
+            raise PymolScriptsException(f"Consensus rule '{name}' cannot be parsed: '{expression}' ({e.msg})")
+
+        tree = _RuleNormalizer(expression, cls.METHOD_COLUMNS).visit(tree)
+        code = compile(ast.fix_missing_locations(tree), f"<consensus rule {name}>", "eval")
+        return CompiledRule(name, expression, code)
+
+    @classmethod
+    def builtin_expression(cls, consensus_method: int) -> str:
+        if consensus_method not in cls.BUILTIN_RULES:
+            raise PymolScriptsException(f"Consensus Method {consensus_method} is incorrect, not implemented")
+        return cls.BUILTIN_RULES[consensus_method]
+
+    @classmethod
+    def build_rule_set(cls, consensus_method: int, extra_rules: dict[str, str] | None = None) -> "ConsensusRuleSet":
+        """
+        Compiles the primary rule (chosen by consensus_method number, written to the 'consensus' column)
+        and all extra rules from configuration (written to 'consensus_<name>' columns).
+        """
+        rules = [cls.compile(cls.PRIMARY_COLUMN, cls.builtin_expression(consensus_method))]
+        for name, expression in (extra_rules or {}).items():
+            column = f"{cls.PRIMARY_COLUMN}_{name}"
+            rules.append(cls.compile(column, expression))
+            logger.info(f"Extra consensus rule compiled: {column} = {expression}")
+
+        return ConsensusRuleSet(rules)
+
+
+class ConsensusRuleSet:
+    """An ordered list of compiled rules, all evaluated over the same method columns."""
+
+    def __init__(self, rules: list[CompiledRule]):
+        self.rules = rules
+
+    @property
+    def column_names(self) -> list[str]:
+        return [rule.name for rule in self.rules]
+
+    def as_dict(self) -> dict[str, str]:
+        return {rule.name: rule.expression for rule in self.rules}
+
+    def evaluate(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Evaluates all the rules in one pass over df (having cspf, cvpl, p2rk, pupp 0/1 columns).
+        Returns a DataFrame with one 0/1 column per rule, aligned with df index.
+        """
+        size = len(df)
+        columns = {
+            name: df[name].to_numpy(dtype=np.int64) if name in df.columns else np.zeros(size, dtype=np.int64)
+            for name in ConsensusRules.METHOD_COLUMNS
+        }
+
+        return pd.DataFrame({rule.name: rule.evaluate(columns, size) for rule in self.rules}, index=df.index)
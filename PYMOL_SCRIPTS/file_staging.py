@@ -0,0 +1,181 @@
+from contextlib import contextmanager
+import errno
+import hashlib
+import logging
+import os
+import shutil
+import sys
+
+logger = logging.getLogger(__name__)
+
+# Linux ioctl cloning a file (reflink) on copy-on-write filesystems (btrfs, xfs, ...)
+_FICLONE = 0x40049409
+
+
+def file_sha256(path) -> str:
+    """sha256 hex digest of the file content, read in chunks"""
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def file_hash_record(path, previous: dict | None = None) -> dict:
+    """
+    {'sha256', 'size', 'mtime_ns'} of a file. If previous (a record of the same file, e.g. from a manifest)
+    has the same size and mtime, its hash is reused and the file is not read again.
+    """
+    st = os.stat(path)
+    if previous and previous.get("size") == st.st_size and previous.get("mtime_ns") == st.st_mtime_ns \
+            and previous.get("sha256"):
+        sha256 = previous["sha256"]
+    else:
+        sha256 = file_sha256(path)
+    return {"sha256": sha256, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+@contextmanager
+def replacing_file(path):
+    """
+    Yields a temporary path next to path for the caller to write; renamed over path when the block succeeds,
+    removed when it fails. The previous file (possibly hard-linked into PM_INPUT and PM_OUTPUT) is replaced,
+    never written through, and a failed write leaves it intact.
+    """
+    directory, name = os.path.split(os.fspath(path))
+    stem, extension = os.path.splitext(name)
+    tmp_path = os.path.join(directory, f".{stem}.tmp{extension}")
+    try:
+        yield tmp_path
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+
+
+class FileStaging:
+    """
+    Stages files between the data lake folders (output -> PM_INPUT -> PM_OUTPUT) without copying the bytes
+    when the filesystem allows it.
+
+    Modes:
+        auto     - reflink, if not supported hard link, if not possible (e.g. another drive) copy
+        reflink  - reflink, copy fallback
+        hardlink - hard link, copy fallback
+        copy     - plain copy (shutil.copy2)
+
+    A staged file is always created under a temporary name and renamed over the destination, so the previous
+    destination (possibly a hard link of another file) is replaced, never written through.
+    Hard-linked files share their content: files of the data lake must be replaced (written anew), not edited in place,
+    the workbook writers write them through replacing_file().
+
+    compare ('mtime' or 'hash') enables the rsync-like mode: files whose destination is already the same
+    (same inode, same size and mtime, or same content hash) are skipped.
+    """
+
+    MODES = ("auto", "reflink", "hardlink", "copy")
+    COMPARE = ("mtime", "hash")
+
+    def __init__(self, mode: str = "auto", compare: str | None = None):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown staging mode '{mode}', allowed: {self.MODES}")
+        if compare is not None and compare not in self.COMPARE:
+            raise ValueError(f"Unknown staging comparison '{compare}', allowed: {self.COMPARE}")
+        self.mode = mode
+        self.compare = compare
+        # Disabled after the first failure, so unsupported methods are not retried for every file
+        self._reflink_ok = mode in ("auto", "reflink") and sys.platform.startswith("linux")
+        self._hardlink_ok = mode in ("auto", "hardlink")
+        self.stats = {"reflinked": 0, "hardlinked": 0, "copied": 0, "skipped": 0, "bytes_copied": 0}
+
+    def is_unchanged(self, src, dst) -> bool:
+        """True if dst already holds src (according to the compare mode)."""
+        if self.compare is None or not os.path.isfile(dst):
+            return False
+        if os.path.samefile(src, dst):
+            return True
+        src_stat, dst_stat = os.stat(src), os.stat(dst)
+        if src_stat.st_size != dst_stat.st_size:
+            return False
+        if self.compare == "mtime":
+            return src_stat.st_mtime_ns == dst_stat.st_mtime_ns
+        return file_sha256(src) == file_sha256(dst)
+
+    def _reflink(self, src, tmp) -> bool:
+        import fcntl
+        try:
+            with open(src, "rb") as fsrc, open(tmp, "wb") as fdst:
+                fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+        except OSError as e:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            self._reflink_ok = False
+            logger.debug(f"Reflink is not supported ({e}), falling back")
+            return False
+        shutil.copystat(src, tmp)
+        return True
+
+    def _hardlink(self, src, tmp) -> bool:
+        try:
+            os.link(src, tmp)
+        except OSError as e:
+            # Another filesystem (EXDEV), no permission or no hard link support: no more attempts
+            if e.errno in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP, errno.EACCES):
+                self._hardlink_ok = False
+                logger.debug(f"Hard link is not possible ({e}), falling back to copy")
+                return False
+            raise
+        return True
+
+    def stage_file(self, src, dst) -> str:
+        """Stages src as dst, returns the action: 'skipped', 'reflinked', 'hardlinked' or 'copied'."""
+        if self.is_unchanged(src, dst):
+            self.stats["skipped"] += 1
+            return "skipped"
+
+        tmp = f"{dst}.staging"
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+        if self._reflink_ok and self._reflink(src, tmp):
+            action = "reflinked"
+        elif self._hardlink_ok and self._hardlink(src, tmp):
+            action = "hardlinked"
+        else:
+            shutil.copy2(src, tmp)
+            action = "copied"
+            self.stats["bytes_copied"] += os.path.getsize(tmp)
+
+        os.replace(tmp, dst)
+        self.stats[action] += 1
+        return action
+
+    def stage_tree(self, src_dir, dst_dir, exclude: tuple[str, ...] = (), files=None) -> None:
+        """
+        Stages all files of src_dir (recursively) into dst_dir, names in exclude are not staged.
+        Files present only in dst_dir are kept (e.g. consensus files and the pdb added later).
+        files: relative paths of the files of src_dir, if already known (e.g. from an inventory), src_dir is not walked then.
+        """
+        if files is not None:
+            os.makedirs(dst_dir, exist_ok=True)
+            for rel_path in files:
+                if os.path.basename(rel_path) in exclude:
+                    continue
+                dst_path = os.path.join(dst_dir, rel_path)
+                os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+                self.stage_file(os.path.join(src_dir, rel_path), dst_path)
+            return
+
+        for root, dirs, files in os.walk(src_dir):
+            target_root = os.path.join(dst_dir, os.path.relpath(root, src_dir))
+            os.makedirs(target_root, exist_ok=True)
+            for filename in files:
+                if filename in exclude:
+                    continue
+                self.stage_file(os.path.join(root, filename), os.path.join(target_root, filename))
+
+    def summary(self) -> str:
+        s = self.stats
+        return (f"{s['reflinked']} reflinked, {s['hardlinked']} hard-linked, {s['copied']} copied "
+                f"({s['bytes_copied'] / 1024 / 1024:.1f} MB), {s['skipped']} unchanged")
@@ -63,18 +63,22 @@ def user_exit() -> None:
 
 def get_from_yaml_dict(pm_input_dir, pm_input_subfolders: list[str | list[bytes]], use_cavities_dict) -> list[str]:
     if use_cavities_dict is not None:
-        # 1. Verify that for all keys from yaml (except "REST") correspond to existing OR_subfolders. Otherwise -exception
+        cavity_masks = CavitiesUsage.compile(use_cavities_dict)
+        # 1. Verify that for all exact keys from yaml (except "REST" and OR family rules) correspond to existing OR_subfolders. Otherwise -exception
         pm_input_subdirs = pm_input_subfolders
-        non_rest_yaml_keys = [key for item in use_cavities_dict for key in item.keys() if
-                              key != "REST"]  # [item.keys()[0] for item in yaml_dict]
-        missing_keys = [key for key in non_rest_yaml_keys if key not in pm_input_subdirs]
+        subdirs_set = set(pm_input_subdirs)
+        non_rest_yaml_keys = cavity_masks.exact_keys
+        missing_keys = [key for key in non_rest_yaml_keys if key not in subdirs_set]
         if missing_keys:
             raise ValueError(
                 f"The following yaml keys : {missing_keys} do not correspond to any {pm_input_dir} subdirectory {pm_input_subdirs}")
 
-        # 2. Verify whether -REST: "0" is present. If yes,  all non_key directories should be skipped (continue)
-        if CavitiesUsage.has_rest_zero(use_cavities_dict):
-            subdir_names_to_iterate = non_rest_yaml_keys
+        for rule_key, _, _ in cavity_masks.rules:
+            logger.info(f"OR family rule '{rule_key}' in cavity masks")
+
+        # 2. Verify whether -REST: "0" is present. If yes,  all non_key directories (not matching family rules) should be skipped (continue)
+        if cavity_masks.rest_zero:
+            subdir_names_to_iterate = cavity_masks.select(pm_input_subfolders)
             logger.info(f"Rest '0' found, the following subdirs are to be processed : {subdir_names_to_iterate}")
         # 3. Run over all subdirs. If subdir key is present - apply cavity mask, else is REST is present - apply rest mask, else- apply default strategy
         else:
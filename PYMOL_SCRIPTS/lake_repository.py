@@ -0,0 +1,378 @@
+import argparse
+import hashlib
+import io
+import json
+import logging
+import os
+import sqlite3
+
+import pandas as pd
+
+from consensus_manifest import ConsensusManifest
+from run_manifest import RunManifest
+from score_handler import plddt_from_pdb_lines
+
+logger = logging.getLogger(__name__)
+
+# Prediction methods, as in MethodType of UI_SELENIUM/file_namer.py
+METHODS = ("cspf", "cvpl", "p2rk", "pupp")
+
+
+class LakeRepository:
+    """
+    Storage interface of the data lake: per OR the method residue tables, the VA tables, the consensus,
+    the PDB structure and its pLDDT scores.
+
+    Tables are addressed by kind:
+        'cspf', 'cvpl', 'p2rk', 'pupp'  - residue workbooks of the methods ({OR}_{method}_residues.xlsx)
+        'cspf_va', ...                  - VA workbooks of the methods ({OR}_{method}_va.xlsx)
+        'consensus'                     - consensus table ({OR}_consensus.xlsx)
+    and are handed over as workbooks: sheet name -> DataFrame.
+
+    Backends: FolderLakeRepository (the folder-of-workbooks layout: input/output/PM_INPUT/PM_OUTPUT)
+    and SqliteLakeRepository (one indexed database file). transfer() moves ORs between them, the folder layout
+    is then an import source and an export target of the database.
+    """
+
+    KINDS = (*METHODS, *(f"{method}_va" for method in METHODS), "consensus")
+
+    def or_names(self) -> list[str]:
+        raise NotImplementedError
+
+    def table_kinds(self, or_name: str) -> list[str]:
+        """Kinds of the tables stored for the OR."""
+        raise NotImplementedError
+
+    def read_tables(self, or_name: str, kind: str) -> dict[str, pd.DataFrame] | None:
+        """Workbook of the OR of this kind, None if it is not stored."""
+        raise NotImplementedError
+
+    def write_tables(self, or_name: str, kind: str, sheets: dict[str, pd.DataFrame], sha256: str | None = None) -> None:
+        """Stores the workbook with its hash (sha256 as given by table_hash of the source, by default tables_sha256)."""
+        raise NotImplementedError
+
+    def table_hash(self, or_name: str, kind: str) -> str | None:
+        """Hash of the stored workbook (as stored with it, or of the workbook file), None if unknown."""
+        return None
+
+    def read_pdb(self, or_name: str) -> bytes | None:
+        raise NotImplementedError
+
+    def write_pdb(self, or_name: str, data: bytes) -> None:
+        raise NotImplementedError
+
+    def read_plddt(self, or_name: str) -> list[tuple[str, int, float]]:
+        """(chain, seq id, pLDDT) per residue, by default parsed from the stored PDB."""
+        data = self.read_pdb(or_name)
+        if data is None:
+            return []
+        return plddt_from_pdb_lines(data.decode("utf-8", errors="replace").splitlines())
+
+    def write_plddt(self, or_name: str, rows: list[tuple[str, int, float]]) -> None:
+        """Stores the pLDDT scores, if the backend keeps them apart from the PDB."""
+
+    def collect_garbage(self) -> None:
+        """Removes stored data no OR refers to any more, if the backend shares it between ORs (see transfer)."""
+
+    def read_method_tables(self, or_name: str) -> dict[str, dict[str, pd.DataFrame]]:
+        """Residue workbooks of the found methods: method -> sheet name -> DataFrame."""
+        workbooks = {}
+        for method in METHODS:
+            sheets = self.read_tables(or_name, method)
+            if sheets is not None:
+                workbooks[method] = sheets
+        return workbooks
+
+    @staticmethod
+    def tables_sha256(sheets: dict[str, pd.DataFrame]) -> str:
+        sha = hashlib.sha256()
+        for sheet_name, df in sheets.items():
+            sha.update(sheet_name.encode("utf-8"))
+            sha.update(df.to_json(orient="split", index=False).encode("utf-8"))
+        return sha.hexdigest()
+
+
+class FolderLakeRepository(LakeRepository):
+    """
+    The folder-of-workbooks layout: root/{OR}/{OR}_{kind}.xlsx and root/{OR}/{OR}.pdb
+    (pdb_dir: folder with the {OR}.pdb files if they are not kept in the OR folders, e.g. the Selenium input).
+    Workbooks are written under a temporary name and renamed (the files may be hard-linked into other folders).
+    The hash of every exported workbook is kept in a hidden .lake_tables.json, so unchanged tables are not exported again.
+    Workbooks written by the pipeline itself are identified by the sha256 of the file, as recorded by the run and
+    consensus manifests of the OR folder.
+    """
+
+    HASHES_NAME = ".lake_tables.json"
+
+    def __init__(self, root: str, pdb_dir: str | None = None):
+        self.root = root
+        self.pdb_dir = pdb_dir
+
+    def _or_dir(self, or_name: str) -> str:
+        return os.path.join(self.root, or_name)
+
+    def table_path(self, or_name: str, kind: str) -> str:
+        if kind in METHODS:
+            return os.path.join(self._or_dir(or_name), f"{or_name}_{kind}_residues.xlsx")
+        return os.path.join(self._or_dir(or_name), f"{or_name}_{kind}.xlsx")
+
+    def pdb_path(self, or_name: str) -> str:
+        return os.path.join(self.pdb_dir or self._or_dir(or_name), f"{or_name}.pdb")
+
+    def or_names(self) -> list[str]:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(entry.name for entry in os.scandir(self.root)
+                      if entry.is_dir() and entry.name != "OLD_DATA" and not entry.name.startswith("."))
+
+    def table_kinds(self, or_name: str) -> list[str]:
+        return [kind for kind in self.KINDS if os.path.isfile(self.table_path(or_name, kind))]
+
+    def read_tables(self, or_name: str, kind: str) -> dict[str, pd.DataFrame] | None:
+        path = self.table_path(or_name, kind)
+        if not os.path.isfile(path):
+            return None
+        return pd.read_excel(path, sheet_name=None)
+
+    def write_tables(self, or_name: str, kind: str, sheets: dict[str, pd.DataFrame], sha256: str | None = None) -> None:
+        os.makedirs(self._or_dir(or_name), exist_ok=True)
+        path = self.table_path(or_name, kind)
+        tmp_path = os.path.join(self._or_dir(or_name), f".{or_name}_{kind}.tmp.xlsx")
+        with pd.ExcelWriter(tmp_path, engine="openpyxl") as writer:
+            for sheet_name, df in sheets.items():
+                df.to_excel(writer, sheet_name=sheet_name, index=False)
+        os.replace(tmp_path, path)
+        self._record_hash(or_name, kind, sha256 or self.tables_sha256(sheets), os.stat(path).st_mtime_ns)
+
+    def _read_hashes(self, or_name: str) -> dict:
+        path = os.path.join(self._or_dir(or_name), self.HASHES_NAME)
+        if not os.path.isfile(path):
+            return {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _record_hash(self, or_name: str, kind: str, sha256: str, mtime_ns: int) -> None:
+        hashes = self._read_hashes(or_name)
+        hashes[kind] = {"sha256": sha256, "mtime_ns": mtime_ns}
+        path = os.path.join(self._or_dir(or_name), self.HASHES_NAME)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(hashes, f, indent=2, sort_keys=True)
+        os.replace(path + ".tmp", path)
+
+    def _known_record(self, or_name: str, path) -> dict | None:
+        """Record of the workbook file in the run or consensus manifest of the OR folder"""
+        or_dir = self._or_dir(or_name)
+        record = RunManifest.known_record(RunManifest.read(or_dir), path)
+        if record is None:
+            inputs = (ConsensusManifest.read(or_dir) or {}).get("inputs", {})
+            record = next((r for r in inputs.values() if r.get("file") == os.path.basename(path)), None)
+        return record
+
+    def table_hash(self, or_name: str, kind: str) -> str | None:
+        path = self.table_path(or_name, kind)
+        if not os.path.isfile(path):
+            return None
+        # The recorded hash is only valid while the workbook is the exported one (not edited or replaced since)
+        record = self._read_hashes(or_name).get(kind)
+        if record is not None and os.stat(path).st_mtime_ns == record.get("mtime_ns"):
+            return record.get("sha256")
+        # Otherwise the sha256 of the file, from the manifests while size and mtime match
+        return RunManifest.file_record(path, self._known_record(or_name, path))["sha256"]
+
+    def read_pdb(self, or_name: str) -> bytes | None:
+        path = self.pdb_path(or_name)
+        if not os.path.isfile(path):
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+
+    def write_pdb(self, or_name: str, data: bytes) -> None:
+        path = self.pdb_path(or_name)
+        if os.path.isfile(path):
+            with open(path, "rb") as f:
+                if f.read() == data:
+                    return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(path + ".tmp", path)
+
+
+class SqliteLakeRepository(LakeRepository):
+    """
+    The whole data lake in one SQLite database file:
+        ors(or_name, pdb_sha256)                        - one row per OR
+        pdb_blobs(sha256, data)                         - PDB structures, stored once per distinct content
+        tables(or_name, kind, sheet, position, sha256, data) - worksheets (pandas 'split' json), indexed by OR and kind
+        plddt(or_name, chain, seq_id, plddt)            - pLDDT per residue, so the PDB is not parsed again
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS ors (
+            or_name TEXT PRIMARY KEY,
+            pdb_sha256 TEXT REFERENCES pdb_blobs(sha256)
+        );
+        CREATE TABLE IF NOT EXISTS pdb_blobs (
+            sha256 TEXT PRIMARY KEY,
+            data BLOB NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS tables (
+            or_name TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            sheet TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            sha256 TEXT NOT NULL,
+            data TEXT NOT NULL,
+            PRIMARY KEY (or_name, kind, sheet)
+        );
+        CREATE INDEX IF NOT EXISTS tables_kind ON tables(kind, or_name);
+        CREATE TABLE IF NOT EXISTS plddt (
+            or_name TEXT NOT NULL,
+            chain TEXT NOT NULL,
+            seq_id TEXT NOT NULL,
+            plddt REAL NOT NULL,
+            PRIMARY KEY (or_name, chain, seq_id)
+        );
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        directory = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(db_path)
+        self.connection.executescript(self.SCHEMA)
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def _ensure_or(self, or_name: str) -> None:
+        self.connection.execute("INSERT OR IGNORE INTO ors (or_name) VALUES (?)", (or_name,))
+
+    def or_names(self) -> list[str]:
+        return [row[0] for row in self.connection.execute("SELECT or_name FROM ors ORDER BY or_name")]
+
+    def table_kinds(self, or_name: str) -> list[str]:
+        stored = {row[0] for row in self.connection.execute(
+            "SELECT DISTINCT kind FROM tables WHERE or_name = ?", (or_name,))}
+        return [kind for kind in self.KINDS if kind in stored]
+
+    def read_tables(self, or_name: str, kind: str) -> dict[str, pd.DataFrame] | None:
+        rows = self.connection.execute(
+            "SELECT sheet, data FROM tables WHERE or_name = ? AND kind = ? ORDER BY position", (or_name, kind)).fetchall()
+        if not rows:
+            return None
+        # dtype=False: values are taken as stored, strings are not converted to numbers or dates
+        return {sheet: pd.read_json(io.StringIO(data), orient="split", dtype=False, convert_dates=False)
+                for sheet, data in rows}
+
+    def write_tables(self, or_name: str, kind: str, sheets: dict[str, pd.DataFrame], sha256: str | None = None) -> None:
+        sha256 = sha256 or self.tables_sha256(sheets)
+        with self.connection:
+            self._ensure_or(or_name)
+            self.connection.execute("DELETE FROM tables WHERE or_name = ? AND kind = ?", (or_name, kind))
+            self.connection.executemany(
+                "INSERT INTO tables (or_name, kind, sheet, position, sha256, data) VALUES (?, ?, ?, ?, ?, ?)",
+                [(or_name, kind, sheet_name, position, sha256, df.to_json(orient="split", index=False))
+                 for position, (sheet_name, df) in enumerate(sheets.items())])
+
+    def table_hash(self, or_name: str, kind: str) -> str | None:
+        row = self.connection.execute(
+            "SELECT sha256 FROM tables WHERE or_name = ? AND kind = ? LIMIT 1", (or_name, kind)).fetchone()
+        return row[0] if row else None
+
+    def read_pdb(self, or_name: str) -> bytes | None:
+        row = self.connection.execute(
+            "SELECT b.data FROM ors o JOIN pdb_blobs b ON b.sha256 = o.pdb_sha256 WHERE o.or_name = ?",
+            (or_name,)).fetchone()
+        return row[0] if row else None
+
+    def write_pdb(self, or_name: str, data: bytes) -> None:
+        sha256 = hashlib.sha256(data).hexdigest()
+        with self.connection:
+            self._ensure_or(or_name)
+            self.connection.execute("INSERT OR IGNORE INTO pdb_blobs (sha256, data) VALUES (?, ?)", (sha256, data))
+            self.connection.execute("UPDATE ors SET pdb_sha256 = ? WHERE or_name = ?", (sha256, or_name))
+        self.write_plddt(or_name, plddt_from_pdb_lines(data.decode("utf-8", errors="replace").splitlines()))
+
+    def read_plddt(self, or_name: str) -> list[tuple[str, int, float]]:
+        rows = self.connection.execute(
+            "SELECT chain, seq_id, plddt FROM plddt WHERE or_name = ? ORDER BY rowid", (or_name,)).fetchall()
+        return [tuple(row) for row in rows] if rows else super().read_plddt(or_name)
+
+    def write_plddt(self, or_name: str, rows: list[tuple[str, int, float]]) -> None:
+        with self.connection:
+            self.connection.execute("DELETE FROM plddt WHERE or_name = ?", (or_name,))
+            self.connection.executemany("INSERT OR IGNORE INTO plddt (or_name, chain, seq_id, plddt) VALUES (?, ?, ?, ?)",
+                                        [(or_name, chain, str(seq_id), plddt) for chain, seq_id, plddt in rows])
+
+    def collect_garbage(self) -> None:
+        """Removes the PDB blobs no OR refers to any more (replaced by write_pdb)."""
+        with self.connection:
+            self.connection.execute("DELETE FROM pdb_blobs WHERE sha256 NOT IN "
+                                    "(SELECT pdb_sha256 FROM ors WHERE pdb_sha256 IS NOT NULL)")
+
+
+def transfer(source: LakeRepository, target: LakeRepository, or_names: list[str] | None = None,
+             kinds: tuple[str, ...] | None = None, pdb: bool = True) -> dict[str, int]:
+    """
+    Copies ORs (all, or the given ones) from source to target: their tables (all, or the given kinds) and PDB.
+    Tables whose hash (table_hash) is the same in both repositories are not written again, the written ones are stored
+    with the hash of the source.
+    The garbage of the target is collected once, after all ORs are written.
+    Returns counts of the 'written' and 'unchanged' tables.
+    """
+    counts = {"written": 0, "unchanged": 0}
+    for or_name in or_names if or_names is not None else source.or_names():
+        for kind in source.table_kinds(or_name):
+            if kinds is not None and kind not in kinds:
+                continue
+            source_hash = source.table_hash(or_name, kind)
+            if source_hash is not None and source_hash == target.table_hash(or_name, kind):
+                counts["unchanged"] += 1
+                continue
+            target.write_tables(or_name, kind, source.read_tables(or_name, kind), source_hash)
+            counts["written"] += 1
+
+        if pdb:
+            data = source.read_pdb(or_name)
+            if data is not None:
+                target.write_pdb(or_name, data)
+            else:
+                logger.warning(f"No PDB structure of {or_name} in the source repository")
+    if pdb:
+        target.collect_garbage()
+    return counts
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+    parser = argparse.ArgumentParser(description="Moves the data lake between the folder layout and an SQLite database")
+    parser.add_argument("direction", choices=["import", "export"],
+                        help="import: folders -> database, export: database -> folders")
+    parser.add_argument("db_path", help="SQLite data lake file")
+    parser.add_argument("folder", help="Folder of OR subfolders (e.g. output, PM_INPUT)")
+    parser.add_argument("--pdb-dir", default=None,
+                        help="Folder of the {OR}.pdb files if they are not in the OR folders (e.g. Selenium input)")
+    parser.add_argument("--or-name", action="append", default=None, help="Only this OR (can be repeated)")
+    args = parser.parse_args()
+
+    folders = FolderLakeRepository(args.folder, args.pdb_dir)
+    with SqliteLakeRepository(args.db_path) as database:
+        if args.direction == "import":
+            counts = transfer(folders, database, args.or_name)
+        else:
+            counts = transfer(database, folders, args.or_name)
+    logger.info(f"{args.direction.capitalize()} completed: {counts['written']} tables written, {counts['unchanged']} unchanged")
+
+
+if __name__ == "__main__":
+    main()
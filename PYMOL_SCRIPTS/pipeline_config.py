@@ -0,0 +1,300 @@
+import argparse
+import configparser
+import logging
+import os
+from dataclasses import dataclass, field, fields
+
+logger = logging.getLogger(__name__)
+
+PYMOL_SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(PYMOL_SCRIPTS_DIR)
+UI_SELENIUM_DIR = os.path.join(REPO_ROOT, "UI_SELENIUM")
+SELENIUM_CONFIG_PATH = os.path.join(UI_SELENIUM_DIR, "config.ini")
+PM_CONFIG_PATH = os.path.join(PYMOL_SCRIPTS_DIR, "pm_config.ini")
+
+# Environment overrides: CAVITY_PIPELINE_{SECTION}_{KEY}, e.g. CAVITY_PIPELINE_PERFORMANCE_WORKERS=4
+ENV_PREFIX = "CAVITY_PIPELINE_"
+
+TRUE_VALUES = ("true", "1", "yes", "y", "t", "on")
+FALSE_VALUES = ("false", "0", "no", "n", "f", "off", "")
+
+
+class PipelineConfigError(ValueError):
+    """A value of config.ini / pm_config.ini or of an override that does not fit its key"""
+
+
+def parse_value(value, kind: type, name: str):
+    """value (a string of the ini file or of an override) as kind: str, int, float or bool"""
+    if kind is bool:
+        if isinstance(value, bool):
+            return value
+        text = str(value).strip().lower()
+        if text in TRUE_VALUES:
+            return True
+        if text in FALSE_VALUES:
+            return False
+        raise PipelineConfigError(f"{name}: '{value}' is not a boolean (true / false)")
+    try:
+        return kind(value)
+    except (TypeError, ValueError):
+        raise PipelineConfigError(f"{name}: '{value}' is not a{'n' if kind is int else ''} {kind.__name__}") from None
+
+
+class ConfigSection:
+    """Typed section: its dataclass fields are its keys, with their types and defaults"""
+
+    SECTION = ""
+    # key -> allowed values
+    CHOICES: dict[str, tuple] = {}
+
+    @classmethod
+    def keys(cls) -> list[str]:
+        return [f.name for f in fields(cls) if f.init]
+
+    @classmethod
+    def from_values(cls, values: dict[str, str]):
+        """The section from the raw values (keys of other sections and old keys are ignored), validated"""
+        kwargs = {f.name: parse_value(values[f.name], f.type, f"{cls.SECTION}.{f.name}")
+                  for f in fields(cls) if f.init and f.name in values}
+        section = cls(**kwargs)
+        section.validate()
+        return section
+
+    def validate(self) -> None:
+        for key, choices in self.CHOICES.items():
+            if getattr(self, key) not in choices:
+                raise PipelineConfigError(f"{self.SECTION}.{key}: '{getattr(self, key)}' is not one of {choices}")
+
+
+@dataclass
+class SeleniumConfig(ConfigSection):
+    """[DEFAULT] of UI_SELENIUM/config.ini, the predictions (paths relative to UI_SELENIUM, made absolute)"""
+
+    SECTION = "selenium"
+
+    version: str = ""
+    chrome_driver_path: str = ""
+    chrome_headless_mode: bool = True
+    base_url: str = "https://cfold.bme.uic.edu/castpfold/search"
+    cavity_plus_url: str = "http://www.pkumdl.cn:8000/cavityplus/#/computation"
+    prank_web_url: str = "https://prankweb.cz/"
+    job_number: str = ""
+    castpfold_submit: bool = True
+    castpfold_job_wait: float = 20.0
+    latency_histograms: str = "latency_histograms.json"
+    out_dir: str = "out"
+    pocket_limit: int = 5
+    data_lake_dir: str = "../../kosloff-abdulghani-cavity-pipeline-data"
+    input_dir: str = "input"
+    output_dir: str = "output"
+    pacupp_python_feedup: str = "pacupp_python_feedup"
+    prankweb_temp: str = "prankweb_temp"
+    prankweb_local_output: str = ""
+    pacupp_dir: str = ""
+    pacupp_wait: float = 90.0
+    java: str = "java"
+    p2rank_dir: str = ""
+    p2rank_java_home: str = ""
+    script_dir: str = field(default=UI_SELENIUM_DIR, init=False)
+
+    def validate(self) -> None:
+        super().validate()
+        if self.pocket_limit < 1:
+            raise PipelineConfigError(f"selenium.pocket_limit: {self.pocket_limit}, at least 1 pocket is needed")
+        if self.castpfold_job_wait < 0 or self.pacupp_wait <= 0:
+            raise PipelineConfigError("selenium.castpfold_job_wait / pacupp_wait: negative wait")
+
+
+@dataclass
+class VisualizationConfig(ConfigSection):
+    """[visualization] of PYMOL_SCRIPTS/pm_config.ini, consensus and PyMol (paths relative to PYMOL_SCRIPTS)"""
+
+    SECTION = "visualization"
+    CHOICES = {
+        "pymol_session_mode": ("per_method", "per_or"),
+        "staging_mode": ("auto", "reflink", "hardlink", "copy"),
+    }
+
+    data_lake_dir: str = "../../kosloff-abdulghani-cavity-pipeline-data"
+    pm_input_dir: str = "PM_INPUT"
+    pm_output_dir: str = "PM_OUTPUT"
+    best_cavity_strategy: str = "pupp_longest_other_first"
+    use_cavities: str = "use_cavities.yaml"
+    pymol_session_mode: str = "per_method"
+    staging_mode: str = "auto"
+    lake_db: str = ""
+    script_dir: str = field(default=PYMOL_SCRIPTS_DIR, init=False)
+
+
+@dataclass
+class PerformanceConfig(ConfigSection):
+    """[performance] of PYMOL_SCRIPTS/pm_config.ini, the knobs of the run that do not change its results"""
+
+    SECTION = "performance"
+    CHOICES = {"storage_backend": ("auto", "folders", "sqlite")}
+
+    # PyMOL render worker processes, 0 - one per CPU
+    workers: int = 0
+    # Folder of the files kept across runs (latency histograms), empty - UI_SELENIUM
+    cache_dir: str = ""
+    # Timeouts of the remote services: p99 of their latency x timeout_factor (see ServiceLatency)
+    timeout_factor: float = 2.0
+    # Data lake: folders of workbooks, sqlite (lake_db) or auto (sqlite if lake_db is set)
+    storage_backend: str = "auto"
+
+    def validate(self) -> None:
+        super().validate()
+        if self.workers < 0:
+            raise PipelineConfigError(f"performance.workers: {self.workers}, expected 0 (one per CPU) or more")
+        if self.timeout_factor <= 0:
+            raise PipelineConfigError(f"performance.timeout_factor: {self.timeout_factor}, expected > 0")
+
+    @property
+    def render_workers(self) -> int | None:
+        return self.workers or None
+
+
+@dataclass
+class PipelineConfig:
+    """
+    The configuration of a run, loaded and validated once and passed to the stages:
+
+        selenium         [DEFAULT] of UI_SELENIUM/config.ini (SeleniumConfig)
+        visualization    [visualization] of PYMOL_SCRIPTS/pm_config.ini (VisualizationConfig)
+        performance      [performance] of PYMOL_SCRIPTS/pm_config.ini (PerformanceConfig)
+        consensus_rules  [consensus_rules] of PYMOL_SCRIPTS/pm_config.ini, name -> expression
+
+    Values are typed (pocket_limit is an int, chrome_headless_mode a bool, ...) and the paths are absolute.
+    Only the data lakes of the sections an entry point uses are required to exist (load(data_lakes=...)).
+    Per-run overrides, over the ini files: environment variables CAVITY_PIPELINE_{SECTION}_{KEY}
+    (CAVITY_PIPELINE_SELENIUM_POCKET_LIMIT=3), then --set section.key=value of the command line
+    (--set performance.workers=4), see add_arguments().
+    """
+
+    selenium: SeleniumConfig
+    visualization: VisualizationConfig
+    performance: PerformanceConfig
+    consensus_rules: dict[str, str]
+
+    SECTIONS = {
+        "selenium": SeleniumConfig,
+        "visualization": VisualizationConfig,
+        "performance": PerformanceConfig,
+        "consensus_rules": None,
+    }
+    # Sections with a data_lake_dir
+    DATA_LAKES = ("selenium", "visualization")
+
+    @staticmethod
+    def add_arguments(parser: argparse.ArgumentParser) -> None:
+        parser.add_argument(
+            "--set",
+            dest="config_overrides",
+            metavar="SECTION.KEY=VALUE",
+            action="append",
+            default=[],
+            help="Override a config value for this run (sections: selenium - config.ini, visualization / "
+                 "performance / consensus_rules - pm_config.ini), e.g. --set performance.workers=4, repeatable"
+        )
+
+    @classmethod
+    def load(cls, overrides: list[str] | None = None, data_lakes: tuple[str, ...] = DATA_LAKES, environ=None,
+             selenium_path: str = SELENIUM_CONFIG_PATH, pm_path: str = PM_CONFIG_PATH) -> "PipelineConfig":
+        """Reads both ini files, applies the environment and the command line overrides, validates and
+        resolves the paths. data_lakes: the sections whose data lake must exist, the ones the caller's stages use
+        (pm_main.py needs only the visualization one)"""
+        selenium_parser = configparser.ConfigParser()
+        selenium_parser.read(selenium_path, encoding="utf-8")
+        pm_parser = configparser.ConfigParser()
+        pm_parser.read(pm_path, encoding="utf-8")
+
+        values = {"selenium": dict(selenium_parser.defaults())}
+        for section in ("visualization", "performance", "consensus_rules"):
+            values[section] = dict(pm_parser[section]) if pm_parser.has_section(section) else {}
+
+        environ = os.environ if environ is None else environ
+        env_overrides = [cls.environment_override(name, value) for name, value in environ.items()
+                         if name.startswith(ENV_PREFIX)]
+        for section, key, value in env_overrides + [cls.parse_override(text) for text in overrides or []]:
+            values[section][key] = value
+
+        config = cls(selenium=SeleniumConfig.from_values(values["selenium"]),
+                     visualization=VisualizationConfig.from_values(values["visualization"]),
+                     performance=PerformanceConfig.from_values(values["performance"]),
+                     consensus_rules=values["consensus_rules"])
+        config.resolve_paths(data_lakes)
+        if config.performance.storage_backend == "sqlite" and not config.visualization.lake_db:
+            raise PipelineConfigError("performance.storage_backend is sqlite, but visualization.lake_db is not set")
+
+        logger.info(f"Configuration loaded from {selenium_path} and {pm_path}"
+                    + (f", overrides: {len(env_overrides)} from the environment, {len(overrides or [])} --set"
+                       if env_overrides or overrides else ""))
+        logger.info(f"########## CAVITY PIPELINE VERSION: {config.selenium.version}")
+        return config
+
+    @classmethod
+    def parse_override(cls, text: str) -> tuple[str, str, str]:
+        name, sep, value = text.partition("=")
+        section, dot, key = name.strip().partition(".")
+        if not sep or not dot:
+            raise PipelineConfigError(f"Override '{text}' is not SECTION.KEY=VALUE")
+        return cls._checked(section, key, value.strip(), f"--set {text}")
+
+    @classmethod
+    def environment_override(cls, name: str, value: str) -> tuple[str, str, str]:
+        rest = name[len(ENV_PREFIX):].lower()
+        for section in cls.SECTIONS:
+            if rest.startswith(f"{section}_"):
+                return cls._checked(section, rest[len(section) + 1:], value, name)
+        raise PipelineConfigError(f"Environment variable {name}: no section {tuple(cls.SECTIONS)}")
+
+    @classmethod
+    def _checked(cls, section: str, key: str, value: str, origin: str) -> tuple[str, str, str]:
+        if section not in cls.SECTIONS:
+            raise PipelineConfigError(f"{origin}: unknown section '{section}', allowed: {tuple(cls.SECTIONS)}")
+        section_class = cls.SECTIONS[section]
+        if section_class is not None and key not in section_class.keys():
+            raise PipelineConfigError(f"{origin}: unknown key '{key}' of {section}")
+        return section, key, value
+
+    def resolve_paths(self, data_lakes: tuple[str, ...] = DATA_LAKES) -> None:
+        """Relative paths made absolute: of config.ini from UI_SELENIUM, of pm_config.ini from PYMOL_SCRIPTS.
+        The data lakes of the sections in data_lakes must exist."""
+        selenium, visualization, performance = self.selenium, self.visualization, self.performance
+
+        selenium.data_lake_dir = self._data_lake(UI_SELENIUM_DIR, selenium.data_lake_dir, "selenium" in data_lakes)
+        selenium.input_dir = os.path.join(selenium.data_lake_dir, selenium.input_dir)
+        selenium.output_dir = os.path.join(selenium.data_lake_dir, selenium.output_dir)
+        selenium.pacupp_python_feedup = os.path.join(UI_SELENIUM_DIR, selenium.pacupp_python_feedup)
+        # for web p2rank download:
+        selenium.prankweb_temp = os.path.join(UI_SELENIUM_DIR, selenium.prankweb_temp)
+        # for local p2rank run the output path is absolute and needs not to be updated
+
+        if performance.cache_dir:
+            performance.cache_dir = os.path.join(PYMOL_SCRIPTS_DIR, performance.cache_dir)
+            os.makedirs(performance.cache_dir, exist_ok=True)
+        # Latency histograms of the remote services, kept across runs (see service_latency.py)
+        selenium.latency_histograms = os.path.join(performance.cache_dir or UI_SELENIUM_DIR,
+                                                   selenium.latency_histograms)
+
+        visualization.data_lake_dir = self._data_lake(PYMOL_SCRIPTS_DIR, visualization.data_lake_dir,
+                                                      "visualization" in data_lakes)
+        visualization.pm_input_dir = os.path.join(visualization.data_lake_dir, visualization.pm_input_dir)
+        visualization.pm_output_dir = os.path.join(visualization.data_lake_dir, visualization.pm_output_dir)
+        visualization.use_cavities = os.path.join(PYMOL_SCRIPTS_DIR, visualization.use_cavities)
+
+    @staticmethod
+    def _data_lake(base_dir: str, data_lake_dir: str, required: bool) -> str:
+        path = os.path.join(base_dir, data_lake_dir)
+        if required:
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"Data lake '{path}' does not exist, please reconfigure the pipeline")
+            logger.info(f"Using Data Lake: {path}")
+        return path
+
+    @property
+    def lake_db(self) -> str | None:
+        """Path of the SQLite data lake file, None if the data lake is folders only (storage_backend, lake_db)"""
+        if self.performance.storage_backend == "folders" or not self.visualization.lake_db:
+            return None
+        return os.path.join(self.visualization.data_lake_dir, self.visualization.lake_db)
@@ -0,0 +1,178 @@
+import atexit
+import copy
+import json
+import logging
+import multiprocessing
+import os
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
+logger = logging.getLogger(__name__)
+
+FILE_FORMAT = "%(asctime)s %(levelname)s: %(message)s"
+
+
+# Color formatting class for console output
+class ColorFormatter(logging.Formatter):
+    COLORS = {
+        logging.DEBUG: "\033[37m",     # Gray
+        logging.INFO: "\033[0m",       # Default
+        logging.WARNING: "\033[33m",   # Yellow
+        logging.ERROR: "\033[31m",     # Red
+        logging.CRITICAL: "\033[41m",  # Red background
+    }
+
+    RESET = "\033[0m"
+
+    def format(self, record):
+        # Use custom color if specified in the record's extra dictionary
+        color = getattr(record, 'color', self.COLORS.get(record.levelno, self.RESET))
+
+        if record.levelno >= logging.WARNING:
+            msg = f"{record.levelname}: {record.getMessage()}"
+        else:
+            msg = record.getMessage()
+        if record.exc_text:
+            msg = f"{msg}\n{record.exc_text}"
+
+        return f"{color}{msg}{self.RESET}"
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per record:
+
+        {"time": "2025-01-31 12:00:00.123", "level": "INFO", "logger": "consensus_builder",
+         "message": "Consensus built for HsOR1_1", "process": "MainProcess", "pid": 1234, ...extra fields}
+
+    Fields given with extra={...} are kept as they are (the console 'color' is left out).
+    """
+
+    # Attributes every LogRecord has, the others come from extra={...}
+    STANDARD = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "color"}
+
+    def format(self, record):
+        entry = {
+            "time": f"{self.formatTime(record, '%Y-%m-%d %H:%M:%S')}.{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "process": record.processName,
+            "pid": record.process,
+        }
+        entry.update({key: value for key, value in vars(record).items() if key not in self.STANDARD})
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class RecordQueueHandler(QueueHandler):
+    """
+    QueueHandler keeping the traceback apart from the message: the message is merged with its arguments and the
+    traceback is formatted into exc_text (exc_info is not picklable), instead of both being formatted into the
+    message. The handlers of the listener add it as usual, the .log file after the message, JsonFormatter as "exception".
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+
+class PipelineLogging:
+    """
+    Logging of the entry points (main.py, pm_main.py, data_to_pm_input.py, methods_summary.py):
+
+        console                      colored (ColorFormatter, extra={'color': ...} overrides the level color)
+        logs/{name}.log              "%(asctime)s %(levelname)s: %(message)s"
+        logs/{name}.jsonl            one JSON object per record (JsonFormatter)
+
+    The root logger only gets a QueueHandler: a logging call puts the record into a queue and returns,
+    formatting and writing happen in a QueueListener thread. Log with %-style arguments,
+    logger.info("Cavity %s of %s", n, or_name), so filtered out records are never formatted.
+
+    Worker processes (ProcessPoolExecutor etc.) send their records to the listener of the main process:
+        ProcessPoolExecutor(initializer=PipelineLogging.init_worker, initargs=(PipelineLogging.worker_queue(),))
+    """
+
+    _handlers: list[logging.Handler] = []
+    _listeners: list[QueueListener] = []
+    _worker_queue = None
+    _registered = False
+
+    @classmethod
+    def setup(cls, log_dir, log_name: str, level: int = logging.INFO, structured: bool = True) -> str:
+        """Replaces the handlers of the root logger, returns the path of the .log file"""
+        cls.shutdown()
+        log_dir = os.path.abspath(log_dir)
+        os.makedirs(log_dir, exist_ok=True)
+        log_path = os.path.join(log_dir, f"{log_name}.log")
+
+        console_handler = logging.StreamHandler()  # sys.stderr
+        console_handler.setFormatter(ColorFormatter())
+        file_handler = logging.FileHandler(log_path, encoding="utf-8")
+        file_handler.setFormatter(logging.Formatter(FILE_FORMAT))
+        cls._handlers = [console_handler, file_handler]
+        if structured:
+            json_handler = logging.FileHandler(os.path.join(log_dir, f"{log_name}.jsonl"), encoding="utf-8")
+            json_handler.setFormatter(JsonFormatter())
+            cls._handlers.append(json_handler)
+
+        log_queue = queue.SimpleQueue()
+        cls._start_listener(log_queue)
+        logging.basicConfig(level=level, handlers=[cls.queue_handler(log_queue)], force=True)
+        if not cls._registered:
+            atexit.register(cls.shutdown)
+            cls._registered = True
+        return log_path
+
+    @staticmethod
+    def queue_handler(log_queue) -> QueueHandler:
+        return RecordQueueHandler(log_queue)
+
+    @classmethod
+    def _start_listener(cls, log_queue) -> None:
+        listener = QueueListener(log_queue, *cls._handlers, respect_handler_level=True)
+        listener.start()
+        cls._listeners.append(listener)
+
+    @classmethod
+    def worker_queue(cls):
+        """
+        Queue for the records of worker processes (the argument of init_worker), served by a listener
+        of its own on the same handlers; None if setup() was not called (workers then log as configured).
+        A queue of the default multiprocessing context: the pool must use that context as well.
+        """
+        if not cls._handlers:
+            return None
+        if cls._worker_queue is None:
+            cls._worker_queue = multiprocessing.Queue()
+            cls._start_listener(cls._worker_queue)
+        return cls._worker_queue
+
+    @staticmethod
+    def init_worker(log_queue, level: int = logging.INFO) -> None:
+        """Initializer of a worker process: its records go to log_queue (a forked worker would log into the
+        in-process queue of its parent, that no one reads)"""
+        if log_queue is not None:
+            logging.basicConfig(level=level, handlers=[PipelineLogging.queue_handler(log_queue)], force=True)
+
+    @classmethod
+    def shutdown(cls) -> None:
+        """Writes out the queued records and closes the handlers (at exit, or before a new setup())"""
+        for listener in cls._listeners:
+            listener.stop()
+        cls._listeners = []
+        if cls._worker_queue is not None:
+            cls._worker_queue.close()
+            cls._worker_queue = None
+        for handler in cls._handlers:
+            handler.close()
+        cls._handlers = []
@@ -1,23 +1,37 @@
-import configparser
+import io
 import logging
 import os
 
 import pandas as pd
 import stat
-import shutil
 
+from batch_progress import BatchProgress
 from cavities_usage import CavitiesUsage
+from consensus_manifest import ConsensusManifest
+from consensus_result import ConsensusResult
+from file_staging import FileStaging
+from lake_repository import FolderLakeRepository
+from pipeline_config import PipelineConfig
+from pymol_selection import PymolSelection
+from run_manifest import RunManifest
+from stage_timer import StageTimer
 
 logger = logging.getLogger(__name__)
 
-def read_config():
-    config = configparser.ConfigParser()
-    config.read('pm_config.ini')
-    return {
-        'pdb_file': config['visualization']['pdb_file'],
-        'pm_output_dir': config['visualization']['pm_output_dir'],
-        'pm_input_dir': config['visualization']['pm_input_dir']
-    }
+# Output modes of prepare_for_pymol:
+#   per_method - one script/session per method workbook and one for the consensus (5 per OR)
+#   per_or     - one script/session per OR, the structure is loaded once, method-prefixed selections are grouped per method
+SESSION_MODES = ("per_method", "per_or")
+
+# Define colors for each cavity
+CAVITY_COLORS = {
+    "consensus" : "red",
+    "cav_1": "orange",
+    "cav_2": "yellow",
+    "cav_3": "cyan",
+    "cav_4": "blue",
+    "cav_5": "magenta"
+}
 
 def read_input_xlsx_files(directory):
     # Initialize the main dictionary to store all data
@@ -75,7 +89,8 @@ def read_input_xlsx_files(directory):
 
                         # Extract the "Seq ID" column
                         if "Seq ID" in df.columns:
-                            seq_ids = df["Seq ID"].dropna().astype(str).tolist()
+                            # (chain, seq id) if the sheet has a 'Chain' column
+                            seq_ids = PymolSelection.residues_from_sheet(df)
                             file_data[sheet_short_name] = seq_ids
                             logger.info(
                                 f"  Found {len(seq_ids)} seq IDs in {sheet_name} ({len(seq_ids)}, expected to be distinct)")
@@ -90,28 +105,64 @@ def read_input_xlsx_files(directory):
 
     return all_files_data
 
+def write_script_if_changed(pml_path, text) -> bool:
+    """
+    Writes the script atomically (temporary file + rename) and only if its content changed,
+    so an unchanged script keeps its timestamp and its rendered session is not considered stale.
+    Returns True if the file was written.
+    """
+    if os.path.isfile(pml_path):
+        with open(pml_path, 'r') as f:
+            if f.read() == text:
+                return False
+
+    tmp_path = f"{pml_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, pml_path)
+    return True
+
+def remove_stale_scripts(output_dir, generated_scripts: list[str]) -> None:
+    """Removes .pml scripts (with their .pse/.png) that were not generated in this run, e.g. after a session mode change."""
+    for filename in os.listdir(output_dir):
+        if not filename.endswith(".pml") or filename in generated_scripts:
+            continue
+        file_key = os.path.splitext(filename)[0]
+        for stale in (f"{file_key}.pml", f"{file_key}.pse", f"{file_key}.png"):
+            stale_path = os.path.join(output_dir, stale)
+            if os.path.isfile(stale_path):
+                os.remove(stale_path)
+        logger.info(f"  Removed stale script {filename} and its sessions")
+
+def remove_stale_inputs(input_dir, output_dir) -> None:
+    """Removes staged input files (workbooks, pdb) that are no longer in input_dir, e.g. a method removed from PM_INPUT.
+    Scripts and their sessions are left to remove_stale_scripts, the manifests are rewritten by the run."""
+    input_files = set(os.listdir(input_dir))
+    for filename in os.listdir(output_dir):
+        if (filename in input_files or filename.endswith((".pml", ".pse", ".png"))
+                or filename in (ConsensusManifest.MANIFEST_NAME, RunManifest.MANIFEST_NAME)):
+            continue
+        stale_path = os.path.join(output_dir, filename)
+        if os.path.isfile(stale_path):
+            os.remove(stale_path)
+            logger.info(f"  Removed stale input {filename}")
+
 def generate_multi_cav_pml(all_files_data, pdb_dir, output_dir):
     """
     Generates PyMOL scripts for each file_key in all_files_data.
     Creates 5 selections (cav_1 to cav_5) with distinct colors and saves .pml, .pse, and .png files.
+    Selections are compacted into residue ranges per chain (see PymolSelection), e.g. 'chain A and resi 12-14+20'.
 
     Args:
         all_files_data (dict): Dictionary returned by read_input_xlsx_files.
         pdb_dir (str): Directory containing PDB files (named as {file_key}.pdb).
         output_dir (str): Directory to save output files.
-    """
-    # Define colors for each cavity
-    cavity_colors = {
-        "consensus" : "red",
-        "cav_1": "orange",
-        "cav_2": "yellow",
-        "cav_3": "cyan",
-        "cav_4": "blue",
-        "cav_5": "magenta"
-    }
 
+    Returns the names of the scripts, only changed scripts are rewritten (see write_script_if_changed).
+    """
     # Ensure output directory exists
     os.makedirs(output_dir, exist_ok=True)
+    generated_scripts = []
 
     # Iterate over each file_key in all_files_data
     for file_key, cavities in all_files_data.items():
@@ -131,73 +182,149 @@ def generate_multi_cav_pml(all_files_data, pdb_dir, output_dir):
         logger.info(f"Generating PyMOL script for {file_key}...")
 
         # Write the .pml script
-        with open(pml_path, 'w') as f:
+        with io.StringIO() as f:
             f.write(f"cd {output_dir_path}\n")
             f.write(f"load {pdb_base}.pdb\n")
 
             # Create selections and color them for each cavity
             for cav_name, seq_ids in cavities.items():
                 if seq_ids:  # Only process if seq_ids is not empty
-                    selection = " or ".join([f"resi {res}" for res in seq_ids])
+                    selection = PymolSelection.compile(seq_ids)
                     f.write(f"select {cav_name}, {selection}\n")
                     f.write(f"show sticks, {cav_name}\n")
-                    f.write(f"color {cavity_colors[cav_name]}, {cav_name}\n")
+                    f.write(f"color {CAVITY_COLORS[cav_name]}, {cav_name}\n")
 
             # Save the session and image
             f.write(f"save {file_key}.pse\n")
             f.write("ray 800, 600\n")
             # f.write(f"png {file_key}.png\n")  # png file looks not needed any more
             # f.write("quit\n")
+            changed = write_script_if_changed(pml_path, f.getvalue())
+
+        generated_scripts.append(os.path.basename(pml_path))
+        logger.info(f"  Generated script {pml_path}" if changed else f"  Script {pml_path} is up to date")
+
+    return generated_scripts
+
+
+def generate_or_session_pml(all_files_data, or_name, output_dir):
+    """
+    Generates a single PyMOL script (and session) {or_name}.pml / {or_name}.pse for all the files of the OR.
+    The structure is loaded once, the cavities of every method get method-prefixed selections
+    (cspf_cav_1, ..., pupp_cav_5) grouped per method, the consensus is selected as 'consensus'.
+    The consensus is colored last, so it stays on top of the method cavities.
+
+    Args:
+        all_files_data (dict): Dictionary returned by read_input_xlsx_files (for one OR).
+        or_name (str): OR name, the structure is {or_name}.pdb.
+        output_dir (str): Directory to save output files.
+
+    Returns the name of the script (in a list), it is rewritten only if changed (see write_script_if_changed).
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    pml_path = os.path.join(output_dir, f"{or_name}.pml")
+    output_dir_path = os.path.join(os.path.abspath(__file__), output_dir)
+
+    # Method workbooks first (sorted), then the consensus
+    file_keys = sorted(all_files_data, key=lambda k: (k.endswith("_consensus"), k))
+
+    logger.info(f"Generating PyMOL session script for {or_name}...")
+    with io.StringIO() as f:
+        f.write(f"cd {output_dir_path}\n")
+        f.write(f"load {or_name}.pdb\n")
+
+        for file_key in file_keys:
+            # '{OR}_cspf' -> 'cspf'
+            method = file_key[len(or_name) + 1:] if file_key.startswith(f"{or_name}_") else file_key
+            group_members = []
+            for cav_name, seq_ids in all_files_data[file_key].items():
+                if not seq_ids:
+                    continue
+                selection_name = cav_name if cav_name == "consensus" else f"{method}_{cav_name}"
+                f.write(f"select {selection_name}, {PymolSelection.compile(seq_ids)}\n")
+                f.write(f"show sticks, {selection_name}\n")
+                f.write(f"color {CAVITY_COLORS[cav_name]}, {selection_name}\n")
+                group_members.append(selection_name)
+
+            if method != "consensus" and group_members:
+                f.write(f"group {method}, {' '.join(group_members)}\n")
 
-        logger.info(f"  Generated script {pml_path}")
+        f.write(f"save {or_name}.pse\n")
+        f.write("ray 800, 600\n")
+        changed = write_script_if_changed(pml_path, f.getvalue())
 
+    logger.info(f"  Generated script {pml_path}" if changed else f"  Script {pml_path} is up to date")
+    return [os.path.basename(pml_path)]
 
-def prepare_for_pymol(input_directory, output_directory, use_cavities_dict, copy_input=False):
+
+@StageTimer.timed("prepare_for_pymol")
+def prepare_for_pymol(input_directory, output_directory, use_cavities_dict, copy_input=False, force=False,
+                      consensus_results: dict[str, ConsensusResult] = None, session_mode: str = "per_method",
+                      staging: FileStaging = None, or_names: list[str] = None):
     """
-    Prepares PyMOL scripts for all 1st-level subdirectories in input_directory.
+    Prepares PyMOL scripts for all 1st-level subdirectories in input_directory (or only for or_names).
     Verifies .pdb and .xlsx files, creates output subdirectories, and generates PyMOL scripts.
 
     Args:
         input_directory (str): Path to the input directory containing 1st-level subdirectories.
         output_directory (str): Path to the output directory where results will be saved.
-        copy_input (bool): If True, copies input files to the output subdirectories.
+        copy_input (bool): If True, copies input files to the output subdirectories
+                      (hard links / reflinks where possible, see staging).
+        staging (FileStaging): How input files are staged into the output, by default FileStaging(compare="mtime"):
+                      links where possible, unchanged files are not staged again.
+        force (bool): If True, regenerates the scripts even for ORs whose output was built from the current consensus
+                      (see ConsensusManifest), otherwise such ORs are skipped.
+        consensus_results (dict): OR name -> ConsensusResult returned by ConsensusBuilder.process_multi_or_folder,
+                      scripts of these ORs are generated from memory, other ORs are read from their .xlsx files.
+        session_mode (str): 'per_method' - 5 scripts per OR (4 methods and consensus),
+                      'per_or' - a single script/session per OR with method-prefixed selections (see SESSION_MODES).
+        or_names (list): Only these subdirectories (e.g. the ORs just staged), by default all of input_directory.
     """
+    if session_mode not in SESSION_MODES:
+        raise ValueError(f"Unknown PyMol session mode '{session_mode}', allowed: {SESSION_MODES}")
+    if staging is None:
+        staging = FileStaging(compare="mtime")
+
     # Ensure output directory exists
     os.makedirs(output_directory, exist_ok=True)
 
+    input_subdirs = list(or_names) if or_names is not None else os.listdir(input_directory)
     subdir_names_to_iterate = []
     if True: # use_cavities_dict is not None:
 
         # Verify whether -REST: "0" is present. If yes,  all non_key directories should be skipped (continue)
         if (use_cavities_dict is not None) and (CavitiesUsage.has_rest_zero(use_cavities_dict)):
-            non_rest_yaml_keys = [key for item in use_cavities_dict for key in item.keys() if key != "REST"]
-            subdir_names_to_iterate = non_rest_yaml_keys
+            # Only ORs having an explicit key or matching an OR family rule
+            subdir_names_to_iterate = CavitiesUsage.compile(use_cavities_dict).select(input_subdirs)
             logger.info(f"prepare_for_pymol: REST: '0' found, the following subdirs are to be used for pymol scripts renewing: {subdir_names_to_iterate}")
         else:
-            subdir_names_to_iterate = os.listdir(input_directory)
+            subdir_names_to_iterate = input_subdirs
             logger.info(
                 f"prepare_for_pymol: All subdirs from {input_directory} are to be used for pymol scripts renewing: {subdir_names_to_iterate}")
 
+    subdir_names_to_iterate = [name for name in subdir_names_to_iterate
+                               if os.path.isdir(os.path.join(input_directory, name))]
+    progress = BatchProgress("pymol_scripts", len(subdir_names_to_iterate), "ORs")
+
     # Iterate over 1st-level subdirectories in input_directory
     for subdir_name in subdir_names_to_iterate:
         subdir_path = os.path.join(input_directory, subdir_name)
 
-        # Skip if not a directory
-        if not os.path.isdir(subdir_path):
-            continue
-
         logger.info(f"\nPymol script preparation: Processing subdirectory: {subdir_name}")
 
         # Step 1: Verify .pdb file
         pdb_files = [f for f in os.listdir(subdir_path) if f.endswith('.pdb')]
         if len(pdb_files) != 1:
             logger.warning(f"  Warning: Not found .pdb file in {subdir_name}, (found {len(pdb_files)} .pdbs), skipping PyMOL scripts for {subdir_name}")
+            progress.finished_job(subdir_name, f"found {len(pdb_files)} .pdb files")
             continue
 
         pdb_file = pdb_files[0]
         or_name = subdir_name
         if not pdb_file.startswith(or_name):
             logger.info(f"  Warning: PDB file '{pdb_file}' does not start with '{or_name}' in {subdir_name}")
+            progress.finished_job(subdir_name, f"PDB file {pdb_file} does not start with {or_name}")
             continue
 
         # Step 2: Verify .xlsx files (exclude hidden files)
@@ -225,33 +352,63 @@ def prepare_for_pymol(input_directory, output_directory, use_cavities_dict, copy
             logger.warning("Continue preparation only for existing files")
             #continue
 
-        # Step 3: Create output subdirectory
+        # Step 3: Create output subdirectory (existing one is updated in place, only stale files are rewritten)
         output_subdir = os.path.join(output_directory, subdir_name)
-        if os.path.exists(output_subdir):
-            logger.warning(f"!!!!!!!!!!!!  Warning: Output directory '{output_subdir}' already exists, deleting it   !!!!!!!!!!!")
-            shutil.rmtree(output_subdir)  # Delete existing subdirectory
-        os.makedirs(output_subdir)
-
-        # Step 4: Copy input files if requested
-        if copy_input:
-            for filename in os.listdir(subdir_path):
-                src_path = os.path.join(subdir_path, filename)
-                dst_path = os.path.join(output_subdir, filename)
-                if os.path.isfile(src_path):
-                    shutil.copy2(src_path, dst_path)
-
-        # Step 5: Read .xlsx files and generate PyMOL scripts
-        # Consensus file needs special treatment
-        all_files_data = read_input_xlsx_files(subdir_path)
-        generate_multi_cav_pml(all_files_data, subdir_path, output_subdir)
+        # Script of the chosen mode must exist as well, otherwise the output was generated in another mode
+        expected_script = f"{or_name}.pml" if session_mode == "per_or" else f"{or_name}_consensus.pml"
+        if (not force and ConsensusManifest.is_output_current(subdir_path, output_subdir)
+                and os.path.isfile(os.path.join(output_subdir, expected_script))):
+            logger.info(f"PyMol scripts of {subdir_name} were built from the current consensus, skipping")
+            progress.skip(subdir_name)
+            continue
+
+        with progress.job(subdir_name):
+            if os.path.exists(output_subdir):
+                logger.info(f"Output directory '{output_subdir}' already exists, updating stale files only")
+            os.makedirs(output_subdir, exist_ok=True)
+
+            # Step 4: Copy input files if requested (changed files only)
+            if copy_input:
+                for filename in os.listdir(subdir_path):
+                    # Manifests are written to the output only after the scripts are generated
+                    if filename in (ConsensusManifest.MANIFEST_NAME, RunManifest.MANIFEST_NAME, FolderLakeRepository.HASHES_NAME):
+                        continue
+                    src_path = os.path.join(subdir_path, filename)
+                    dst_path = os.path.join(output_subdir, filename)
+                    if os.path.isfile(src_path):
+                        staging.stage_file(src_path, dst_path)
+                remove_stale_inputs(subdir_path, output_subdir)
+
+            # Step 5: Read .xlsx files (unless the consensus of this run is in memory) and generate PyMOL scripts
+            # Consensus file needs special treatment
+            with StageTimer.span("pymol_scripts", or_name=subdir_name), \
+                    RunManifest.stage(subdir_path, "pymol_scripts", session_mode=session_mode) as run_parts:
+                if consensus_results and subdir_name in consensus_results:
+                    logger.info(f"Using in-memory consensus of {subdir_name}, .xlsx files are not read again")
+                    all_files_data = consensus_results[subdir_name].to_pymol_data()
+                else:
+                    all_files_data = read_input_xlsx_files(subdir_path)
+                if session_mode == "per_or":
+                    generated_scripts = generate_or_session_pml(all_files_data, or_name, output_subdir)
+                else:
+                    generated_scripts = generate_multi_cav_pml(all_files_data, subdir_path, output_subdir)
+                remove_stale_scripts(output_subdir, generated_scripts)
+                run_parts["scripts"] = generated_scripts
+            # The run manifest (with all the stages up to the scripts) travels to the output as well
+            RunManifest.write(output_subdir, RunManifest.read(subdir_path))
+            # Recorded last: if the run breaks before, the OR is regenerated next time
+            ConsensusManifest.mark_output(subdir_path, output_subdir)
 
         logger.info(f"Pymol script preparation: Completed for {subdir_name}")
 
+    progress.finish()
+    if copy_input:
+        logger.info(f"Input files staged to {output_directory}: {staging.summary()}")
+
 
 def main():
-    config = read_config()
-    pm_input_dir=config['pm_input_dir']
-    pm_output_dir=config['pm_output_dir']
-    prepare_for_pymol(pm_input_dir, pm_output_dir, copy_input=True)
+    visualization = PipelineConfig.load(data_lakes=("visualization",)).visualization
+    prepare_for_pymol(visualization.pm_input_dir, visualization.pm_output_dir, None, copy_input=True,
+                      session_mode=visualization.pymol_session_mode)
 if __name__ == "__main__":
     main()
@@ -1,5 +1,4 @@
 import argparse
-import configparser
 import os
 from datetime import datetime
 import logging
@@ -7,50 +6,94 @@ import logging
 import traceback
 import yaml
 
+from batch_progress import BatchProgress
 from cavities_usage import CavitiesUsage
+from cavity_mask_sweep import CavityMaskSweep
+from consensus_facts import ConsensusFactTable
 from consensus_builder import ConsensusBuilder
-from pm_coloring import prepare_for_pymol
+from file_staging import FileStaging
+from lake_repository import FolderLakeRepository, LakeRepository, SqliteLakeRepository, transfer
+from pipeline_config import PipelineConfig
+from pipeline_logging import PipelineLogging
+from pm_coloring import prepare_for_pymol, SESSION_MODES
+from pymol_batch_renderer import PymolBatchRenderer
+from run_profiler import RunProfiler
+from stage_timer import StageTimer
 
 from pymol_scripts_exception import PymolScriptsException
 
-# Color formatting class for console output
-class ColorFormatter(logging.Formatter):
-    COLORS = {
-        logging.DEBUG: "\033[37m",     # Gray
-        logging.INFO: "\033[0m",       # Default
-        logging.WARNING: "\033[33m",   # Yellow
-        logging.ERROR: "\033[31m",     # Red
-        logging.CRITICAL: "\033[41m",  # Red background
-    }
+# Set a specific logger for the project
+logger = logging.getLogger(__name__)
 
-    RESET = "\033[0m"
 
-    def format(self, record):
-        # Use custom color if specified in the record's extra dictionary
-        color = getattr(record, 'color', self.COLORS.get(record.levelno, self.RESET))
+def load_cavity_masks(use_cavities_file: str):
+    """use_cavities.yaml validated and indexed once for the whole run (CavitiesUsage.compile), None if it is empty"""
+    with open(use_cavities_file, "r") as f:
+        use_cavities_dict = yaml.safe_load(f)
+    logger.debug(f"use_cavities: {use_cavities_dict}")
+    return CavitiesUsage.compile(use_cavities_dict) if use_cavities_dict else None
 
-        if record.levelno >= logging.WARNING:
-            msg = f"{record.levelname}: {record.getMessage()}"
-        else:
-            msg = record.getMessage()
-
-        return f"{color}{msg}{self.RESET}"
-
-# End of ColorFormatter class
 
+def build_consensus(config: PipelineConfig, cavity_masks, interactive: bool = False, consensus_method: int = 1,
+                    force: bool = False, fact_table: bool = True, or_names: list[str] | None = None):
+    """
+    Builds the consensus of the ORs in PM_INPUT (ConsensusBuilder.process_multi_or_folder, or_names: only these ORs):
+    with the cross-OR fact table (unless fact_table is False) and the SQLite data lake (PipelineConfig.lake_db, if any).
+    Returns the applied cavity masks and OR name -> ConsensusResult, to be handed over to prepare_scripts().
+    """
+    pm_input_dir = config.visualization.pm_input_dir
+    data_lake_dir = config.visualization.data_lake_dir
 
+    # Cross-OR fact table in the data lake (parquet, needs pyarrow), one appended file per run
+    consensus_facts = None
+    if not fact_table:
+        logger.info("Consensus fact table is not updated (--no-fact-table)")
+    else:
+        try:
+            import pyarrow
+            consensus_facts = ConsensusFactTable(data_lake_dir)
+        except ImportError:
+            logger.warning("pyarrow is not installed, consensus fact table is not updated (pip install pyarrow)")
+
+    # SQLite data lake (optional): its method tables and PDBs are exported to the PM_INPUT folders (for PyMol),
+    # the consensus is built from its tables and stored back into it
+    repository = None
+    if config.lake_db:
+        repository = SqliteLakeRepository(config.lake_db)
+        counts = transfer(repository, FolderLakeRepository(pm_input_dir),
+                          kinds=tuple(kind for kind in LakeRepository.KINDS if kind != "consensus"))
+        logger.info(f"Data lake database {repository.db_path} exported to {pm_input_dir}: "
+                    f"{counts['written']} tables written, {counts['unchanged']} unchanged")
 
+    try:
+        return ConsensusBuilder.process_multi_or_folder(pm_input_dir,
+                                                        config.visualization.best_cavity_strategy,
+                                                        cavity_masks,
+                                                        interactive,
+                                                        consensus_method,
+                                                        config.consensus_rules,
+                                                        fact_table=consensus_facts,
+                                                        run_id=datetime.now().strftime("%y%m%d_%H%M%S"),
+                                                        force=force,
+                                                        repository=repository,
+                                                        or_names=or_names)
+    finally:
+        if repository is not None:
+            repository.close()
+
+
+def prepare_scripts(config: PipelineConfig, final_cavities_dict, consensus_results=None, session_mode: str | None = None,
+                    force: bool = False, or_names: list[str] | None = None) -> None:
+    """
+    PyMol scripts of the ORs in PM_INPUT (or_names: only these ORs) written to PM_OUTPUT (prepare_for_pymol),
+    the ORs of consensus_results (built in this run) from memory. session_mode None: pymol_session_mode of pm_config.ini.
+    """
+    visualization = config.visualization
+    prepare_for_pymol(visualization.pm_input_dir, visualization.pm_output_dir, final_cavities_dict, copy_input=True,
+                      force=force, consensus_results=consensus_results,
+                      session_mode=session_mode or visualization.pymol_session_mode,
+                      staging=FileStaging(visualization.staging_mode, compare="mtime"), or_names=or_names)
 
-def read_config():
-    config = configparser.ConfigParser()
-    config.read('pm_config.ini')
-    return {
-        'pm_output_dir': config['visualization']['pm_output_dir'],
-        'pm_input_dir': config['visualization']['pm_input_dir'],
-        'data_lake_dir': config['visualization']['data_lake_dir'],
-        'best_cavity_strategy': config['visualization']['best_cavity_strategy'],
-        'use_cavities': config['visualization']['use_cavities'],
-    }
 
 
 def main():
@@ -61,22 +104,9 @@ def main():
     log_dir = f"{script_dir}/../logs"
     os.makedirs(log_dir, exist_ok=True)
 
-    handler = logging.StreamHandler() # sys.stderr
-    handler.setFormatter(ColorFormatter())
-
-    file_handler = logging.FileHandler(f"{log_dir}/pm_main_{timestamp}.log")
-                                       #"log_data_to_pm.log")
-    file_handler.setFormatter(
-        logging.Formatter("%(asctime)s %(levelname)s: %(message)s")
-    )
-
-    logging.basicConfig(
-        level=logging.INFO,
-        handlers=[
-            handler, file_handler
-        ]
-    )
-    # end of logger settings
+    PipelineLogging.setup(log_dir, f"pm_main_{timestamp}")
+    StageTimer.configure(log_dir, f"pm_main_{timestamp}")
+    BatchProgress.configure(log_dir, f"pm_main_{timestamp}")
 
     # Handling the command-lin arguments (only for interactive mode for now)
     parser = argparse.ArgumentParser(description="PYMOL scripts command-line description")
@@ -95,29 +125,77 @@ def main():
         help="Number of consensus methods to use, default is 1"
     )
 
-    # Set a specific logger for the project
-    logger = logging.getLogger(__name__)
-    config = read_config()
-    config['script_dir'] = script_dir
-    data_lake_dir = os.path.join(script_dir, config['data_lake_dir'])
-    print("data_lake_dir: ", config['data_lake_dir'])
-    if not os.path.exists(data_lake_dir):
-        raise FileNotFoundError(f"Data lake '{data_lake_dir}' does not exist, please reconfigure the pipeline")
-    else:
-        config['data_lake_dir'] = data_lake_dir
-        print(f"Using Data Lake: {data_lake_dir}")
+    parser.add_argument(
+        "-f", "--force",
+        action="store_true",
+        help="Rebuild consensus and PyMol scripts for all ORs, even if their inputs did not change since the last run"
+    )
+
+    parser.add_argument(
+        "--no-fact-table",
+        action="store_true",
+        help="Do not append this run's consensus rows to the cross-OR fact table in the data lake"
+    )
+
+    parser.add_argument(
+        "--sweep",
+        action="store_true",
+        help="Only rank all 625 cavity masks per OR by inter-method agreement and suggest use_cavities.yaml, "
+             "no consensus and PyMol scripts are built"
+    )
+
+    parser.add_argument(
+        "--sweep-metric",
+        choices=list(CavityMaskSweep.METRICS),
+        default="jaccard",
+        help="Agreement metric for --sweep: mean pairwise jaccard (default) or pairwise intersection size"
+    )
 
-    config['pm_input_dir'] = os.path.join(data_lake_dir, config['pm_input_dir'])
-    config['pm_output_dir'] = os.path.join(data_lake_dir, config['pm_output_dir'])
+    parser.add_argument(
+        "--sweep-top",
+        type=int,
+        default=10,
+        help="Number of best masks per OR written to the sweep workbook, default is 10"
+    )
+
+    parser.add_argument(
+        "--session-mode",
+        choices=list(SESSION_MODES),
+        default=None,
+        help="PyMol output: per_method (5 sessions per OR) or per_or (one session per OR), "
+             "default is pymol_session_mode of pm_config.ini"
+    )
 
-    pm_input_dir=config['pm_input_dir']
-    pm_output_dir=config['pm_output_dir']
+    parser.add_argument(
+        "--render",
+        action="store_true",
+        help="Render the generated PyMol scripts headlessly into .pse sessions (needs PyMOL python API, pymol2)"
+    )
 
-    # selenium_output_dir=config['selenium_output_dir']
-    best_cavity_strategy=config['best_cavity_strategy']
-    use_cavities_file=config['use_cavities']
+    parser.add_argument(
+        "--render-workers",
+        type=int,
+        default=None,
+        help="Number of PyMOL worker processes for --render, default is performance.workers of pm_config.ini "
+             "(0 - the number of CPUs)"
+    )
+
+    parser.add_argument(
+        "--render-png",
+        action="store_true",
+        help="With --render, also ray trace a .png image for every script"
+    )
+
+    PipelineConfig.add_arguments(parser)
+    # Handled by RunProfiler.run() (see __main__), listed here for the help and the argument check
+    RunProfiler.add_arguments(parser)
 
     args = parser.parse_args()
+    config = PipelineConfig.load(args.config_overrides, data_lakes=("visualization",))
+
+    pm_input_dir=config.visualization.pm_input_dir
+    pm_output_dir=config.visualization.pm_output_dir
+    consensus_rules=config.consensus_rules
     if args.interactive:
         logger.info("Interactive mode enabled")
     else:
@@ -128,33 +206,45 @@ def main():
     else:
         logger.info(f"Consensus method: {args.consensus_method}  (as default)")
 
+    if consensus_rules:
+        logger.info(f"Extra consensus rules from pm_config.ini: {consensus_rules}")
+
+
+    if args.sweep:
+        logger.info(f"Cavity mask sweep mode ({args.sweep_metric}) for {pm_input_dir}")
+        try:
+            CavityMaskSweep.sweep_multi_or_folder(pm_input_dir, args.sweep_metric, args.sweep_top)
+        except PymolScriptsException as e:
+            logging.error(f"Error sweeping cavity masks in {pm_input_dir}: {e}")
+        return
 
     try:
         # 1. Creating consensus file (in a pm_input dir for further script creation)
         logger.info(f"Beginning to process  {pm_input_dir} at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 
-        with open(use_cavities_file, "r") as f:
-            use_cavities_dict = yaml.safe_load(f)
-
-        CavitiesUsage.verify(use_cavities_dict)
-        print(use_cavities_dict)
+        # Cavity masks are validated and indexed once for the whole run
+        cavity_masks = load_cavity_masks(config.visualization.use_cavities)
 
-        final_cavities_dict = ConsensusBuilder.process_multi_or_folder(pm_input_dir,
-                                                                    best_cavity_strategy,
-                                                                    use_cavities_dict,
-                                                                    args.interactive,
-                                                                    args.consensus_method)
+        final_cavities_dict, consensus_results = build_consensus(config, cavity_masks, args.interactive,
+                                                                 args.consensus_method, args.force,
+                                                                 fact_table=not args.no_fact_table)
 
         logger.info(f"Successfully processed {pm_input_dir},  at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 
         # 2. Preparing coloring scripts for PyMol
         logger.info(f"Starting task: PyMol script preparation for {pm_input_dir}.")
         # looks to be called for all, even is REST: 0
-        prepare_for_pymol(pm_input_dir, pm_output_dir, final_cavities_dict, copy_input=True)
+        # ORs built in this run are handed over in memory, their workbooks are not read again
+        prepare_scripts(config, final_cavities_dict, consensus_results, args.session_mode, args.force)
         logger.info(
             f"Completed task:  PyMol script preparation to {pm_output_dir}, exiting at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
             extra={'color': '\033[32m'})
 
+        # 3. Rendering the scripts into PyMol sessions (optional)
+        if args.render:
+            workers = args.render_workers if args.render_workers is not None else config.performance.render_workers
+            PymolBatchRenderer.render_output_folder(pm_output_dir, workers, args.render_png, args.force)
+
     except ValueError as e:
         logging.error(f"Exception type: {type(e)}")  # Debugging line
         logging.error(f"Value Error processing {pm_input_dir},: {e} at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
@@ -166,7 +256,10 @@ def main():
         logging.critical(f"Unexpected error when processing {pm_input_dir}: {e} at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         traceback.print_exc()  # Print the full traceback
 
+    StageTimer.log_summary()
+
 
 
 if __name__ == "__main__":
-    main()
+    # --profile cpu|mem runs main() under cProfile / tracemalloc, the reports go to the logs folder
+    RunProfiler.run(main, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "logs"), "pm_main", StageTimer)
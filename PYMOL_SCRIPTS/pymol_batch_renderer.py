@@ -0,0 +1,161 @@
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from pipeline_logging import PipelineLogging
+
+logger = logging.getLogger(__name__)
+
+
+def _pymol2():
+    """
+    The PyMOL python API, None if it is not installed (only the .pml scripts are then generated, to be run
+    in the PyMOL GUI). Imported on first use: a run without --render does not pay for it.
+    """
+    try:
+        import pymol2
+    except ImportError:
+        return None
+    return pymol2
+
+
+# Commands of the generated scripts that are replaced by the renderer's own load/save/png calls
+_SKIPPED_COMMANDS = ("cd", "load", "save", "ray", "png", "quit")
+
+# One headless PyMOL instance per worker process, started by _init_worker
+_pymol = None
+
+
+def _init_worker(log_queue=None, log_level=logging.INFO):
+    global _pymol
+    PipelineLogging.init_worker(log_queue, log_level)
+    _pymol = _pymol2().PyMOL()
+    _pymol.start()
+
+
+def _script_commands(pml_path) -> list[str]:
+    commands = []
+    with open(pml_path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#") and line.split()[0] not in _SKIPPED_COMMANDS:
+                commands.append(line)
+    return commands
+
+
+def _render_or(or_dir: str, pml_files: list[str], png: bool, width: int, height: int) -> tuple[str, float, int]:
+    """
+    Worker: loads the OR structure once and renders all its method overlays (.pml scripts) from it.
+    Returns (or_dir, seconds, number of rendered scripts).
+    """
+    started = time.perf_counter()
+    cmd = _pymol.cmd
+    or_name = os.path.basename(or_dir)
+
+    cmd.reinitialize()
+    cmd.load(os.path.join(or_dir, f"{or_name}.pdb"), or_name)
+    # The freshly loaded structure is restored before every overlay instead of reading the PDB again
+    loaded_session = cmd.get_session()
+
+    for pml_file in pml_files:
+        cmd.set_session(loaded_session)
+        for command in _script_commands(os.path.join(or_dir, pml_file)):
+            cmd.do(command, echo=0)
+
+        # Saved under temporary names and renamed, a broken run never leaves a partial session
+        file_key = os.path.splitext(pml_file)[0]
+        tmp_pse = os.path.join(or_dir, f".{file_key}.tmp.pse")
+        cmd.save(tmp_pse)
+        if png:
+            tmp_png = os.path.join(or_dir, f".{file_key}.tmp.png")
+            cmd.png(tmp_png, width=width, height=height, ray=1)
+            os.replace(tmp_png, os.path.join(or_dir, f"{file_key}.png"))
+        os.replace(tmp_pse, os.path.join(or_dir, f"{file_key}.pse"))
+
+    return or_dir, time.perf_counter() - started, len(pml_files)
+
+
+class PymolBatchRenderer:
+    """
+    Runs the generated .pml scripts headlessly through the PyMOL python API (pymol2), in a pool of
+    worker processes, one OR per task: the OR structure is loaded once, then every method overlay is applied
+    to it and saved as {file_key}.pse (and {file_key}.png if requested).
+
+    ORs whose .pse files are newer than their .pml scripts are skipped unless forced.
+    """
+
+    WIDTH = 800
+    HEIGHT = 600
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return _pymol2() is not None
+
+    @classmethod
+    def scripts_to_render(cls, or_dir, force: bool = False) -> list[str]:
+        """The .pml scripts of the OR directory whose .pse output is missing or older than the script."""
+        pml_files = sorted(f for f in os.listdir(or_dir) if f.endswith(".pml"))
+        if force:
+            return pml_files
+
+        outdated = []
+        for pml_file in pml_files:
+            pse_path = os.path.join(or_dir, f"{os.path.splitext(pml_file)[0]}.pse")
+            if not os.path.isfile(pse_path) or os.path.getmtime(pse_path) < os.path.getmtime(os.path.join(or_dir, pml_file)):
+                outdated.append(pml_file)
+        return outdated
+
+    @classmethod
+    def render_output_folder(cls, pm_output_dir: str, workers: int | None = None, png: bool = False,
+                             force: bool = False) -> dict[str, float]:
+        """
+        Renders the scripts of all OR subdirectories of pm_output_dir.
+        Returns OR name -> rendering time in seconds (only for the rendered ORs).
+        """
+        if not cls.is_available():
+            logger.warning("PyMOL python API (pymol2) is not importable, .pse files are not rendered, "
+                           "run the .pml scripts in PyMOL instead")
+            return {}
+
+        tasks = {}
+        for sub in sorted(os.listdir(pm_output_dir)):
+            or_dir = os.path.join(pm_output_dir, sub)
+            if not os.path.isdir(or_dir):
+                continue
+            if not os.path.isfile(os.path.join(or_dir, f"{sub}.pdb")):
+                logger.warning(f"Rendering skipped for {sub}: {sub}.pdb not found in {or_dir}")
+                continue
+            pml_files = cls.scripts_to_render(or_dir, force)
+            if pml_files:
+                tasks[or_dir] = pml_files
+            else:
+                logger.info(f"Rendered sessions of {sub} are up to date, skipping")
+
+        if not tasks:
+            logger.info("Nothing to render")
+            return {}
+
+        workers = min(workers or os.cpu_count() or 1, len(tasks))
+        logger.info(f"Rendering {sum(len(f) for f in tasks.values())} scripts of {len(tasks)} ORs with {workers} PyMOL workers")
+
+        started = time.perf_counter()
+        timings = {}
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(PipelineLogging.worker_queue(), logging.getLogger().level)) as pool:
+            futures = {pool.submit(_render_or, or_dir, pml_files, png, cls.WIDTH, cls.HEIGHT): or_dir
+                       for or_dir, pml_files in tasks.items()}
+            for future in as_completed(futures):
+                or_name = os.path.basename(futures[future])
+                try:
+                    _, seconds, rendered = future.result()
+                except Exception as e:
+                    logger.error(f"Rendering failed for {or_name}: {e}")
+                    continue
+                timings[or_name] = seconds
+                logger.info(f"Rendered {rendered} sessions of {or_name} in {seconds:.2f} s")
+
+        elapsed = time.perf_counter() - started
+        logger.info(f"Rendering completed for {len(timings)} of {len(tasks)} ORs in {elapsed:.2f} s"
+                    + (f", {sum(timings.values()) / len(timings):.2f} s per OR on average" if timings else ""))
+        return timings
@@ -0,0 +1,88 @@
+import re
+
+import pandas as pd
+
+# Residue numbers as read from the workbooks: "250", 250, 250.0, "250.0"
+_RESI_NUMBER = re.compile(r"^-?\d+(\.0*)?$")
+
+
+class PymolSelection:
+    """
+    Compiles residue lists into compact PyMOL selection expressions.
+    Residue numbers are sorted, duplicates dropped and consecutive runs collapsed into ranges:
+        [12, 13, 14, 20, 33, 34, 35]            -> resi 12-14+20+33-35
+        [("A", 12), ("A", 13), ("B", 40)]       -> (chain A and resi 12-13) or (chain B and resi 40)
+    Residues are either plain residue numbers or (chain, residue number) tuples.
+    Residue ids with insertion codes (e.g. "100A") are kept as separate items.
+    """
+
+    @classmethod
+    def residues_from_sheet(cls, df: pd.DataFrame) -> list:
+        """
+        Residues of a cavity worksheet: (chain, seq id) tuples if the sheet has a 'Chain' column,
+        plain 'Seq ID' values otherwise (rows without Seq ID are dropped).
+        """
+        if "Chain" not in df.columns:
+            return df["Seq ID"].dropna().astype(str).tolist()
+        rows = df[["Chain", "Seq ID"]].dropna(subset=["Seq ID"])
+        return [(None if pd.isna(chain) else str(chain).strip(), str(seq_id))
+                for chain, seq_id in rows.itertuples(index=False)]
+
+    @classmethod
+    def _split(cls, residue) -> tuple[str | None, int | str]:
+        chain, resi = residue if isinstance(residue, tuple) else (None, residue)
+        text = str(resi).strip()
+        if _RESI_NUMBER.match(text):
+            return chain or None, int(float(text))
+        return chain or None, text
+
+    @classmethod
+    def _format_number(cls, number: int) -> str:
+        # A negative residue number has to be escaped, otherwise '-' is read as a range
+        return f"\\{number}" if number < 0 else str(number)
+
+    @classmethod
+    def compact_resi(cls, resi_values) -> str:
+        """'12-14+20+33-35' for the given residue numbers (and insertion-code ids, appended as they are)."""
+        numbers = sorted({r for r in resi_values if isinstance(r, int)})
+        others = sorted({r for r in resi_values if not isinstance(r, int)})
+
+        items = []
+        start = previous = None
+        for number in numbers:
+            if previous is not None and number == previous + 1:
+                previous = number
+                continue
+            if start is not None:
+                items.append(cls._range(start, previous))
+            start = previous = number
+        if start is not None:
+            items.append(cls._range(start, previous))
+
+        return "+".join(items + others)
+
+    @classmethod
+    def _range(cls, start: int, end: int) -> str:
+        if start == end:
+            return cls._format_number(start)
+        return f"{cls._format_number(start)}-{cls._format_number(end)}"
+
+    @classmethod
+    def compile(cls, residues) -> str:
+        """Selection expression for the residues, '' if there are none."""
+        by_chain: dict[str | None, list] = {}
+        for residue in residues:
+            chain, resi = cls._split(residue)
+            by_chain.setdefault(chain, []).append(resi)
+
+        if not by_chain:
+            return ""
+
+        clauses = []
+        for chain in sorted(by_chain, key=lambda c: (c is not None, c or "")):
+            resi = f"resi {cls.compact_resi(by_chain[chain])}"
+            clauses.append(resi if chain is None else f"chain {chain} and {resi}")
+
+        if len(clauses) == 1:
+            return clauses[0]
+        return " or ".join(f"({clause})" for clause in clauses)
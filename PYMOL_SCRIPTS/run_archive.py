@@ -0,0 +1,195 @@
+import argparse
+import io
+import json
+import logging
+import os
+import shutil
+import zipfile
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+class RunArchive:
+    """
+    Compacted archive of a finished run: all its OR folders packed into one compressed {run}.zip
+    (by default in the OLD_DATA folder of the Selenium output), instead of thousands of small files.
+
+    The archive embeds an index as its last member (index.json):
+        {"version", "run", "created",
+         "ors": {"HsOR1_1": [{"name": "HsOR1_1/HsOR1_1_cspf_residues.xlsx", "size", "compressed_size", "crc"}, ...]}}
+    Members are compressed one by one (deflate) and located through the zip directory, so a single OR
+    (or a single table) is read or extracted without unpacking the rest of the archive.
+    """
+
+    INDEX_NAME = "index.json"
+    VERSION = 1
+    EXTENSION = ".zip"
+    # Subfolders of a run folder that are not ORs
+    EXCLUDED_DIRS = ("OLD_DATA",)
+
+    @classmethod
+    def _subdirs(cls, run_dir) -> list[str]:
+        with os.scandir(run_dir) as entries:
+            return sorted(e.name for e in entries if e.is_dir() and not e.name.startswith("."))
+
+    @classmethod
+    def pack(cls, run_dir, archive_dir, run_name: str | None = None, remove: bool = False) -> str:
+        """
+        Packs the OR folders of run_dir into {archive_dir}/{run_name}.zip (run_name defaults to the folder name).
+        The archive is written under a temporary name, verified and only then renamed,
+        with remove=True the packed OR folders (and run_dir, if it is left empty) are deleted afterwards.
+        Returns the archive path.
+        """
+        run_name = run_name or os.path.basename(os.path.normpath(run_dir))
+        os.makedirs(archive_dir, exist_ok=True)
+        archive_path = os.path.join(archive_dir, f"{run_name}{cls.EXTENSION}")
+        if os.path.exists(archive_path):
+            raise FileExistsError(f"Archive {archive_path} already exists, choose another run name")
+
+        # The archive folder itself (e.g. packing the Selenium output into its own OLD_DATA) is never packed
+        or_names = [name for name in cls._subdirs(run_dir)
+                    if name not in cls.EXCLUDED_DIRS
+                    and os.path.abspath(os.path.join(run_dir, name)) != os.path.abspath(archive_dir)]
+        tmp_path = f"{archive_path}.tmp"
+        with zipfile.ZipFile(tmp_path, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=9) as zf:
+            for or_name in or_names:
+                or_dir = os.path.join(run_dir, or_name)
+                for root, dirs, files in os.walk(or_dir):
+                    dirs.sort()
+                    for filename in sorted(files):
+                        path = os.path.join(root, filename)
+                        zf.write(path, os.path.relpath(path, run_dir).replace(os.sep, "/"))
+
+            index = {"version": cls.VERSION, "run": run_name,
+                     "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                     "ors": {or_name: [] for or_name in or_names}}
+            for info in zf.infolist():
+                index["ors"][info.filename.split("/", 1)[0]].append(
+                    {"name": info.filename, "size": info.file_size,
+                     "compressed_size": info.compress_size, "crc": info.CRC})
+            zf.writestr(cls.INDEX_NAME, json.dumps(index, indent=1))
+
+        with zipfile.ZipFile(tmp_path) as zf:
+            broken = zf.testzip()
+        if broken is not None:
+            os.remove(tmp_path)
+            raise OSError(f"Archive of {run_dir} is corrupted (member {broken}), the run folder is kept")
+        os.replace(tmp_path, archive_path)
+
+        members = sum(len(m) for m in index["ors"].values())
+        logger.info(f"Packed {len(or_names)} ORs ({members} files) of {run_dir} into {archive_path} "
+                    f"({os.path.getsize(archive_path) / 1024 / 1024:.1f} MB)")
+
+        if remove:
+            for or_name in or_names:
+                shutil.rmtree(os.path.join(run_dir, or_name))
+            if not os.listdir(run_dir):
+                os.rmdir(run_dir)
+            logger.info(f"Packed OR folders removed from {run_dir}")
+        return archive_path
+
+    @classmethod
+    def pack_folders(cls, old_data_dir, remove: bool = True) -> list[str]:
+        """
+        Packs every run subfolder of old_data_dir (e.g. OLD_DATA) into its own archive next to it,
+        runs that already have an archive are skipped. Returns the paths of the new archives.
+        """
+        archive_paths = []
+        for run_name in cls._subdirs(old_data_dir):
+            if os.path.exists(os.path.join(old_data_dir, f"{run_name}{cls.EXTENSION}")):
+                logger.warning(f"Run {run_name} is not packed, {old_data_dir} already has an archive of that name")
+                continue
+            archive_paths.append(cls.pack(os.path.join(old_data_dir, run_name), old_data_dir, run_name, remove))
+        return archive_paths
+
+    @classmethod
+    def _index(cls, zf: zipfile.ZipFile) -> dict:
+        return json.loads(zf.read(cls.INDEX_NAME))
+
+    @classmethod
+    def read_index(cls, archive_path) -> dict:
+        with zipfile.ZipFile(archive_path) as zf:
+            return cls._index(zf)
+
+    @classmethod
+    def find(cls, archive_dir, or_name: str) -> dict[str, list[str]]:
+        """Archives of archive_dir containing the OR: archive path -> member names (only the indexes are read)."""
+        found = {}
+        for filename in sorted(os.listdir(archive_dir)):
+            if not filename.endswith(cls.EXTENSION):
+                continue
+            archive_path = os.path.join(archive_dir, filename)
+            members = cls.read_index(archive_path)["ors"].get(or_name)
+            if members:
+                found[archive_path] = [m["name"] for m in members]
+        return found
+
+    @classmethod
+    def extract_or(cls, archive_path, or_name: str, target_dir) -> str:
+        """Extracts only the members of the OR into target_dir/{or_name}, returns that folder."""
+        with zipfile.ZipFile(archive_path) as zf:
+            members = cls._index(zf)["ors"].get(or_name)
+            if not members:
+                raise KeyError(f"{or_name} is not in the archive {archive_path}")
+            for member in members:
+                zf.extract(member["name"], target_dir)
+        return os.path.join(target_dir, or_name)
+
+    @classmethod
+    def read_tables(cls, archive_path, or_name: str, name_filter: str = "") -> dict:
+        """
+        Reads the .xlsx tables of the OR straight from the archive, without extracting anything:
+        file name -> sheet name -> DataFrame (only file names containing name_filter, e.g. 'cspf_residues').
+        """
+        import pandas as pd
+
+        tables = {}
+        with zipfile.ZipFile(archive_path) as zf:
+            for member in cls._index(zf)["ors"].get(or_name, []):
+                filename = member["name"].rsplit("/", 1)[-1]
+                if filename.endswith(".xlsx") and name_filter in filename:
+                    tables[filename] = pd.read_excel(io.BytesIO(zf.read(member["name"])), sheet_name=None)
+        return tables
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+    parser = argparse.ArgumentParser(description="Packs finished runs into indexed archives and reads ORs back from them")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    pack = subparsers.add_parser("pack", help="Pack the OR folders of a run folder into one archive")
+    pack.add_argument("run_dir", help="Folder of OR subfolders of a finished run")
+    pack.add_argument("archive_dir", help="Folder of the archives, e.g. output/OLD_DATA")
+    pack.add_argument("--name", default=None, help="Run name (archive file name), default is the run folder name")
+    pack.add_argument("--remove", action="store_true", help="Delete the packed OR folders afterwards")
+
+    pack_old = subparsers.add_parser("pack-old", help="Pack every run subfolder of OLD_DATA into its own archive")
+    pack_old.add_argument("old_data_dir", help="OLD_DATA folder")
+    pack_old.add_argument("--keep", action="store_true", help="Keep the packed folders")
+
+    find = subparsers.add_parser("find", help="List the archives (and members) containing an OR")
+    find.add_argument("archive_dir")
+    find.add_argument("or_name")
+
+    extract = subparsers.add_parser("extract", help="Extract a single OR from an archive")
+    extract.add_argument("archive_path")
+    extract.add_argument("or_name")
+    extract.add_argument("target_dir")
+
+    args = parser.parse_args()
+    if args.command == "pack":
+        RunArchive.pack(args.run_dir, args.archive_dir, args.name, args.remove)
+    elif args.command == "pack-old":
+        RunArchive.pack_folders(args.old_data_dir, remove=not args.keep)
+    elif args.command == "find":
+        for archive_path, members in RunArchive.find(args.archive_dir, args.or_name).items():
+            print(archive_path)
+            for member in members:
+                print(f"    {member}")
+    else:
+        logger.info(f"Extracted to {RunArchive.extract_or(args.archive_path, args.or_name, args.target_dir)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+import json
+import logging
+import os
+import platform
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from importlib import metadata
+
+from file_staging import file_hash_record
+
+logger = logging.getLogger(__name__)
+
+
+class RunManifest:
+    """
+    Machine-readable record of what happened to one OR, kept as a hidden json file in the OR folder
+    (Selenium output folder, then PM_INPUT folder, the file travels with the OR folder):
+
+        {
+          "or_name": "HsOR1_1",
+          "pdb": {"file", "sha256", "size", "mtime_ns"},
+          "methods": {"cspf": {"file", "sha256", "size", "mtime_ns", "rows", "cavities"}, ...},
+          "consensus": {"file", "sha256", ..., "rows", "consensus_size", "mask"},
+          "stages": {"cspf": {"started", "seconds", "status", "error", "tools"}, "data_to_pm_input": {...}, ...},
+          "errors": [{"stage", "time", "error"}, ...]
+        }
+
+    Every stage of the pipeline updates its own part, later stages read the recorded file hashes
+    and counts instead of opening the files again (see file_record).
+    """
+
+    MANIFEST_NAME = ".run_manifest.json"
+    VERSION = 1
+    # Packages whose versions are recorded with every stage (if installed)
+    TOOL_PACKAGES = ("pandas", "openpyxl", "selenium", "pymol-open-source", "pyarrow")
+    # Top-level parts of the manifest, other values given to stage() are kept in the stage record
+    PARTS = ("pdb", "methods", "consensus", "errors")
+
+    @classmethod
+    def path(cls, or_dir) -> str:
+        return os.path.join(or_dir, cls.MANIFEST_NAME)
+
+    @classmethod
+    def read(cls, or_dir) -> dict:
+        """The manifest of the OR folder, an empty one if the folder has none (or it is unreadable)."""
+        path = cls.path(or_dir)
+        if os.path.isfile(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    return json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not read run manifest {path}: {e}, a new one is started")
+        return {"version": cls.VERSION, "or_name": os.path.basename(os.path.normpath(or_dir)),
+                "pdb": None, "methods": {}, "consensus": None, "stages": {}, "errors": []}
+
+    @classmethod
+    def write(cls, or_dir, manifest: dict) -> None:
+        # Replaced, never written in place: the file may be hard-linked into another data lake folder
+        path = cls.path(or_dir)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def _apply(cls, manifest: dict, parts: dict) -> None:
+        for key, value in parts.items():
+            if value is None:
+                continue
+            if key in ("methods", "stages"):
+                manifest.setdefault(key, {}).update(value)
+            elif key == "errors":
+                errors = manifest.setdefault("errors", [])
+                errors.extend(e for e in value if e not in errors)
+            else:
+                manifest[key] = value
+
+    @classmethod
+    def update(cls, or_dir, **parts) -> dict:
+        """
+        Reads the manifest, updates the given top-level parts and writes it back.
+        'methods' and 'stages' entries are merged, 'errors' are appended, None parts are ignored.
+        """
+        os.makedirs(or_dir, exist_ok=True)
+        manifest = cls.read(or_dir)
+        cls._apply(manifest, parts)
+        cls.write(or_dir, manifest)
+        return manifest
+
+    @classmethod
+    def merge_from(cls, src_dir, dst_dir, **parts) -> dict:
+        """
+        Updates the manifest of dst_dir with everything recorded in the manifest of src_dir
+        (the same OR in the previous data lake folder) and with parts.
+        Records of later stages already in dst_dir are kept.
+        """
+        os.makedirs(dst_dir, exist_ok=True)
+        manifest = cls.read(dst_dir)
+        if os.path.isfile(cls.path(src_dir)):
+            src = cls.read(src_dir)
+            cls._apply(manifest, {key: src.get(key) for key in ("pdb", "methods", "stages", "errors")})
+        cls._apply(manifest, parts)
+        cls.write(dst_dir, manifest)
+        return manifest
+
+    _tool_versions = None
+
+    @classmethod
+    def tool_versions(cls) -> dict[str, str]:
+        # Looked up once per process
+        if cls._tool_versions is None:
+            versions = {"python": platform.python_version()}
+            for package in cls.TOOL_PACKAGES:
+                try:
+                    versions[package] = metadata.version(package)
+                except metadata.PackageNotFoundError:
+                    pass
+            cls._tool_versions = versions
+        return dict(cls._tool_versions)
+
+    @classmethod
+    def file_record(cls, path, previous: dict | None = None, **counts) -> dict:
+        """
+        {'file', 'sha256', 'size', 'mtime_ns', **counts} of a file.
+        The hash of previous (the record of the same file from a manifest) is reused if size and mtime did not change.
+        """
+        return {"file": os.path.basename(path), **file_hash_record(path, previous), **counts}
+
+    @classmethod
+    def staged_unchanged(cls, src_dir, dst_dir, files: dict) -> bool:
+        """
+        True if the OR folder src_dir was staged to dst_dir and did not change since: the method outputs recorded
+        in the manifest of src_dir are all its files (files: {relative path: {'size', 'mtime_ns'}}, as in the output
+        inventory) with the recorded sizes and mtimes, and dst_dir holds them with the same records.
+        Decided from the manifests and file stats alone, no file is opened.
+        """
+        methods = cls.read(src_dir).get("methods") or {}
+        if not methods or cls.read(dst_dir).get("methods") != methods:
+            return False
+        recorded = {record["file"]: record for record in methods.values()}
+        if set(recorded) != {name for name in files if name != cls.MANIFEST_NAME}:
+            return False
+        for name, record in recorded.items():
+            try:
+                dst_stat = os.stat(os.path.join(dst_dir, name))
+            except OSError:
+                return False
+            for size, mtime_ns in ((files[name]["size"], files[name]["mtime_ns"]),
+                                   (dst_stat.st_size, dst_stat.st_mtime_ns)):
+                if size != record.get("size") or mtime_ns != record.get("mtime_ns"):
+                    return False
+        return True
+
+    @classmethod
+    def known_record(cls, manifest: dict, path) -> dict | None:
+        """Recorded pdb/method/consensus record of the file with this name (None if the manifest does not know it)."""
+        name = os.path.basename(path)
+        candidates = [manifest.get("pdb"), manifest.get("consensus"), *manifest.get("methods", {}).values()]
+        return next((record for record in candidates if record and record.get("file") == name), None)
+
+    @classmethod
+    def stage_record(cls, started: datetime, seconds: float, status: str = "ok", error: str | None = None, **extra) -> dict:
+        """Record of one stage run, as stored in 'stages'."""
+        return {"started": started.strftime("%Y-%m-%d %H:%M:%S"), "seconds": round(seconds, 3), "status": status,
+                "error": error, "tools": cls.tool_versions(), **extra}
+
+    @classmethod
+    @contextmanager
+    def stage(cls, or_dir, stage_name: str, **parts):
+        """
+        Times a pipeline stage of the OR and records it (status ok/error, seconds, tool versions) together with parts,
+        e.g.  with RunManifest.stage(or_dir, "cspf"): run_castpfold(...)
+        An exception is recorded in the stage and in the errors list and re-raised.
+        Additional parts can be set inside the block:  with RunManifest.stage(...) as parts: parts["consensus"] = ...
+        Values that are not manifest PARTS (e.g. parts["scripts"]) are stored in the stage record.
+        """
+        started = datetime.now()
+        start = time.perf_counter()
+        status, error = "ok", None
+        extra = dict(parts)
+        try:
+            yield extra
+        except BaseException as e:
+            status, error = "error", f"{type(e).__name__}: {e}"
+            extra["errors"] = [{"stage": stage_name, "time": started.strftime("%Y-%m-%d %H:%M:%S"), "error": error}]
+            raise
+        finally:
+            stage_extra = {key: value for key, value in extra.items() if key not in cls.PARTS}
+            record = cls.stage_record(started, time.perf_counter() - start, status, error, **stage_extra)
+            try:
+                cls.update(or_dir, stages={stage_name: record},
+                           **{key: value for key, value in extra.items() if key in cls.PARTS})
+            except OSError as e:
+                logger.warning(f"Could not update run manifest of {or_dir}: {e}")
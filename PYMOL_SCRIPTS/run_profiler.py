@@ -0,0 +1,179 @@
+import argparse
+import cProfile
+import io
+import logging
+import os
+import pstats
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+class RunProfiler:
+    """
+    --profile {cpu,mem} of the entry points (main.py, pm_main.py, data_to_pm_input.py, methods_summary.py),
+    the reports go to the logs folder:
+
+        cpu: the whole run under cProfile -> profile_{run}_{time}.prof (for pstats / snakeviz) and
+             profile_{run}_{time}_cpu.txt (top functions by own and by cumulative time), the hottest are logged
+        mem: the whole run under tracemalloc -> profile_{run}_{time}_mem.txt: peak memory, the top allocations
+             alive at the end and, per stage of StageTimer (top-level spans), the top allocations made in the stage;
+             with a timer every span also gets its memory growth ('mem_kb') in the spans file
+    """
+
+    KINDS = ("cpu", "mem")
+    TOP = 25
+    # Allocations are compared (two snapshots, slow) for at most this many top-level spans of a stage
+    SNAPSHOT_SPANS = 50
+
+    @classmethod
+    def add_arguments(cls, parser: argparse.ArgumentParser) -> None:
+        parser.add_argument(
+            "--profile",
+            choices=cls.KINDS,
+            default=None,
+            help="Profile the run: cpu (cProfile, .prof file) or mem (tracemalloc, allocations per stage), "
+                 "reports are written to the logs folder"
+        )
+        parser.add_argument(
+            "--profile-top",
+            type=int,
+            default=cls.TOP,
+            help=f"Number of functions / allocation sites in the profile reports (default: {cls.TOP})"
+        )
+
+    @classmethod
+    def run(cls, func, log_dir, run_name: str, timer=None):
+        """
+        Runs the entry point func() under the --profile / --profile-top of the command line (if given),
+        for entry points parsing their arguments themselves (they add_arguments() to their parser as well).
+        """
+        parser = argparse.ArgumentParser(add_help=False)
+        cls.add_arguments(parser)
+        args, _ = parser.parse_known_args()
+        with cls.profile(args.profile, log_dir, run_name, args.profile_top, timer):
+            return func()
+
+    @classmethod
+    @contextmanager
+    def profile(cls, kind: str | None, log_dir, run_name: str, top: int = TOP, timer=None):
+        """
+        Profiles the enclosed code, kind None does nothing.
+        timer: StageTimer class whose spans are the stages of the memory report.
+        """
+        if kind is None:
+            yield None
+            return
+        if kind not in cls.KINDS:
+            raise ValueError(f"Unknown profile '{kind}', expected one of {cls.KINDS}")
+
+        log_dir = os.path.abspath(log_dir)
+        os.makedirs(log_dir, exist_ok=True)
+        base_path = os.path.join(log_dir, f"profile_{run_name}_{datetime.now().strftime('%y%m%d_%H%M%S')}")
+        if kind == "cpu":
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                yield profiler
+            finally:
+                profiler.disable()
+                cls.write_cpu_report(profiler, base_path, top)
+        else:
+            tracer = AllocationTracer(top)
+            tracer.start(timer)
+            try:
+                yield tracer
+            finally:
+                tracer.stop(timer)
+                tracer.write_report(f"{base_path}_mem.txt")
+
+    @staticmethod
+    def write_cpu_report(profiler: cProfile.Profile, base_path: str, top: int) -> None:
+        profiler.dump_stats(f"{base_path}.prof")
+        text = io.StringIO()
+        stats = pstats.Stats(profiler, stream=text).strip_dirs()
+        stats.sort_stats("tottime").print_stats(top)
+        hottest = text.getvalue()
+        stats.sort_stats("cumulative").print_stats(top)
+        with open(f"{base_path}_cpu.txt", "w", encoding="utf-8") as f:
+            f.write(text.getvalue())
+        logger.info(f"CPU profile written to {base_path}.prof and {base_path}_cpu.txt, "
+                    f"hottest functions (own time):\n{hottest}")
+
+
+class AllocationTracer:
+    """tracemalloc over a run, a StageTimer observer: memory growth of every span, allocations per stage"""
+
+    # Allocation sites left out of the reports (filtering the statistics, filter_traces() is far too slow)
+    IGNORED = (tracemalloc.__file__, "<frozen importlib._bootstrap>", "<frozen importlib._bootstrap_external>",
+               "<unknown>")
+
+    def __init__(self, top: int):
+        self.top = top
+        # id of a running span -> (traced memory at its start, snapshot at its start or None)
+        self.running: dict[int, tuple[int, tracemalloc.Snapshot | None]] = {}
+        # stage -> allocation site -> [size, blocks] allocated in the compared spans of the stage
+        self.stages: dict[str, dict[str, list[int]]] = {}
+        self.compared: dict[str, int] = {}
+        self.final: tracemalloc.Snapshot | None = None
+        self.peak = 0
+        self.current = 0
+
+    def reported(self, statistics: list) -> list:
+        return [stat for stat in statistics if stat.traceback[0].filename not in self.IGNORED]
+
+    def start(self, timer=None) -> None:
+        # One frame per allocation: the reports are by source line
+        tracemalloc.start(1)
+        if timer is not None:
+            timer.add_observer(self)
+
+    def stop(self, timer=None) -> None:
+        if timer is not None:
+            timer.remove_observer(self)
+        self.final = tracemalloc.take_snapshot()
+        self.current, self.peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    def span_started(self, span: dict, parent: dict | None) -> None:
+        snapshot = None
+        if parent is None and self.compared.get(span["stage"], 0) < RunProfiler.SNAPSHOT_SPANS:
+            snapshot = tracemalloc.take_snapshot()
+        self.running[id(span)] = (tracemalloc.get_traced_memory()[0], snapshot)
+
+    def span_finished(self, span: dict, record: dict) -> None:
+        started = self.running.pop(id(span), None)
+        if started is None:
+            return
+        memory, snapshot = started
+        record["mem_kb"] = round((tracemalloc.get_traced_memory()[0] - memory) / 1024, 1)
+        if snapshot is None:
+            return
+
+        stage = span["stage"]
+        self.compared[stage] = self.compared.get(stage, 0) + 1
+        sites = self.stages.setdefault(stage, {})
+        for stat in self.reported(tracemalloc.take_snapshot().compare_to(snapshot, "lineno")):
+            if stat.size_diff > 0:
+                site = sites.setdefault(str(stat.traceback), [0, 0])
+                site[0] += stat.size_diff
+                site[1] += stat.count_diff
+
+    def write_report(self, path: str) -> None:
+        summary = [f"Peak traced memory: {self.peak / 2 ** 20:.1f} MiB, at the end: {self.current / 2 ** 20:.1f} MiB"]
+        for stage, sites in sorted(self.stages.items(), key=lambda item: -sum(s[0] for s in item[1].values())):
+            summary.append(f"Stage {stage}: +{sum(s[0] for s in sites.values()) / 1024:.1f} KiB allocated "
+                           f"in {self.compared[stage]} compared spans")
+
+        lines = summary + ["", f"Top {self.top} allocations alive at the end of the run:"]
+        lines += [f"  {stat}" for stat in self.reported(self.final.statistics("lineno"))[:self.top]]
+        for stage, sites in self.stages.items():
+            lines += ["", f"Top {self.top} allocations of stage {stage}:"]
+            for site, (size, blocks) in sorted(sites.items(), key=lambda item: -item[1][0])[:self.top]:
+                lines.append(f"  {site}: +{size / 1024:.1f} KiB in {blocks} blocks")
+
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        logger.info(f"Memory profile written to {path}:\n" + "\n".join(summary))
@@ -6,27 +6,33 @@ from pymol_scripts_exception import PymolScriptsException
 
 logger = logging.getLogger(__name__)
 
+
+def plddt_from_pdb_lines(lines) -> list[tuple[str, int, float]]:
+    """(chain, seq id, pLDDT) of every residue of the PDB text lines (B-factor column of its first atom)."""
+    rows = []
+    seen = set()
+
+    for line in lines:
+        if line.startswith("ATOM"):
+            fields = line.split()
+            chain = fields[4]
+            seq_id = fields[5]
+            chain_seq_id = (chain, seq_id)
+
+            if chain_seq_id not in seen:
+                seen.add(chain_seq_id)
+                plddt = float(fields[10])
+                rows.append((chain, seq_id, plddt))
+
+    return rows
+
+
 class ScoreHandler:
 
     @classmethod
     def extract_plddt_by_residue(cls, pdb_file) -> list[tuple[str, int, float]]:
-        rows = []
-        seen = set()
-
         with open(pdb_file) as f:
-            for line in f:
-                if line.startswith("ATOM"):
-                    fields = line.split()
-                    chain = fields[4]
-                    seq_id = fields[5]
-                    chain_seq_id = (chain, seq_id)
-
-                    if chain_seq_id not in seen:
-                        seen.add(chain_seq_id)
-                        plddt = float(fields[10])
-                        rows.append((chain, seq_id, plddt))
-
-        return rows
+            return plddt_from_pdb_lines(f)
 
     @classmethod
     def collect_subdir_plddt(
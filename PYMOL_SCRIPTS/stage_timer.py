@@ -0,0 +1,151 @@
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Enclosing span of the current call (nested spans take its OR and method)
+_current_span: ContextVar[dict | None] = ContextVar("current_span", default=None)
+
+
+class StageTimer:
+    """
+    Timing spans around the pipeline stages, one JSON line per finished span in logs/spans_{run}.jsonl:
+
+        {"run": "main_250131_1200", "or_name": "HsOR1_1", "method": "cvpl", "stage": "upload_and_submit_pdb",
+         "parent": "run_cavity_plus", "start": "2025-01-31 12:00:00.123", "seconds": 12.345,
+         "outcome": "ok" | "error", "error": null}
+
+    Spans nest: or_name and method, if not given, are taken from the enclosing span.
+        with StageTimer.span("consensus", or_name=sub): ...
+        @StageTimer.timed("run_castpfold", method="cspf", or_arg="pdb_file")
+
+    Without configure() spans are only kept in memory (for summary()).
+    """
+
+    _path: str | None = None
+    _run: str | None = None
+    _records: list[dict] = []
+    _lock = threading.Lock()
+    # Notified around every span: observer.span_started(span, parent), observer.span_finished(span, record)
+    _observers: list = []
+
+    @classmethod
+    def configure(cls, log_dir, run_name: str) -> str:
+        """Starts writing the spans of this run to {log_dir}/spans_{run_name}.jsonl, returns the file path."""
+        os.makedirs(log_dir, exist_ok=True)
+        cls._run = run_name
+        cls._path = os.path.join(log_dir, f"spans_{run_name}.jsonl")
+        cls._records = []
+        return cls._path
+
+    @classmethod
+    def add_observer(cls, observer) -> None:
+        """observer is notified around every span (e.g. the AllocationTracer of RunProfiler), it may extend the record"""
+        cls._observers.append(observer)
+
+    @classmethod
+    def remove_observer(cls, observer) -> None:
+        cls._observers.remove(observer)
+
+    @classmethod
+    def _record(cls, record: dict) -> None:
+        with cls._lock:
+            cls._records.append(record)
+            if cls._path is not None:
+                with open(cls._path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record) + "\n")
+
+    @classmethod
+    @contextmanager
+    def span(cls, stage: str, or_name: str | None = None, method: str | None = None):
+        parent = _current_span.get()
+        current = {
+            "stage": stage,
+            "or_name": or_name or (parent or {}).get("or_name"),
+            "method": method or (parent or {}).get("method"),
+        }
+        token = _current_span.set(current)
+        for observer in cls._observers:
+            observer.span_started(current, parent)
+        started = datetime.now()
+        start = time.perf_counter()
+        outcome, error = "ok", None
+        try:
+            yield current
+        except BaseException as e:
+            outcome, error = "error", f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current_span.reset(token)
+            record = {
+                "run": cls._run,
+                "or_name": current["or_name"],
+                "method": current["method"],
+                "stage": stage,
+                "parent": parent["stage"] if parent else None,
+                "start": started.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3],
+                "seconds": round(time.perf_counter() - start, 3),
+                "outcome": outcome,
+                "error": error,
+            }
+            for observer in cls._observers:
+                observer.span_finished(current, record)
+            cls._record(record)
+
+    @classmethod
+    def timed(cls, stage: str, method: str | None = None, or_arg: str | None = None):
+        """
+        Decorator: every call of the function is a span.
+        or_arg: name of the argument holding the OR (a name, a pdb file name or an OR folder path).
+        """
+        def decorator(func):
+            code = func.__code__
+            arg_names = code.co_varnames[:code.co_argcount]
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                or_name = None
+                if or_arg is not None:
+                    value = kwargs.get(or_arg)
+                    if value is None and or_arg in arg_names and arg_names.index(or_arg) < len(args):
+                        value = args[arg_names.index(or_arg)]
+                    if value is not None:
+                        or_name = os.path.splitext(os.path.basename(os.path.normpath(str(value))))[0]
+                with cls.span(stage, or_name=or_name, method=method):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    @classmethod
+    def summary(cls) -> list[dict]:
+        """Spans of this run per (method, stage): count, errors, total / mean / max seconds."""
+        groups: dict[tuple, list[dict]] = {}
+        for record in cls._records:
+            groups.setdefault((record["method"] or "", record["stage"]), []).append(record)
+
+        rows = []
+        for (method, stage), records in groups.items():
+            seconds = [r["seconds"] for r in records]
+            rows.append({"method": method, "stage": stage, "count": len(records),
+                         "errors": sum(r["outcome"] == "error" for r in records),
+                         "total": sum(seconds), "mean": sum(seconds) / len(seconds), "max": max(seconds)})
+        return sorted(rows, key=lambda row: -row["total"])
+
+    @classmethod
+    def log_summary(cls) -> None:
+        rows = cls.summary()
+        if not rows:
+            return
+        lines = [f"{'method':<8} {'stage':<36} {'count':>6} {'errors':>6} {'total s':>10} {'mean s':>9} {'max s':>9}"]
+        for row in rows:
+            lines.append(f"{row['method']:<8} {row['stage']:<36} {row['count']:>6} {row['errors']:>6} "
+                         f"{row['total']:>10.2f} {row['mean']:>9.2f} {row['max']:>9.2f}")
+        logger.info("Stage timings of this run" + (f" (spans in {cls._path})" if cls._path else "") + ":\n"
+                    + "\n".join(lines))
@@ -1,4 +1,3 @@
-import configparser
 import csv
 import logging
 import openpyxl
@@ -6,7 +5,6 @@ import os
 from pathlib import Path
 
 import time
-from configparser import SectionProxy
 from datetime import datetime
 
 from selenium.webdriver.common.by import By
@@ -16,7 +14,11 @@ from selenium.webdriver.support import expected_conditions as EC
 from castpfold_request import submit_castpfold_request
 from chrome_driver_factory import create_chrome_driver
 from file_namer import FileNamer, MethodType
-from utils import str_to_bool
+from service_latency import wait_until
+from utils import PYMOL_SCRIPTS_DIR  # puts PYMOL_SCRIPTS on the import path
+from file_staging import replacing_file
+from pipeline_config import PipelineConfig, SeleniumConfig
+from stage_timer import StageTimer
 
 logger = logging.getLogger(__name__)
 
@@ -43,12 +45,6 @@ def click_button_by_id(driver, button_id):
     button.click()
 
 
-def load_config():
-    config = configparser.ConfigParser()
-    config.read('config.ini')
-    return config['DEFAULT']
-
-
 def prepare_pocket_info_for_save(driver, pocket_limit):
     # Locate the table element
     table = driver.find_element(By.CSS_SELECTOR, "table")
@@ -140,7 +136,7 @@ def prepare_atom_info_for_save(driver, pocket_limit):
                         # Add the row to the set as a tuple (to avoid duplicates)
                         unique_atom_rows.add(tuple(atom_row))
 
-                logger.info(f"Atom pagination tab {ia} is displayed")
+                logger.info("Atom pagination tab %s is displayed", ia)
 
                 if ia < atom_tab_count:
                     next_button = ul_atom_pagination[-1].find_element(By.CSS_SELECTOR, "li.ant-pagination-next a")
@@ -178,7 +174,7 @@ def prepare_atom_info_for_save(driver, pocket_limit):
 
         except Exception as e:
 
-            logger.info(f"Error processing pocket {i}: {e} at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+            logger.info("Error processing pocket %s: %s", i, e)
             raise
 
     return cav_list_all_atom_rows
@@ -228,7 +224,9 @@ def write_cav_all_atom_rows_to_excel(headers, rows, cav_list_all_atom_rows, outp
 
     # Create the parent directory if it doesn't exist.
     excel_file_path.parent.mkdir(parents=True, exist_ok=True)
-    workbook.save(excel_file_path)
+    # Replacing the previous workbook (it may be hard-linked into PM_INPUT / PM_OUTPUT)
+    with replacing_file(excel_file_path) as tmp_path:
+        workbook.save(tmp_path)
     logger.info(f"All atom info saved to {excel_file_path} at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 
 def write_pockets_to_csv(headers, rows, output_directory, pdb_name):
@@ -247,6 +245,7 @@ def write_pockets_to_csv(headers, rows, output_directory, pdb_name):
     logger.info(f"Data written to {cspf_va_filename} at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 
 
+@StageTimer.timed("iterate_pagination", method="cspf", or_arg="pdb_name")
 def iterate_pagination(driver, output_directory, pdb_name: str, pocket_limit =1):
     if pocket_limit > 10:
         raise ValueError(f"Pocket limit cannot be greater than 10, however requested pocket_limit was set to {pocket_limit}")
@@ -273,7 +272,7 @@ def iterate_pagination(driver, output_directory, pdb_name: str, pocket_limit =1)
         )
 
         # Print the current tab number
-        logger.info(f"Pagination tab {i} is displayed")
+        logger.info("Pagination tab %s is displayed", i)
 
         # write_pocket_info_csv(driver, output_directory, pdb_name, pocket_limit)
         # open_atom_info_save_csv(driver, output_directory, pdb_name, pocket_limit)
@@ -306,42 +305,45 @@ def iterate_pagination(driver, output_directory, pdb_name: str, pocket_limit =1)
     logger.info(f"All {max_pagination_item-1} tabs displayed since pocket limit is set: {pocket_limit} at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 
 
-def run_castpfold(pdb_file, config: SectionProxy):
+@StageTimer.timed("run_castpfold", method="cspf", or_arg="pdb_file")
+def run_castpfold(pdb_file, config: SeleniumConfig):
     logger.info("Starting CASTpFold script...  at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 
-    chrome_driver_path = config['chrome_driver_path']
-    base_url = config['base_url']
-    output_directory = config['output_dir']
-    pocket_limit = int(config['pocket_limit'])
+    chrome_driver_path = config.chrome_driver_path
+    base_url = config.base_url
+    output_directory = config.output_dir
+    pocket_limit = config.pocket_limit
     # To be requested from the input directory using pdb_name
     logger.info(f"CASTpFold request for a file: {pdb_file}")
-    input_dir = config['input_dir']
-    headless = config['chrome_headless_mode']
+    input_dir = config.input_dir
 
     if not FileNamer.verify_pdb_exists(input_dir, pdb_file):
         raise Exception(f"File {pdb_file} does not exist in the {input_dir}")
-    job_number = submit_castpfold_request(os.path.join(input_dir, pdb_file))
+    # The job is submitted through the CASTpFold API, unless configured otherwise (castpfold_submit = False,
+    # e.g. against the local stand-in sites of stand_in_sites.py, which serve any job_number)
+    if config.castpfold_submit:
+        job_number = submit_castpfold_request(os.path.join(input_dir, pdb_file))
+    else:
+        job_number = config.job_number
+    job_wait = config.castpfold_job_wait
     pdb_name = os.path.splitext(pdb_file)[0]
     logger.info(f"CASTpFold script initialized from config, pocket_limit: {pocket_limit}")
 
     script_dir = os.path.dirname(os.path.abspath(__file__))
     download_dir = os.path.join(script_dir, "output")
 
-    use_headless_mode = str_to_bool(headless)
-    driver = create_chrome_driver(chrome_driver_path, download_dir, use_headless_mode)
+    driver = create_chrome_driver(chrome_driver_path, download_dir, config.chrome_headless_mode)
 
     try:
         # Open the specified URL
-        logger.info(f"Waiting 20 secs for the job to complete...")
-        time.sleep(20)
+        logger.info(f"Waiting {job_wait} secs for the job to complete...")
+        time.sleep(job_wait)
         logger.info(f"Loading castpFold page... at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         driver.get(f"{base_url}?{job_number}")
         # Wait until the button is visible and clickable
-        download_button = WebDriverWait(driver, 20).until(
-            EC.element_to_be_clickable(
-                (By.XPATH, "//button[contains(@class, 'ant-btn-primary') and .//span[text()='Download CASTpFold Data']]")
-            )
-        )
+        download_button = wait_until(driver, "cspf", "results_page", 20, EC.element_to_be_clickable(
+            (By.XPATH, "//button[contains(@class, 'ant-btn-primary') and .//span[text()='Download CASTpFold Data']]")
+        ))
         logger.info(f"Download button appeared with text: {download_button.text}")
         time.sleep(1)
         iterate_pagination(driver, output_directory=output_directory,pdb_name=pdb_name, pocket_limit=pocket_limit)
@@ -359,5 +361,5 @@ def run_castpfold(pdb_file, config: SectionProxy):
 
 
 if __name__ == '__main__':
-    config = load_config()
+    config = PipelineConfig.load(data_lakes=("selenium",)).selenium
     #run_castpfold("input/HsOR343CF_1", config)
\ No newline at end of file
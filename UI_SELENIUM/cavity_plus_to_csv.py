@@ -1,7 +1,6 @@
 import csv
 import os
-
-from configparser import SectionProxy
+import sys
 
 from datetime import datetime
 import logging
@@ -14,7 +13,11 @@ import time
 
 from chrome_driver_factory import create_chrome_driver
 from file_namer import FileNamer, MethodType
-from utils import load_config, str_to_bool
+from service_latency import ServiceLatency, wait_until
+from utils import PYMOL_SCRIPTS_DIR  # puts PYMOL_SCRIPTS on the import path
+from file_staging import replacing_file
+from pipeline_config import PipelineConfig, SeleniumConfig
+from stage_timer import StageTimer
 
 logger = logging.getLogger(__name__)
 
@@ -23,6 +26,7 @@ class CavityPlusUploadException(Exception):
     pass
 
 
+@StageTimer.timed("upload_and_submit_pdb", method="cvpl", or_arg="pdb_input")
 def upload_and_submit_pdb(driver, pdb_file_path, pdb_input):
     try:
         # Wait for the dropdown to be present
@@ -53,33 +57,35 @@ def upload_and_submit_pdb(driver, pdb_file_path, pdb_input):
             EC.presence_of_element_located(input_locator)
         )
 
-        max_attempts = 15
-        attempt = 0
+        # Upload timeout and poll interval follow the observed upload times (see ServiceLatency)
+        upload_timeout = ServiceLatency.timeout("cvpl", "upload", 15)
+        poll_interval = ServiceLatency.poll_interval("cvpl", "upload", 1.0)
         status_text = ""
 
-        while attempt < max_attempts:
-            # Find the sibling div after the input element
-            success_div = input_element.find_element(By.XPATH, "./following-sibling::div")
-            status_text = success_div.text
-
-            # Print the status
-            logger.info(f"Cavityplus upload pdb status: {status_text} at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-
-            # If status is "Success.", break the loop and continue
-            if status_text == "Success.":
-                logger.info(f"Upload successful. Continuing the script... at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-                break
-            # If status is "Uploading", wait 1 second and poll again
-            elif "Uploading" in status_text:
-                time.sleep(1)
-                attempt += 1
-            # If status is something else, raise an exception immediately
-            else:
-                raise CavityPlusUploadException(f"Cavityplus upload failed with status: {status_text} at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-
-        # If the loop completes without "Success.", raise an exception
-        if status_text != "Success.":
-            raise CavityPlusUploadException(f"CavityPlus upload timed out after {max_attempts} attempts. Last status: {status_text}")
+        with ServiceLatency.measure("cvpl", "upload", upload_timeout):
+            deadline = time.monotonic() + upload_timeout
+            while time.monotonic() < deadline:
+                # Find the sibling div after the input element
+                success_div = input_element.find_element(By.XPATH, "./following-sibling::div")
+                status_text = success_div.text
+
+                # Print the status
+                logger.info("Cavityplus upload pdb status: %s", status_text)
+
+                # If status is "Success.", break the loop and continue
+                if status_text == "Success.":
+                    logger.info(f"Upload successful. Continuing the script... at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+                    break
+                # If status is "Uploading", wait and poll again
+                elif "Uploading" in status_text:
+                    time.sleep(poll_interval)
+                # If status is something else, raise an exception immediately
+                else:
+                    raise CavityPlusUploadException(f"Cavityplus upload failed with status: {status_text} at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+
+            # If the loop completes without "Success.", raise an exception
+            if status_text != "Success.":
+                raise CavityPlusUploadException(f"CavityPlus upload timed out after {upload_timeout} s. Last status: {status_text}")
 
         logger.info(f"Successfully uploaded the file: {pdb_input} at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         time.sleep(1)
@@ -102,14 +108,14 @@ def upload_and_submit_pdb(driver, pdb_file_path, pdb_input):
         raise
 
 
+@StageTimer.timed("prepare_cavity_tables", method="cvpl")
 def prepare_cavity_tables(driver, pocket_limit=-1):
     """Extract cavity data and return tables as lists of rows."""
     try:
         # Wait for the Cavity Results table
         table_locator = (By.CSS_SELECTOR, "div.accordion-collapse.show table.table")
-        table = WebDriverWait(driver, 30).until(
-            EC.presence_of_element_located(table_locator)
-        )
+        table = wait_until(driver, "cvpl", "results_table", 30,
+                           EC.presence_of_element_located(table_locator))
 
         # Locate ALL top-level rows
         rows = driver.find_elements(
@@ -139,7 +145,7 @@ def prepare_cavity_tables(driver, pocket_limit=-1):
 
         # Iterate over rows
         for cavity_index, row in enumerate(rows_to_process, start=1):
-            logger.info(f"\nProcessing cavity row {cavity_index}...")
+            logger.info("\nProcessing cavity row %s...", cavity_index)
             cavity_number = row.find_element(By.XPATH, "./td[1]").text.strip()
             if not cavity_number:
                 raise RuntimeError(f"Could not read cavity number for row index {cavity_index}")
@@ -182,7 +188,7 @@ def prepare_cavity_tables(driver, pocket_limit=-1):
             residues_text = residues_td.text.strip()
             residues_list = [r.strip() for r in residues_text.split(',') if r.strip()]
 
-            logger.info(f"Surface Area: {surface_area}, Volume: {volume}, #residues: {len(residues_list)}")
+            logger.info("Surface Area: %s, Volume: %s, #residues: %d", surface_area, volume, len(residues_list))
 
             # --- POPULATE VA TABLE ---
             va_table.append([cavity_index, surface_area, volume])
@@ -194,7 +200,7 @@ def prepare_cavity_tables(driver, pocket_limit=-1):
 
             # --- COLLAPSE ROW ---
             driver.execute_script("arguments[0].click();", more_button)
-            logger.info(f"Collapsed details for row {cavity_index}")
+            logger.info("Collapsed details for row %s", cavity_index)
 
         logger.info(f"\nAll cavities processed successfully at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         return va_table, residues_table
@@ -300,8 +306,9 @@ def write_to_xlsx(va_table, residues_table, pdb_name, output_dir="output"):
                 adjusted_width = (max_length + 2) * 1.2
                 cavity_sheet.column_dimensions[get_column_letter(column[0].column)].width = adjusted_width
 
-        # Save the workbook
-        workbook.save(xlsx_path)
+        # Save the workbook, replacing the previous one (it may be hard-linked into PM_INPUT / PM_OUTPUT)
+        with replacing_file(xlsx_path) as tmp_path:
+            workbook.save(tmp_path)
         logger.info(f"Excel file written successfully to {xlsx_path} \n at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 
     except ImportError as e:
@@ -318,15 +325,14 @@ def write_cavity_results(driver, pdb_name, output_dir="output", pocket_limit=-1)
     write_to_xlsx(va_table, residues_table, pdb_name, output_dir)
 
 
-def run_cavity_plus(pdb_input: str, config: SectionProxy):
+@StageTimer.timed("run_cavity_plus", method="cvpl", or_arg="pdb_input")
+def run_cavity_plus(pdb_input: str, config: SeleniumConfig):
     # Extract configuration values
-    #config = load_config()
-    chrome_driver_path = config['chrome_driver_path']
-    cavity_plus_url = config['cavity_plus_url']
-    input_dir = config['input_dir']
-    output_dir = config['output_dir']
-    pocket_limit = int(config['pocket_limit'])
-    headless = config['chrome_headless_mode']
+    chrome_driver_path = config.chrome_driver_path
+    cavity_plus_url = config.cavity_plus_url
+    input_dir = config.input_dir
+    output_dir = config.output_dir
+    pocket_limit = config.pocket_limit
     pdb_name=os.path.splitext(pdb_input)[0]
     print(f"Running Cavity plus processing to {pdb_input}")
 
@@ -335,8 +341,7 @@ def run_cavity_plus(pdb_input: str, config: SectionProxy):
     script_dir = os.path.dirname(os.path.abspath(__file__))
     download_dir = os.path.join(script_dir, "output")
 
-    use_headless_mode = str_to_bool(headless)
-    driver = create_chrome_driver(chrome_driver_path, download_dir, use_headless_mode)
+    driver = create_chrome_driver(chrome_driver_path, download_dir, config.chrome_headless_mode)
 
     try:
         # Define the maximum number of upload attempts
@@ -367,9 +372,8 @@ def run_cavity_plus(pdb_input: str, config: SectionProxy):
 
         # Wait for the Download results button to appear and become clickable
         download_button_locator = (By.CSS_SELECTOR, "button.btn.btn-link b")
-        download_button = WebDriverWait(driver, 300).until(
-            EC.element_to_be_clickable(download_button_locator)
-        )
+        download_button = wait_until(driver, "cvpl", "results", 300,
+                                     EC.element_to_be_clickable(download_button_locator))
         logger.info("CVPL: Download results button is now visible and clickable")
 
         write_cavity_results(driver, pdb_name, output_dir, pocket_limit=pocket_limit)
@@ -388,10 +392,7 @@ def run_cavity_plus(pdb_input: str, config: SectionProxy):
     logger.info(f"Cavity Plus script completed at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 
 if __name__ == '__main__':
-    config = load_config()
-    chrome_driver_path = config['chrome_driver_path']
-    cavity_plus_url = config['cavity_plus_url']
-    input_dir = config['input_dir']
-    output_dir = config['output_dir']
-    pdb_input = config['pdb_input']
-    run_cavity_plus(pdb_input, config)
+    # python cavity_plus_to_csv.py {pdb file of the input folder}
+    config = PipelineConfig.load(data_lakes=("selenium",))
+    ServiceLatency.configure(config.selenium.latency_histograms, config.performance.timeout_factor)
+    run_cavity_plus(sys.argv[1], config.selenium)
@@ -0,0 +1,103 @@
+import glob
+import logging
+import os
+import shutil
+import subprocess
+
+from utils import PYMOL_SCRIPTS_DIR  # puts PYMOL_SCRIPTS on the import path
+from pipeline_config import SeleniumConfig
+from stage_timer import StageTimer
+
+logger = logging.getLogger(__name__)
+
+# Outputs of the tools, relative to their installation folders (pacupp_dir, p2rank_dir of config.ini)
+PACUPP_LISTS_DIR = os.path.join("output-files", "spreadsheet-ready-lining-lists")
+P2RANK_OUTPUT_DIR = "test_output"
+
+
+def _clean_dir(directory: str, pattern: str = "*") -> None:
+    for path in glob.glob(os.path.join(directory, pattern)):
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+
+
+@StageTimer.timed("run_pacupp", method="pupp")
+def run_pacupp(pdb_paths: list[str], config: SeleniumConfig) -> str:
+    """
+    Runs PACUPP (the Jmol script steps.spt of pacupp_dir) for every pdb, as run_pacupp.bash does: line 2 of
+    steps.spt loads the pdb, Jmol is stopped after pacupp_wait seconds (if it did not exit before).
+    The lining lists are copied to pacupp_python_feedup, its path is returned (the input of process_pupp_out_directory).
+    """
+    pacupp_dir = config.pacupp_dir
+    lists_dir = os.path.join(pacupp_dir, PACUPP_LISTS_DIR)
+    feedup_dir = config.pacupp_python_feedup
+    wait = config.pacupp_wait
+    script_path = os.path.join(pacupp_dir, "steps.spt")
+    if not os.path.isfile(script_path):
+        raise FileNotFoundError(f"PACUPP script {script_path} not found, check pacupp_dir in config.ini")
+
+    logger.info(f"Cleaning the PACUPP lining lists {lists_dir} and {feedup_dir}")
+    os.makedirs(feedup_dir, exist_ok=True)
+    _clean_dir(lists_dir)
+    _clean_dir(feedup_dir)
+
+    for pdb_path in pdb_paths:
+        with open(script_path, "r", encoding="utf-8") as f:
+            lines = f.read().splitlines(keepends=True)
+        lines[1] = f"load {pdb_path};\n"
+        with open(script_path, "w", encoding="utf-8") as f:
+            f.writelines(lines)
+
+        logger.info("PACUPP (Jmol) for %s, at most %s s", pdb_path, wait)
+        with StageTimer.span("jmol_pacupp", os.path.splitext(os.path.basename(pdb_path))[0], "pupp"):
+            process = subprocess.Popen([config.java, "-jar", "1-Jmol.jar", "-g", "1000x1000",
+                                        "steps.spt"], cwd=pacupp_dir)
+            try:
+                process.wait(timeout=wait)
+            except subprocess.TimeoutExpired:
+                process.terminate()
+                try:
+                    process.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                    process.wait()
+
+    copied = 0
+    for path in glob.glob(os.path.join(lists_dir, "*.txt")):
+        shutil.copy2(path, feedup_dir)
+        copied += 1
+    logger.info(f"Copied {copied} PACUPP lining lists from {lists_dir} to {feedup_dir}")
+    return feedup_dir
+
+
+@StageTimer.timed("run_p2rank", method="p2rk")
+def run_p2rank(pdb_paths: list[str], config: SeleniumConfig) -> str:
+    """
+    Runs the local P2Rank (prank predict -f of p2rank_dir) for every pdb, as run_prankweb.bash does,
+    with Java of p2rank_java_home (if set). Returns the output folder holding predict_{pdb name} per pdb
+    (the input of process_p2rank_local_output).
+    """
+    p2rank_dir = config.p2rank_dir
+    output_dir = os.path.join(p2rank_dir, P2RANK_OUTPUT_DIR)
+    if not os.path.isfile(os.path.join(p2rank_dir, "prank")):
+        raise FileNotFoundError(f"P2Rank launcher {p2rank_dir}/prank not found, check p2rank_dir in config.ini")
+
+    env = dict(os.environ)
+    java_home = config.p2rank_java_home
+    if java_home:
+        env["JAVA_HOME"] = java_home
+        env["PATH"] = os.pathsep.join([os.path.join(java_home, "bin"), env.get("PATH", "")])
+
+    logger.info(f"Cleaning the P2Rank output {output_dir}")
+    os.makedirs(output_dir, exist_ok=True)
+    _clean_dir(output_dir)
+
+    for pdb_path in pdb_paths:
+        logger.info("P2Rank for %s", pdb_path)
+        with StageTimer.span("prank_predict", os.path.splitext(os.path.basename(pdb_path))[0], "p2rk"):
+            completed = subprocess.run(["./prank", "predict", "-f", pdb_path], cwd=p2rank_dir, env=env)
+        if completed.returncode != 0:
+            logger.warning(f"P2Rank failed for {pdb_path} (exit code {completed.returncode})")
+    return output_dir
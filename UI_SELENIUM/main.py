@@ -1,42 +1,41 @@
 import argparse
 
-from configparser import SectionProxy
 from datetime import datetime
+import importlib
 import logging
+import time
 
-from castpfold_to_csv import run_castpfold
-from cavity_plus_to_csv import run_cavity_plus
-from prankweb_local_out_to_csv import process_p2rank_local_output
-from pupp_out_to_csv import  process_pupp_out_directory
-from utils import load_config
+from file_namer import FileNamer, MethodType
+from service_latency import ServiceLatency
+from utils import PYMOL_SCRIPTS_DIR  # puts PYMOL_SCRIPTS on the import path
 import os
 
+# Shared with the later pipeline stages
+from batch_progress import BatchProgress
+from pipeline_config import PipelineConfig, SeleniumConfig
+from pipeline_logging import PipelineLogging
+from run_manifest import RunManifest
+from run_profiler import RunProfiler
+from stage_timer import StageTimer
+
 # Set a specific logger for the project
 logger = logging.getLogger(__name__)
 
-# Color formatting class for console output
-class ColorFormatter(logging.Formatter):
-    COLORS = {
-        logging.DEBUG: "\033[37m",     # Gray
-        logging.INFO: "\033[0m",       # Default
-        logging.WARNING: "\033[33m",   # Yellow
-        logging.ERROR: "\033[31m",     # Red
-        logging.CRITICAL: "\033[41m",  # Red background
-    }
-
-    RESET = "\033[0m"
-
-    def format(self, record):
-        color = self.COLORS.get(record.levelno, self.RESET)
+# Module and function of every prediction, imported only when the prediction is run: the scrapers pull in
+# Selenium and castpfoldpy, the P2Rank parser pandas, so -r pupp / -r p2rk start without them
+# (see benchmarks/startup_budget.py)
+PREDICTION_MODULES = {
+    MethodType.CSPF: ("castpfold_to_csv", "run_castpfold"),
+    MethodType.CVPL: ("cavity_plus_to_csv", "run_cavity_plus"),
+    MethodType.P2RK: ("prankweb_local_out_to_csv", "process_p2rank_local_output"),
+    MethodType.PUPP: ("pupp_out_to_csv", "process_pupp_out_directory"),
+}
 
-        if record.levelno >= logging.WARNING:
-            msg = f"{record.levelname}: {record.getMessage()}"
-        else:
-            msg = record.getMessage()
-
-        return f"{color}{msg}{self.RESET}"
-# End of ColorFormatter class
 
+def prediction(method: MethodType):
+    """The run function of the prediction, its module is imported on first use"""
+    module_name, function_name = PREDICTION_MODULES[method]
+    return getattr(importlib.import_module(module_name), function_name)
 
 
 def get_pdb_files(input_directory: str) -> list[str]:
@@ -55,15 +54,113 @@ def get_pdb_files(input_directory: str) -> list[str]:
             pdb_files.append(filename)
     return pdb_files
 
-def run_4_predictions(pdb_files: list[str], config: SectionProxy) -> None:
+def method_output_record(pdb_file: str, method: MethodType, config: SeleniumConfig) -> dict | None:
+    """
+    Run manifest record (hash, row and cavity counts) of the residues workbook written by the method for the pdb,
+    None if the workbook was not written.
+    """
+    pdb_name = os.path.splitext(pdb_file)[0]
+    path = os.path.join(config.output_dir, pdb_name, f"{FileNamer.get_residues_name(pdb_name, method)}.xlsx")
+    if not os.path.isfile(path):
+        return None
+
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(path, read_only=True)
+    try:
+        cavity_sheets = [ws for ws in workbook.worksheets if ws.title.startswith("Cavity")]
+        rows = sum(max((ws.max_row or 1) - 1, 0) for ws in cavity_sheets)
+    finally:
+        workbook.close()
+    return RunManifest.file_record(path, rows=rows, cavities=len(cavity_sheets))
+
+
+def record_method_output(pdb_file: str, method: MethodType, config: SeleniumConfig, parts: dict) -> None:
+    """Adds the method output and the input pdb records to the run manifest parts of the OR."""
+    pdb_name = os.path.splitext(pdb_file)[0]
+    record = method_output_record(pdb_file, method, config)
+    if record is None:
+        logger.warning(f"No {method.value} residues file written for {pdb_name}")
+        return
+    parts["methods"] = {method.value: record}
+
+    pdb_path = os.path.join(config.input_dir, pdb_file)
+    if os.path.isfile(pdb_path):
+        previous = RunManifest.read(os.path.join(config.output_dir, pdb_name)).get("pdb")
+        parts["pdb"] = RunManifest.file_record(pdb_path, previous)
+
+
+def progress_job_name(pdb_file: str, method: MethodType) -> str:
+    return f"{os.path.splitext(pdb_file)[0]}:{method.value}"
+
+
+def run_method_stage(pdb_file: str, method: MethodType, run, config: SeleniumConfig,
+                     progress: BatchProgress | None = None) -> None:
+    """
+    Runs a per-pdb prediction (run(pdb_file, config)) as a timed stage of the OR run manifest,
+    and as a job of the batch progress (if given).
+    """
+    or_dir = os.path.join(config.output_dir, os.path.splitext(pdb_file)[0])
+    job_name = progress_job_name(pdb_file, method)
+    if progress is not None:
+        progress.started_job(job_name)
+    try:
+        with RunManifest.stage(or_dir, method.value) as parts:
+            run(pdb_file, config)
+            record_method_output(pdb_file, method, config, parts)
+    except BaseException as e:
+        if progress is not None:
+            progress.finished_job(job_name, f"{type(e).__name__}: {e}")
+        raise
+    if progress is not None:
+        progress.finished_job(job_name, None if parts.get("methods") else "no residues file written")
+
+
+def run_batch_method_stage(pdb_files: list[str], method: MethodType, run, config: SeleniumConfig,
+                           progress: BatchProgress | None = None) -> None:
+    """
+    Runs a prediction processed for all pdbs at once (run()), the batch time is recorded as the stage
+    of every OR it produced an output for. In the batch progress (if given) all the pdbs are in flight
+    during run(), a pdb without output is a failed job.
+    """
+    job_names = [progress_job_name(pdb_file, method) for pdb_file in pdb_files]
+    if progress is not None:
+        for job_name in job_names:
+            progress.started_job(job_name)
+    started = datetime.now()
+    start = time.perf_counter()
+    try:
+        run()
+    except BaseException as e:
+        if progress is not None:
+            for job_name in job_names:
+                progress.finished_job(job_name, f"{type(e).__name__}: {e}")
+        raise
+    seconds = time.perf_counter() - start
+
+    for pdb_file, job_name in zip(pdb_files, job_names):
+        parts = {}
+        record_method_output(pdb_file, method, config, parts)
+        if progress is not None:
+            progress.finished_job(job_name, None if parts else "no residues file written")
+        if parts:
+            or_dir = os.path.join(config.output_dir, os.path.splitext(pdb_file)[0])
+            stage = RunManifest.stage_record(started, seconds, batch_size=len(pdb_files))
+            RunManifest.update(or_dir, stages={method.value: stage}, **parts)
+
+
+def run_4_predictions(pdb_files: list[str], config: SeleniumConfig) -> None:
     # Processing output files of pacupp JMOL script
     # It is expected, that java JMOL pacupp has been run prior to this python script
 
     logger.info(f"Expecting that java pacupp has already completed. Processing pacupp output files for {pdb_files}  at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    pacupp_python_feedup = config['pacupp_python_feedup']
+    pacupp_python_feedup = config.pacupp_python_feedup
+    progress = BatchProgress("predictions", len(pdb_files) * len(MethodType), "predictions")
 
-    process_pupp_out_directory(pacupp_python_feedup, config)
-    process_p2rank_local_output(pdb_files, config)
+    run_batch_method_stage(pdb_files, MethodType.PUPP, lambda: prediction(MethodType.PUPP)(pacupp_python_feedup, config), config,
+                           progress)
+    run_batch_method_stage(pdb_files, MethodType.P2RK, lambda: prediction(MethodType.P2RK)(pdb_files, config), config,
+                           progress)
 
     #raise Exception("Temporary stop")
 
@@ -73,10 +170,10 @@ def run_4_predictions(pdb_files: list[str], config: SectionProxy) -> None:
         logger.info("++++++++++++++++++++++++++++++++++++++++++++++++++++++++")
         logger.info(f'Running 4 predictions for {pdb_file}')
         logger.info(f"Starting CastPFold for {pdb_file} at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        run_castpfold(pdb_file, config)
+        run_method_stage(pdb_file, MethodType.CSPF, prediction(MethodType.CSPF), config, progress)
 
         logger.info(f"Starting CavityPlus for {pdb_file} at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        run_cavity_plus(pdb_file, config)
+        run_method_stage(pdb_file, MethodType.CVPL, prediction(MethodType.CVPL), config, progress)
         logger.info(f"Starting PrankWev for {pdb_file} at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 
         # !!!! run_prankweb(pdb_file, config) replaced by local p2rank run, see above
@@ -84,11 +181,11 @@ def run_4_predictions(pdb_files: list[str], config: SectionProxy) -> None:
         logger.info(f"Completing 4predictions for {pdb_file} at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         logger.info("++++++++++++++++++++++++++++++++++++++++++++++++++++++++")
         logger.info("++++++++++++++++++++++++++++++++++++++++++++++++++++++++")
-    pass
+    progress.finish()
 
 
 
-def main(rerun_prediction: str = None) -> None:
+def main(rerun_prediction: str = None, config_overrides: list[str] | None = None) -> None:
     # Setting logger and color logging fot console
     timestamp = datetime.now().strftime("%y%m%d_%H%M")
     script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -96,52 +193,52 @@ def main(rerun_prediction: str = None) -> None:
     log_dir = f"{script_dir}/../logs"
     os.makedirs(log_dir, exist_ok=True)
 
-    handler = logging.StreamHandler()
-    handler.setFormatter(ColorFormatter())
-
-    file_handler = logging.FileHandler(f"{log_dir}/main_{timestamp}.log")
-    file_handler.setFormatter(
-        logging.Formatter("%(asctime)s %(levelname)s: %(message)s")
-    )
-
-    logging.basicConfig(
-        level=logging.INFO,
-        handlers=[
-            handler, file_handler
-        ]
-    )
-    # end of logger settings
+    PipelineLogging.setup(log_dir, f"main_{timestamp}")
+    StageTimer.configure(log_dir, f"main_{timestamp}")
+    BatchProgress.configure(log_dir, f"main_{timestamp}")
 
 
     logger.info(f"Starting main.py script... at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    config = load_config()
-    logging.info(f"DEFAULT config: {config.items()}")
-    input_dir = config['input_dir']
+    pipeline_config = PipelineConfig.load(config_overrides, data_lakes=("selenium",))
+    config = pipeline_config.selenium
+    logging.info(f"DEFAULT config: {config}")
+    ServiceLatency.configure(config.latency_histograms, pipeline_config.performance.timeout_factor)
+    input_dir = config.input_dir
     pdb_files = get_pdb_files(input_dir)
     if(len(pdb_files) <1 ):
         logger.warning(f"!!!!!!!!!!!!!!!!!!!!!!!!!!")
         logger.warning(f"No input .pdb files found in {input_dir} \n no new cavity residues files for any method are expected")
 
+    # Progress of the re-runs (run_4_predictions has its own)
+    progress = None if rerun_prediction is None else BatchProgress(f"rerun_{rerun_prediction}", len(pdb_files),
+                                                                   "predictions")
     if rerun_prediction is None:
         run_4_predictions(pdb_files, config)
     elif rerun_prediction == "cspf":
         for pdb_file in pdb_files:
             logger.info(f'Re-Running only CASTpFold for {pdb_file} at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}')
-            run_castpfold(pdb_file, config)
+            run_method_stage(pdb_file, MethodType.CSPF, prediction(MethodType.CSPF), config, progress)
     elif rerun_prediction == "cvpl":
         for pdb_file in pdb_files:
             logger.info(f'Re-Running  only CavityPlus for {pdb_file} at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}')
-            run_cavity_plus(pdb_file, config)
+            run_method_stage(pdb_file, MethodType.CVPL, prediction(MethodType.CVPL), config, progress)
     elif rerun_prediction == "p2rk":
         logger.info(f'Re-processing  PrankWeb local output for {", ".join(pdb_files)}\n at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}')
-        process_p2rank_local_output (pdb_files, config)
+        run_batch_method_stage(pdb_files, MethodType.P2RK, lambda: prediction(MethodType.P2RK)(pdb_files, config), config,
+                               progress)
     elif rerun_prediction == "pupp":
         logger.info(f"Skipping web predictions. Only processing pacupp output files. at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        pacupp_python_feedup = config['pacupp_python_feedup']
-        process_pupp_out_directory(pacupp_python_feedup, config)
+        pacupp_python_feedup = config.pacupp_python_feedup
+        run_batch_method_stage(pdb_files, MethodType.PUPP, lambda: prediction(MethodType.PUPP)(pacupp_python_feedup, config), config,
+                               progress)
     else:
         raise ValueError(f"Invalid --rerun-prediction option: {rerun_prediction}. Allowed values: cspf, cvpl, p2rk, pupp")
 
+    if progress is not None:
+        progress.finish()
+    StageTimer.log_summary()
+    ServiceLatency.log_report()
+
 
 
 if __name__ == '__main__':
@@ -152,10 +249,14 @@ if __name__ == '__main__':
         choices=["cspf", "cvpl", "p2rk", "pupp"],
         help="Specify which prediction to rerun: cspf (CASTpFold), cvpl (CavityPlus), p2rk (PrankWeb), pupp (process pacupp output only)."
     )
+    PipelineConfig.add_arguments(parser)
+    RunProfiler.add_arguments(parser)
     args = parser.parse_args()
 
-    # Call the main function with the parsed argument
-    main(args.rerun_prediction)
+    # Call the main function with the parsed argument (under cProfile / tracemalloc with --profile)
+    log_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "logs")
+    with RunProfiler.profile(args.profile, log_dir, "main", args.profile_top, StageTimer):
+        main(args.rerun_prediction, args.config_overrides)
 
     logger.info(f"End of main.py script... at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 
@@ -1,46 +1,28 @@
-import configparser
+import argparse
 import os
 from datetime import datetime
 import logging
 
-from .file_namer import MethodType
+from utils import PYMOL_SCRIPTS_DIR  # puts PYMOL_SCRIPTS on the import path
+from file_namer import MethodType
+from output_inventory import build_inventory, missing_methods, write_inventory
+from pipeline_config import PipelineConfig
+from pipeline_logging import PipelineLogging
+from run_profiler import RunProfiler
 
 
 # Set a logger for this very script
 logger = logging.getLogger(__name__)
 
-# Color formatting class for console output
-class ColorFormatter(logging.Formatter):
-    COLORS = {
-        logging.DEBUG: "\033[37m",     # Gray
-        logging.INFO: "\033[0m",       # Default
-        logging.WARNING: "\033[33m",   # Yellow
-        logging.ERROR: "\033[31m",     # Red
-        logging.CRITICAL: "\033[41m",  # Red background
-    }
-
-    RESET = "\033[0m"
-
-    def format(self, record):
-        color = self.COLORS.get(record.levelno, self.RESET)
-
-        if record.levelno >= logging.WARNING:
-            msg = f"{record.levelname}: {record.getMessage()}"
-        else:
-            msg = record.getMessage()
-
-        return f"{color}{msg}{self.RESET}"
-# End of ColorFormatter class
-
-
-
 
 def get_methods_summary(
     selenium_output_dir: str,
-    data_lake_dir: str = "."
+    data_lake_dir: str = ".",
+    inventory: dict | None = None
 ) -> dict:
     """
-    Verify XLSX files per OR_NAME, write a methods summary file,
+    Verify XLSX files per OR_NAME, write a methods summary file
+    (and the output inventory as JSON next to it),
     and return a dictionary containing missing methods per OR_NAME.
 
     Args:
@@ -49,6 +31,8 @@ def get_methods_summary(
                     The path is resolved relative to the directory
                     containing this methods_summary.py file.
                     Default: ".."
+        inventory: Index of selenium_output_dir built by output_inventory.build_inventory,
+                   built here (one scan of the tree) if not given.
 
     Returns:
         dict: Dictionary containing missing methods per OR_NAME.
@@ -60,51 +44,26 @@ def get_methods_summary(
     """
 
     # ------------------------------------------------------------------
-    # 1. Collect OR_NAME directories
+    # 1. Collect OR_NAME directories (single scan of the output tree)
     # ------------------------------------------------------------------
-    or_names = [
-        name
-        for name in os.listdir(selenium_output_dir)
-        if name != "OLD_DATA"
-        and os.path.isdir(os.path.join(selenium_output_dir, name))
-    ]
+    if inventory is None:
+        inventory = build_inventory(selenium_output_dir)
+    or_names = list(inventory["ors"])
 
     # ------------------------------------------------------------------
     # 2. Verify XLSX files per OR_NAME
     # ------------------------------------------------------------------
-    missing_dict = {}
-
-    for or_name in or_names:
-        or_dir = os.path.join(selenium_output_dir, or_name)
-
-        xlsx_files = [
-            f
-            for f in os.listdir(or_dir)
-            if f.lower().endswith(".xlsx")
-        ]
-
-        missing_methods = []
-
-        for method in MethodType:
-            found = any(
-                f.lower().startswith(or_name.lower())
-                and method.value.lower() in f.lower()
-                for f in xlsx_files
+    missing_dict = missing_methods(inventory)
+
+    for or_name, methods in missing_dict.items():
+        for method in methods:
+            logger.warning(
+                f"Missing XLSX file for OR_NAME='{or_name}', "
+                f"MethodType='{MethodType(method).name}', "
+                f"!!!!!!!! CONSENSUS file cannot be built for "
+                f"{or_name}!!!!"
             )
 
-            if not found:
-                missing_methods.append(method.value)
-
-                logger.warning(
-                    f"Missing XLSX file for OR_NAME='{or_name}', "
-                    f"MethodType='{method.name}', "
-                    f"!!!!!!!! CONSENSUS file cannot be built for "
-                    f"{or_name}!!!!"
-                )
-
-        if missing_methods:
-            missing_dict[or_name] = missing_methods
-
     # ------------------------------------------------------------------
     # 3. Verify/create data lake directory
     # ------------------------------------------------------------------
@@ -140,10 +99,17 @@ def get_methods_summary(
                 )
 
     logger.info(f"Summary written to: {summary_path}")
+    write_inventory(inventory, summary_dir, timestamp)
 
     return missing_dict
 
 def main():
+    parser = argparse.ArgumentParser(description="Summary of the method outputs present / missing per OR")
+    PipelineConfig.add_arguments(parser)
+    # Handled by RunProfiler.run() (see __main__), listed here for the help and the argument check
+    RunProfiler.add_arguments(parser)
+    args = parser.parse_args()
+
     # Setting logger and color logging fot console
     timestamp = datetime.now().strftime("%y%m%d_%H%M")
     script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -151,33 +117,14 @@ def main():
     log_dir = f"{script_dir}/../logs"
     os.makedirs(log_dir, exist_ok=True)
 
-    handler = logging.StreamHandler()
-    handler.setFormatter(ColorFormatter())
-
-    file_handler = logging.FileHandler(f"{log_dir}/log_data_to_pm_{timestamp}.log")
-    file_handler.setFormatter(
-        logging.Formatter("%(asctime)s %(levelname)s: %(message)s")
-    )
-
-    logging.basicConfig(
-        level=logging.INFO,
-        handlers=[
-            handler, file_handler
-        ]
-    )
-    # end of logger settings
-
-    selenium_config = configparser.ConfigParser()
-    selenium_config_path = os.path.join(script_dir, "config.ini")
-    selenium_config.read(selenium_config_path, encoding="utf-8")
-
-    data_lake_dir = os.path.join(script_dir, selenium_config['DEFAULT']['data_lake_dir'])
-    selenium_output_dir = os.path.join(data_lake_dir, selenium_config['DEFAULT']['output_dir'])
+    PipelineLogging.setup(log_dir, f"log_data_to_pm_{timestamp}")
 
+    config = PipelineConfig.load(args.config_overrides, data_lakes=("selenium",)).selenium
     get_methods_summary(
-        selenium_output_dir=selenium_output_dir, data_lake_dir=data_lake_dir)
+        selenium_output_dir=config.output_dir, data_lake_dir=config.data_lake_dir)
 
     pass
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    # --profile cpu|mem runs main() under cProfile / tracemalloc, the reports go to the logs folder
+    RunProfiler.run(main, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "logs"), "methods_summary")
\ No newline at end of file
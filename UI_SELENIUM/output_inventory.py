@@ -0,0 +1,96 @@
+import json
+import logging
+import os
+from datetime import datetime
+
+from file_namer import MethodType
+
+
+# Set a logger for this very script
+logger = logging.getLogger(__name__)
+
+# Subdirectory of the Selenium output that is not an OR_NAME
+EXCLUDED_DIRS = ("OLD_DATA",)
+
+
+def _scan_files(root_dir: str, rel_dir: str = "") -> dict:
+    """Files under root_dir (recursively) as relative path -> {'size', 'mtime_ns'}, one os.scandir per directory."""
+    files = {}
+    with os.scandir(os.path.join(root_dir, rel_dir)) as entries:
+        for entry in entries:
+            rel_path = os.path.join(rel_dir, entry.name) if rel_dir else entry.name
+            if entry.is_dir():
+                files.update(_scan_files(root_dir, rel_path))
+            elif entry.is_file():
+                st = entry.stat()
+                files[rel_path] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+    return files
+
+
+def build_inventory(selenium_output_dir: str) -> dict:
+    """
+    Walks the Selenium output tree once and indexes it.
+
+    Returns:
+        dict: {
+                  "root": selenium_output_dir,
+                  "created": "2025-01-31 12:00:00",
+                  "ors": {
+                      "OR_NAME_1": {
+                          "files":   {relative path: {"size": ..., "mtime_ns": ...}},
+                          "methods": {"cspf": "OR_NAME_1_cspf_residues.xlsx", ...}   # only found methods
+                      }
+                  }
+              }
+    A method file is an .xlsx file (top level of the OR_NAME directory) starting with OR_NAME
+    and containing the method name, case-insensitive.
+    """
+    method_values = [method.value.lower() for method in MethodType]
+    ors = {}
+
+    with os.scandir(selenium_output_dir) as entries:
+        or_entries = sorted((e for e in entries if e.is_dir() and e.name not in EXCLUDED_DIRS), key=lambda e: e.name)
+
+    for or_entry in or_entries:
+        or_name = or_entry.name
+        or_lower = or_name.lower()
+        files = _scan_files(or_entry.path)
+
+        methods = {}
+        for rel_path in sorted(files):
+            lower = rel_path.lower()
+            if os.sep in rel_path or not lower.endswith(".xlsx") or not lower.startswith(or_lower):
+                continue
+            for method in method_values:
+                if method in lower and method not in methods:
+                    methods[method] = rel_path
+
+        ors[or_name] = {"files": files, "methods": methods}
+
+    return {
+        "root": selenium_output_dir,
+        "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "ors": ors,
+    }
+
+
+def missing_methods(inventory: dict) -> dict:
+    """OR_NAME -> list of missing method names (only ORs with missing methods)."""
+    missing_dict = {}
+    for or_name, entry in inventory["ors"].items():
+        missing = [method.value for method in MethodType if method.value.lower() not in entry["methods"]]
+        if missing:
+            missing_dict[or_name] = missing
+    return missing_dict
+
+
+def write_inventory(inventory: dict, summary_dir: str, timestamp: str) -> str:
+    """Persists the inventory as 4methods_inventory_{timestamp}.json (next to 4methods_summary_{timestamp}.txt)."""
+    inventory_path = os.path.join(summary_dir, f"4methods_inventory_{timestamp}.json")
+    tmp_path = inventory_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(inventory, f, indent=1)
+    os.replace(tmp_path, inventory_path)
+
+    logger.info(f"Inventory of {len(inventory['ors'])} OR_NAMEs written to: {inventory_path}")
+    return inventory_path
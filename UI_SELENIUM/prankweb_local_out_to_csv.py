@@ -1,7 +1,7 @@
 import os
 import csv
+import sys
 
-from configparser import SectionProxy
 from datetime import datetime
 import logging
 
@@ -10,15 +10,19 @@ import pandas as pd
 
 from pathlib import Path
 from file_namer import FileNamer, MethodType
-from utils import str_to_bool, load_config
+from utils import PYMOL_SCRIPTS_DIR  # puts PYMOL_SCRIPTS on the import path
+from file_staging import replacing_file
+from pipeline_config import PipelineConfig, SeleniumConfig
+from stage_timer import StageTimer
 
 
 logger = logging.getLogger(__name__)
 
 
 
-def process_p2rank_local_output(pdb_files, config):
-    p2rank_local_output_dir = Path(config['prankweb_local_output'])
+@StageTimer.timed("process_p2rank_local_output", method="p2rk")
+def process_p2rank_local_output(pdb_files, config: SeleniumConfig):
+    p2rank_local_output_dir = Path(config.prankweb_local_output)
 
     for pdb_file in pdb_files:
         pdb_name = Path(pdb_file).stem
@@ -34,10 +38,11 @@ def process_p2rank_local_output(pdb_files, config):
 
         # Further processing will be added here
         logger.info(f'PrankWeb local output processing for {pdb_file} at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}')
-        output_dir = config['output_dir']
+        output_dir = config.output_dir
         process_prankweb_output(str(predict_dir), pdb_name, output_dir)
 
 
+@StageTimer.timed("process_prankweb_output", method="p2rk", or_arg="pdb_name")
 def process_prankweb_output(local_prankweb_output_dir, pdb_name, output_dir):
     """
     Processes the PRANKWeb output files in the specified directory.
@@ -176,8 +181,8 @@ def write_xlsx(output_table, pdb_name, output_dir):
         sheet_name = f"Cavity {cavity_number}"
         sheets[sheet_name] = df[df["Cavity Number"] == cavity_number]
 
-    # Write to Excel with multiple sheets
-    with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
+    # Write to Excel with multiple sheets, replacing the previous file (it may be hard-linked into PM_INPUT / PM_OUTPUT)
+    with replacing_file(output_path) as tmp_path, pd.ExcelWriter(tmp_path, engine='openpyxl') as writer:
         for sheet_name, sheet_df in sheets.items():
             sheet_df.to_excel(writer, sheet_name=sheet_name, index=False)
 
@@ -185,11 +190,6 @@ def write_xlsx(output_table, pdb_name, output_dir):
 
 
 if __name__ == '__main__':
-    config = load_config()
-    chrome_driver_path = config['chrome_driver_path']
-    print("Driver path: " + chrome_driver_path)
-    input_dir = config['input_dir']
-    output_dir = config['output_dir']
-    pdb_input = config['pdb_input']
-    process_p2rank_local_output(pdb_input, config)
+    # python prankweb_local_out_to_csv.py {pdb files of the input folder}
+    process_p2rank_local_output(sys.argv[1:], PipelineConfig.load(data_lakes=("selenium",)).selenium)
     #only_unzip_and_process()
@@ -1,7 +1,7 @@
 import os
 import csv
+import sys
 
-from configparser import SectionProxy
 from datetime import datetime
 import logging
 
@@ -17,14 +17,17 @@ import zipfile
 
 from chrome_driver_factory import create_chrome_driver
 from file_namer import FileNamer, MethodType
-from utils import str_to_bool, load_config
+from service_latency import ServiceLatency, wait_until
+from utils import PYMOL_SCRIPTS_DIR  # puts PYMOL_SCRIPTS on the import path
+from file_staging import replacing_file
+from pipeline_config import PipelineConfig, SeleniumConfig
 
 
 logger = logging.getLogger(__name__)
 
-def only_unzip_and_process(pdb_input: str, config: SectionProxy):
-    output_dir = config['output_dir']
-    prankweb_temp = config['prankweb_temp']
+def only_unzip_and_process(pdb_input: str, config: SeleniumConfig):
+    output_dir = config.output_dir
+    prankweb_temp = config.prankweb_temp
     pdb_name = os.path.splitext(pdb_input)[0]
 
     script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -51,15 +54,14 @@ def delete_directory(download_dir):
         logger.error(f"Warning: Failed to delete directory '{download_dir}'. Error: {e} \n at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 
 
-def run_prankweb(pdb_input: str, config: SectionProxy):
+def run_prankweb(pdb_input: str, config: SeleniumConfig):
     # Extract configuration values
-    chrome_driver_path = config['chrome_driver_path']
-    prankweb_url = config['prank_web_url']
-    input_dir = config['input_dir']
-    output_dir = config['output_dir']
-    prankweb_temp = config['prankweb_temp']
-    pocket_limit = int(config['pocket_limit'])
-    headless = config['chrome_headless_mode']
+    chrome_driver_path = config.chrome_driver_path
+    prankweb_url = config.prank_web_url
+    input_dir = config.input_dir
+    output_dir = config.output_dir
+    prankweb_temp = config.prankweb_temp
+    pocket_limit = config.pocket_limit
     pdb_name = os.path.splitext(pdb_input)[0]
 
     # Construct the full path to the PDB file
@@ -80,17 +82,15 @@ def run_prankweb(pdb_input: str, config: SectionProxy):
     os.makedirs(download_dir, exist_ok=True)  # Create the directory (if it doesn't exist)
     print(f"Directory '{download_dir}' is ready for downloads.")
 
-    use_headless_mode = str_to_bool(headless)
-    driver = create_chrome_driver(chrome_driver_path, download_dir, use_headless_mode)
+    driver = create_chrome_driver(chrome_driver_path, download_dir, config.chrome_headless_mode)
 
     try:
         # Open the Prankweb URL
         driver.get(prankweb_url)
 
         # Select the "Custom structure" radio button
-        custom_structure_radio = WebDriverWait(driver, 20).until(
-            EC.presence_of_element_located((By.ID, "input-user-file"))
-        )
+        custom_structure_radio = wait_until(driver, "p2rk", "page_load", 20,
+                                            EC.presence_of_element_located((By.ID, "input-user-file")))
         WebDriverWait(driver, 10).until(EC.element_to_be_clickable(custom_structure_radio))
         custom_structure_radio.click()
 
@@ -105,17 +105,15 @@ def run_prankweb(pdb_input: str, config: SectionProxy):
         time.sleep(5)
 
         # Wait for the Submit button to be clickable and click it
-        submit_button = WebDriverWait(driver, 30).until(
-            EC.element_to_be_clickable((By.ID, "submit-button"))
-        )
+        submit_button = wait_until(driver, "p2rk", "upload", 30,
+                                   EC.element_to_be_clickable((By.ID, "submit-button")))
         driver.execute_script("arguments[0].scrollIntoView();", submit_button)
         WebDriverWait(driver, 10).until(EC.element_to_be_clickable(submit_button))
         submit_button.click()
 
         # Wait for the Info tab to appear and click it (using CSS selector)
-        info_tab_css = WebDriverWait(driver, 120).until(
-            EC.element_to_be_clickable((By.CSS_SELECTOR, "button[role='tab'][id='simple-tab-1']"))
-        )
+        info_tab_css = wait_until(driver, "p2rk", "prediction", 120,
+                                  EC.element_to_be_clickable((By.CSS_SELECTOR, "button[role='tab'][id='simple-tab-1']")))
         info_tab_css.click()
 
         # Wait for the prediction to complete and the download button to appear
@@ -316,8 +314,8 @@ def write_xlsx(output_table, pdb_name, output_dir):
         sheet_name = f"Cavity {cavity_number}"
         sheets[sheet_name] = df[df["Cavity Number"] == cavity_number]
 
-    # Write to Excel with multiple sheets
-    with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
+    # Write to Excel with multiple sheets, replacing the previous file (it may be hard-linked into PM_INPUT / PM_OUTPUT)
+    with replacing_file(output_path) as tmp_path, pd.ExcelWriter(tmp_path, engine='openpyxl') as writer:
         for sheet_name, sheet_df in sheets.items():
             sheet_df.to_excel(writer, sheet_name=sheet_name, index=False)
 
@@ -325,11 +323,9 @@ def write_xlsx(output_table, pdb_name, output_dir):
 
 
 if __name__ == '__main__':
-    config = load_config()
-    chrome_driver_path = config['chrome_driver_path']
-    print("Driver path: " + chrome_driver_path)
-    input_dir = config['input_dir']
-    output_dir = config['output_dir']
-    pdb_input = config['pdb_input']
-    run_prankweb(pdb_input, config)
+    # python prankweb_to_csv.py {pdb file of the input folder}
+    config = PipelineConfig.load(data_lakes=("selenium",))
+    print("Driver path: " + config.selenium.chrome_driver_path)
+    ServiceLatency.configure(config.selenium.latency_histograms, config.performance.timeout_factor)
+    run_prankweb(sys.argv[1], config.selenium)
     #only_unzip_and_process()
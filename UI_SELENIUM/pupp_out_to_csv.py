@@ -1,8 +1,11 @@
 import os
 import csv
 from collections import defaultdict
-from configparser import SectionProxy
 from file_namer import FileNamer, MethodType
+from utils import PYMOL_SCRIPTS_DIR  # puts PYMOL_SCRIPTS on the import path
+from file_staging import replacing_file
+from pipeline_config import SeleniumConfig
+from stage_timer import StageTimer
 import openpyxl
 
 
@@ -35,7 +38,8 @@ def parse_txt_file(file_path):
             entries.append(entry)
     return entries
 
-def process_pupp_out_directory(input_dir, config: SectionProxy) -> None:
+@StageTimer.timed("process_pupp_out_directory", method="pupp")
+def process_pupp_out_directory(input_dir, config: SeleniumConfig) -> None:
     """Process all .txt files in the input directory and create CSV files."""
     print("Processing pupp output directory:", input_dir)
     # Group files by {OR_name}
@@ -73,7 +77,7 @@ def process_pupp_out_directory(input_dir, config: SectionProxy) -> None:
                 unique_entries[or_name].add(key)
 
     # Write Excel file for each {OR_name} (CSV postponed and commented out)
-    output_dir = config['output_dir']
+    output_dir = config.output_dir
     for or_name, entries in unique_entries.items():
         output_path = os.path.join(os.getcwd(), output_dir, or_name)
         os.makedirs(output_path, exist_ok=True)
@@ -117,8 +121,9 @@ def write_to_excel(excel_path,  unique_entries):
         for entry in entries:
             sheet.append([entry[0], entry[1], entry[2], entry[3]])
 
-    # Save the workbook
-    workbook.save(excel_path)
+    # Save the workbook, replacing the previous one (it may be hard-linked into PM_INPUT / PM_OUTPUT)
+    with replacing_file(excel_path) as tmp_path:
+        workbook.save(tmp_path)
     print(f"Excel file created: {excel_path}")
 
 
@@ -0,0 +1,215 @@
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "latency_histograms.json")
+
+# Upper bounds (seconds) of the histogram buckets: 0.05 s ... ~77 min, sqrt(2) apart, the last bucket is open
+BOUNDS = tuple(round(0.05 * 2 ** (k / 2), 3) for k in range(34))
+
+
+class ServiceLatency:
+    """
+    Latency histograms of the remote phases per service (cspf, cvpl, p2rk), persisted across runs
+    in a JSON file (latency_histograms in config.ini), and the timeouts / poll intervals derived from them:
+
+        timeout        p99 x FACTOR, within [SHRINK, GROW] x the default of the phase
+                       (the default as long as the phase has fewer than MIN_SAMPLES observations)
+        poll interval  p50 / POLLS_PER_MEDIAN, within [SHRINK, 1] x the default
+
+    A phase that timed out is counted at the timeout it reached, so a loaded server raises its own timeout
+    on the next runs instead of failing over and over. Older observations fade out: when a phase has more than
+    MAX_SAMPLES of them, all its counts are halved.
+
+        with ServiceLatency.measure("cvpl", "results", timeout): ...
+        wait_until(driver, "cvpl", "results", 300, EC.element_to_be_clickable(locator))
+
+    Without configure() the histograms are only kept in memory.
+    """
+
+    FACTOR = 2.0
+    SHRINK = 0.25
+    GROW = 4.0
+    MIN_SAMPLES = 10
+    MAX_SAMPLES = 200
+    POLLS_PER_MEDIAN = 10
+
+    _path: str | None = None
+    _services: dict[str, dict[str, dict]] = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def configure(cls, path, factor: float | None = None) -> None:
+        """
+        Loads the histograms of path (if it exists), they are saved back to it after every observation.
+        factor: FACTOR of the timeouts (performance.timeout_factor of pm_config.ini), None keeps it.
+        """
+        if factor is not None:
+            cls.FACTOR = factor
+        path = os.path.abspath(path)
+        if path == cls._path:
+            return
+        cls._path = path
+        cls._services = {}
+        if not os.path.isfile(path):
+            return
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read latency histograms {path}, starting from scratch: {e}")
+            return
+        if tuple(stored.get("bounds", ())) != BOUNDS:
+            logger.warning(f"Latency histograms {path} have other buckets, starting from scratch")
+            return
+        cls._services = stored.get("services", {})
+
+    @classmethod
+    def _save(cls) -> None:
+        if cls._path is None:
+            return
+        data = {"updated": datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "bounds": BOUNDS, "services": cls._services}
+        tmp_path = f"{cls._path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=1)
+            os.replace(tmp_path, cls._path)
+        except OSError as e:
+            logger.warning(f"Could not save latency histograms {cls._path}: {e}")
+
+    @staticmethod
+    def _bucket(seconds: float) -> int:
+        for i, bound in enumerate(BOUNDS):
+            if seconds <= bound:
+                return i
+        return len(BOUNDS)
+
+    @classmethod
+    def record(cls, service: str, phase: str, seconds: float, timed_out: bool = False,
+               timeout: float | None = None) -> None:
+        """One observation of the phase, timeout: the timeout it ran with (for the report)"""
+        with cls._lock:
+            histogram = cls._services.setdefault(service, {}).setdefault(
+                phase, {"counts": [0] * (len(BOUNDS) + 1), "timeouts": 0, "max": 0.0, "last": None, "timeout": None})
+            if sum(histogram["counts"]) >= cls.MAX_SAMPLES:
+                histogram["counts"] = [count / 2 for count in histogram["counts"]]
+                histogram["timeouts"] /= 2
+            histogram["counts"][cls._bucket(seconds)] += 1
+            histogram["timeouts"] += int(timed_out)
+            histogram["max"] = max(histogram["max"], round(seconds, 3))
+            histogram["last"] = round(seconds, 3)
+            histogram["timeout"] = timeout
+            cls._save()
+
+    @classmethod
+    def samples(cls, service: str, phase: str) -> float:
+        histogram = cls._services.get(service, {}).get(phase)
+        return sum(histogram["counts"]) if histogram else 0
+
+    @classmethod
+    def percentile(cls, service: str, phase: str, q: float) -> float | None:
+        """Upper bound of the bucket holding the q-th (0..1) observation (at most the max), None without observations"""
+        histogram = cls._services.get(service, {}).get(phase)
+        if not histogram or not sum(histogram["counts"]):
+            return None
+        rank = q * sum(histogram["counts"])
+        cumulative = 0
+        for i, count in enumerate(histogram["counts"]):
+            cumulative += count
+            if count and cumulative >= rank:
+                return min(BOUNDS[i], histogram["max"]) if i < len(BOUNDS) else histogram["max"]
+        return histogram["max"]
+
+    @classmethod
+    def timeout(cls, service: str, phase: str, default: float) -> float:
+        if cls.samples(service, phase) < cls.MIN_SAMPLES:
+            return default
+        p99 = cls.percentile(service, phase, 0.99)
+        return round(min(max(p99 * cls.FACTOR, default * cls.SHRINK), default * cls.GROW), 1)
+
+    @classmethod
+    def poll_interval(cls, service: str, phase: str, default: float) -> float:
+        if cls.samples(service, phase) < cls.MIN_SAMPLES:
+            return default
+        p50 = cls.percentile(service, phase, 0.5)
+        return round(min(max(p50 / cls.POLLS_PER_MEDIAN, default * cls.SHRINK), default), 2)
+
+    @classmethod
+    @contextmanager
+    def measure(cls, service: str, phase: str, timeout: float | None = None):
+        """
+        Records the duration of the enclosed phase. An exception raised after the timeout is recorded as a timeout,
+        other exceptions are not latencies of the service and are not recorded.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            seconds = time.perf_counter() - start
+            if timeout is not None and seconds >= timeout:
+                cls.record(service, phase, seconds, timed_out=True, timeout=timeout)
+            raise
+        cls.record(service, phase, time.perf_counter() - start, timeout=timeout)
+
+    @classmethod
+    def report(cls) -> list[dict]:
+        """Per service and phase: observations, timeouts, p50 / p90 / p99 / max seconds and the last timeout used"""
+        rows = []
+        for service, phases in sorted(cls._services.items()):
+            for phase, histogram in sorted(phases.items()):
+                rows.append({"service": service, "phase": phase, "count": round(sum(histogram["counts"]), 1),
+                             "timeouts": round(histogram["timeouts"], 1),
+                             "p50": cls.percentile(service, phase, 0.5), "p90": cls.percentile(service, phase, 0.9),
+                             "p99": cls.percentile(service, phase, 0.99), "max": histogram["max"],
+                             "timeout": histogram.get("timeout")})
+        return rows
+
+    @classmethod
+    def report_lines(cls) -> list[str]:
+        lines = [f"{'service':<8} {'phase':<24} {'count':>7} {'timeouts':>8} {'p50 s':>8} {'p90 s':>8} "
+                 f"{'p99 s':>8} {'max s':>8} {'timeout s':>9}"]
+        for row in cls.report():
+            lines.append(f"{row['service']:<8} {row['phase']:<24} {row['count']:>7} {row['timeouts']:>8} "
+                         f"{row['p50']:>8.2f} {row['p90']:>8.2f} {row['p99']:>8.2f} {row['max']:>8.2f} "
+                         f"{row['timeout'] if row['timeout'] is not None else '-':>9}")
+        return lines
+
+    @classmethod
+    def log_report(cls) -> None:
+        if not cls._services:
+            return
+        logger.info("Latency of the remote services" + (f" (histograms in {cls._path})" if cls._path else "")
+                    + ":\n" + "\n".join(cls.report_lines()))
+
+
+def wait_until(driver, service: str, phase: str, default_timeout: float, condition):
+    """WebDriverWait(driver, timeout).until(condition) with the timeout of the phase, its latency is recorded"""
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    timeout = ServiceLatency.timeout(service, phase, default_timeout)
+    with ServiceLatency.measure(service, phase, timeout):
+        return WebDriverWait(driver, timeout).until(condition)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency histograms of the remote services and the derived timeouts")
+    parser.add_argument("histograms", nargs="?", default=DEFAULT_PATH,
+                        help=f"Histograms file (default: {DEFAULT_PATH})")
+    args = parser.parse_args()
+
+    ServiceLatency.configure(args.histograms)
+    if not ServiceLatency.report():
+        print(f"No latencies recorded in {args.histograms}")
+        return
+    print("\n".join(ServiceLatency.report_lines()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,555 @@
+import argparse
+import html
+import io
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+logger = logging.getLogger(__name__)
+
+AMINO_ACIDS = ("ALA", "ARG", "ASN", "ASP", "CYS", "GLN", "GLU", "GLY", "HIS", "ILE",
+               "LEU", "LYS", "MET", "PHE", "PRO", "SER", "THR", "TRP", "TYR", "VAL")
+ATOM_NAMES = ("N", "CA", "C", "O", "CB")
+
+PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{title}</title>
+<style>
+  body {{ font-family: sans-serif; margin: 20px; }}
+  td, th {{ padding: 2px 8px; text-align: left; }}
+  .ant-table-row-expand-icon {{ display: inline-block; width: 14px; height: 14px; border: 1px solid #999;
+                                cursor: pointer; }}
+  .ant-table-row-expanded {{ background: #ccc; }}
+  .ant-collapse-header {{ cursor: pointer; font-weight: bold; }}
+  ul.ant-pagination {{ list-style: none; padding: 0; }}
+  ul.ant-pagination li {{ display: inline-block; min-width: 24px; margin: 2px; border: 1px solid #ccc;
+                          text-align: center; cursor: pointer; }}
+  .ant-pagination-item-active {{ border-color: #1677ff !important; }}
+  .collapse:not(.show) {{ display: none; }}
+</style></head>
+<body>
+{body}
+<script>
+{script}
+</script>
+</body></html>
+"""
+
+CASTPFOLD_SCRIPT = """
+const POCKETS = %(pockets)s;
+const JOB_MS = %(job_ms)d;
+const PAGE_SIZE = 10;
+
+function paginationItems(pages, current) {
+  let items = '<li class="ant-pagination-prev' + (current === 1 ? ' ant-pagination-disabled' : '') + '"><a>&lt;</a></li>';
+  for (let page = 1; page <= pages; page++) {
+    items += '<li class="ant-pagination-item ant-pagination-item-' + page
+      + (page === current ? ' ant-pagination-item-active' : '') + '" data-page="' + page + '"><a>' + page + '</a></li>';
+  }
+  return items + '<li class="ant-pagination-next' + (current === pages ? ' ant-pagination-disabled' : '') + '"><a>&gt;</a></li>';
+}
+
+function renderPockets(page) {
+  let rows = '';
+  POCKETS.slice((page - 1) * PAGE_SIZE, page * PAGE_SIZE).forEach(function (pocket) {
+    rows += '<tr class="ant-table-row ant-table-row-level-0" data-pocket="' + pocket.index + '">'
+      + '<td class="ant-table-row-expand-icon-cell"><span class="ant-table-row-expand-icon ant-table-row-collapsed"></span></td>'
+      + '<td>' + pocket.id + '</td><td>' + pocket.area_sa + '</td><td>' + pocket.volume_sa + '</td>'
+      + '<td>' + pocket.area_ms + '</td><td>' + pocket.volume_ms + '</td></tr>';
+  });
+  document.getElementById('pockets').innerHTML = rows;
+  const pagination = document.getElementById('pocket-pagination');
+  pagination.dataset.page = page;
+  pagination.innerHTML = paginationItems(Math.ceil(POCKETS.length / PAGE_SIZE), page);
+}
+
+function renderAtoms(index, page) {
+  const atoms = POCKETS[index].atoms;
+  let rows = '';
+  atoms.slice((page - 1) * PAGE_SIZE, page * PAGE_SIZE).forEach(function (atom) {
+    rows += '<tr class="ant-table-row"><td>' + atom.join('</td><td>') + '</td></tr>';
+  });
+  document.querySelector('tbody[data-pocket="' + index + '"]').innerHTML = rows;
+  const pagination = document.querySelector('ul[data-pocket="' + index + '"]');
+  pagination.dataset.page = page;
+  pagination.innerHTML = paginationItems(Math.ceil(atoms.length / PAGE_SIZE), page);
+}
+
+function expandedRow(index) {
+  const pocket = POCKETS[index];
+  return '<tr class="ant-table-expanded-row ant-table-expanded-row-level-1"><td colspan="6"><div class="ant-collapse">'
+    + '<div class="ant-collapse-item"><div class="ant-collapse-header" role="button">Pocket Info</div>'
+    + '<div class="ant-collapse-content" style="display: none">Pocket ' + pocket.id + ': ' + pocket.atoms.length + ' atoms</div></div>'
+    + '<div class="ant-collapse-item"><div class="ant-collapse-header" role="button">Atom Info</div>'
+    + '<div class="ant-collapse-content" style="display: none"><div class="ant-table-wrapper"><div class="ant-table">'
+    + '<div class="ant-table-content"><table><thead><tr><th>Chain</th><th>Seq ID</th><th>Residue</th><th>Atom</th></tr></thead>'
+    + '<tbody data-pocket="' + index + '"></tbody></table></div></div>'
+    + '<ul class="ant-pagination ant-pagination-mini" data-pocket="' + index + '" data-page="1"></ul></div></div></div>'
+    + '</div></td></tr>';
+}
+
+function toggleRow(icon) {
+  const row = icon.closest('tr');
+  const next = row.nextElementSibling;
+  const expanded = next && next.classList.contains('ant-table-expanded-row') ? next : null;
+  if (icon.classList.contains('ant-table-row-collapsed')) {
+    icon.classList.replace('ant-table-row-collapsed', 'ant-table-row-expanded');
+    if (expanded) {
+      expanded.removeAttribute('style');
+    } else {
+      row.insertAdjacentHTML('afterend', expandedRow(Number(row.dataset.pocket)));
+      renderAtoms(Number(row.dataset.pocket), 1);
+    }
+  } else {
+    icon.classList.replace('ant-table-row-expanded', 'ant-table-row-collapsed');
+    expanded.style.display = 'none';
+  }
+}
+
+document.addEventListener('click', function (event) {
+  const icon = event.target.closest('.ant-table-row-expand-icon');
+  if (icon) {
+    toggleRow(icon);
+    return;
+  }
+  const header = event.target.closest('.ant-collapse-header');
+  if (header) {
+    const content = header.nextElementSibling;
+    content.style.display = content.style.display === 'none' ? '' : 'none';
+    return;
+  }
+  const item = event.target.closest('ul.ant-pagination li');
+  if (item && !item.classList.contains('ant-pagination-disabled')) {
+    const pagination = item.closest('ul');
+    let page = Number(pagination.dataset.page);
+    if (item.classList.contains('ant-pagination-prev')) page -= 1;
+    else if (item.classList.contains('ant-pagination-next')) page += 1;
+    else page = Number(item.dataset.page);
+    if (pagination.dataset.pocket === undefined) renderPockets(page);
+    else renderAtoms(Number(pagination.dataset.pocket), page);
+  }
+});
+
+setTimeout(function () {
+  document.getElementById('status').remove();
+  document.getElementById('results').style.display = '';
+  renderPockets(1);
+}, JOB_MS);
+"""
+
+CASTPFOLD_BODY = """
+<h2>CASTpFold job {job}</h2>
+<div id="status">Job {job} is running...</div>
+<div id="results" style="display: none">
+  <button type="button" class="ant-btn ant-btn-primary"><span>Download CASTpFold Data</span></button>
+  <div class="ant-table-wrapper"><div class="ant-table"><div class="ant-table-content"><table>
+    <thead><tr><th class="ant-table-row-expand-icon-th"></th><th><div>Pocket ID</div></th><th><div>Area (SA)</div></th>
+      <th><div>Volume (SA)</div></th><th><div>Area (MS)</div></th><th><div>Volume (MS)</div></th></tr></thead>
+    <tbody id="pockets"></tbody>
+  </table></div></div>
+  <ul class="ant-pagination" id="pocket-pagination" data-page="1"></ul></div>
+</div>
+"""
+
+CAVITYPLUS_SCRIPT = """
+const JOB_MS = %(job_ms)d;
+let uploadId = null;
+
+function upload(event) {
+  const file = event.target.files[0];
+  const status = event.target.nextElementSibling;
+  status.textContent = 'Uploading...';
+  uploadId = null;
+  fetch('api/upload?name=' + encodeURIComponent(file.name), {method: 'POST', body: file})
+    .then(function (response) { return response.ok ? response.json() : Promise.reject(response.status); })
+    .then(function (data) { uploadId = data.id; status.textContent = 'Success.'; })
+    .catch(function () { status.textContent = 'Upload failed.'; });
+}
+
+document.getElementById('cavityInputType').addEventListener('change', function () {
+  const box = document.getElementById('input-box');
+  if (this.value === 'file') {
+    box.innerHTML = '<label class="form-label"><div>Protein structure (*.pdb, *.pdb.gz, *.cif, *.cif.gz)</div>'
+      + '<div class="upload"><input type="file" accept="pdb"><div class="upload-status"></div></div></label>';
+    box.querySelector('input').addEventListener('change', upload);
+  } else {
+    box.innerHTML = '<input type="text" class="form-control" placeholder="PDB ID">';
+  }
+});
+
+document.getElementById('computation').addEventListener('submit', function (event) {
+  event.preventDefault();
+  if (!uploadId) return;
+  const results = document.getElementById('results');
+  results.textContent = 'Computing cavities...';
+  setTimeout(function () {
+    fetch('api/result/' + uploadId)
+      .then(function (response) { return response.text(); })
+      .then(function (text) { results.innerHTML = text; });
+  }, JOB_MS);
+});
+
+document.addEventListener('click', function (event) {
+  const more = event.target.closest('div.more');
+  if (more) document.getElementById('more_' + more.dataset.cavity).classList.toggle('show');
+});
+"""
+
+CAVITYPLUS_BODY = """
+<div class="container">
+  <h2>CavityPlus computation</h2>
+  <form id="computation">
+    <select id="cavityInputType" class="form-select">
+      <option value="id">PDB ID</option>
+      <option value="file">PDB File</option>
+    </select>
+    <div id="input-box"><input type="text" class="form-control" placeholder="PDB ID"></div>
+    <button type="submit" class="btn btn-primary">Submit</button>
+  </form>
+  <div id="results"></div>
+</div>
+"""
+
+PRANKWEB_SCRIPT = """
+function message(text) { document.getElementById('message').textContent = text; }
+
+document.getElementById('input-user-file').addEventListener('change', function () {
+  document.getElementById('user-file-box').style.display = '';
+});
+
+document.getElementById('submit-button').addEventListener('click', function () {
+  const file = document.getElementById('user-file').files[0];
+  if (!file) {
+    message('Select a structure file first.');
+    return;
+  }
+  message('Submitting...');
+  fetch('api/upload?name=' + encodeURIComponent(file.name), {method: 'POST', body: file})
+    .then(function (response) { return response.ok ? response.json() : Promise.reject(response.status); })
+    .then(function (data) { location.href = 'viewer?id=' + data.id; })
+    .catch(function (status) { message('Submission failed (' + status + ')'); });
+});
+"""
+
+PRANKWEB_BODY = """
+<h2>PrankWeb</h2>
+<form onsubmit="return false">
+  <input type="radio" name="input-type" id="input-pdb-id" checked><label for="input-pdb-id">Experimental structure</label>
+  <input type="radio" name="input-type" id="input-user-file"><label for="input-user-file">Custom structure</label>
+  <div id="user-file-box" style="display: none"><input type="file" id="user-file"></div>
+  <button type="button" id="submit-button">Submit</button>
+</form>
+<div id="message"></div>
+"""
+
+PRANKWEB_VIEWER_SCRIPT = """
+const PREDICTION = %(prediction)s;
+const JOB_MS = %(job_ms)d;
+
+document.addEventListener('click', function (event) {
+  if (event.target.closest('#simple-tab-1')) {
+    document.getElementById('tab-panel').innerHTML = '<button type="button" id="download-button">'
+      + '<a href="api/download/' + PREDICTION + '" download="prankweb-' + PREDICTION + '.zip">Download prediction data</a>'
+      + '</button>';
+    return;
+  }
+  const button = event.target.closest('#download-button');
+  if (button && !event.target.closest('a')) button.querySelector('a').click();
+});
+
+setTimeout(function () {
+  document.getElementById('app').innerHTML = '<div role="tablist">'
+    + '<button type="button" role="tab" id="simple-tab-0">Pockets</button>'
+    + '<button type="button" role="tab" id="simple-tab-1">Info</button></div><div id="tab-panel"></div>';
+}, JOB_MS);
+"""
+
+
+class StandInSites:
+    """
+    Local stand-ins of the CASTpFold, CavityPlus and PrankWeb pages, with the DOM structures the scrapers
+    (castpfold_to_csv, cavity_plus_to_csv, prankweb_to_csv) rely on, so they can be run and timed headlessly
+    without the live sites:
+
+        /castpfold/search?{job}   ant-design pocket table (pagination, expandable rows, 'Atom Info' with paginated atoms)
+        /cavityplus/              input type select, upload with the status div, accordion of cavities with more_N rows
+        /prankweb/                custom structure upload, viewer with the Info tab and the prediction data download (.zip)
+
+    Pockets are random but reproducible per structure name (seed); uploaded PDBs give the residues of the pockets.
+    latency (+ random jitter) seconds delays every response, job_seconds is the time until results are shown,
+    failure_rate is the probability of a failed upload (CavityPlus 'Upload failed.', PrankWeb submission error),
+    error_rate the probability of an HTTP 503 of a page.
+
+    Point config.ini at them (see main()), e.g. base_url = http://127.0.0.1:8765/castpfold/search
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, job_seconds: float = 2.0,
+                 failure_rate: float = 0.0, error_rate: float = 0.0, seed: int = 1):
+        self.latency = latency
+        self.jitter = jitter
+        self.job_seconds = job_seconds
+        self.failure_rate = failure_rate
+        self.error_rate = error_rate
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        # upload id -> (structure name, pockets)
+        self.uploads: dict[str, tuple[str, list[dict]]] = {}
+
+    def chance(self, rate: float) -> bool:
+        with self.lock:
+            return self.rng.random() < rate
+
+    def delay(self) -> None:
+        with self.lock:
+            seconds = self.latency + self.jitter * self.rng.random()
+        if seconds > 0:
+            time.sleep(seconds)
+
+    @staticmethod
+    def residues_from_pdb(text: str) -> list[tuple[str, str, str]]:
+        """(chain, seq id, residue name) of the CA atoms of a PDB."""
+        residues = []
+        for line in text.splitlines():
+            if line.startswith("ATOM") and line[12:16].strip() == "CA":
+                residues.append((line[21].strip() or "A", line[22:26].strip(), line[17:20].strip()))
+        return residues
+
+    def synthetic_residues(self, name: str, count: int = 320) -> list[tuple[str, str, str]]:
+        rng = random.Random(f"{self.seed}:residues:{name}")
+        return [("A", str(i), rng.choice(AMINO_ACIDS)) for i in range(1, count + 1)]
+
+    def pockets(self, name: str, residues: list[tuple[str, str, str]]) -> list[dict]:
+        """Pockets (number, area, volume, residues), largest first, the same for the same name and residues."""
+        rng = random.Random(f"{self.seed}:pockets:{name}")
+        pockets = []
+        for _ in range(rng.randint(8, 24)):
+            size = rng.randint(6, 30)
+            start = rng.randrange(max(1, len(residues) - 2 * size))
+            window = residues[start:start + 2 * size]
+            chosen = [window[i] for i in sorted(rng.sample(range(len(window)), min(size, len(window))))]
+            volume = round(size * rng.uniform(20, 60), 3)
+            pockets.append({"area": round(volume * rng.uniform(0.8, 1.6), 3), "volume": volume, "residues": chosen})
+        pockets.sort(key=lambda pocket: -pocket["volume"])
+        for number, pocket in enumerate(pockets, start=1):
+            pocket["number"] = number
+        return pockets
+
+    def register_upload(self, name: str, body: bytes) -> str:
+        residues = self.residues_from_pdb(body.decode("utf-8", errors="replace")) or self.synthetic_residues(name)
+        upload_id = uuid.uuid4().hex[:12]
+        with self.lock:
+            self.uploads[upload_id] = (name, self.pockets(name, residues))
+        return upload_id
+
+    def castpfold_page(self, job: str) -> str:
+        pockets = self.pockets(job, self.synthetic_residues(job))
+        rng = random.Random(f"{self.seed}:atoms:{job}")
+        data = []
+        for index, pocket in enumerate(pockets):
+            atoms = [[chain, seq_id, aa, atom] for chain, seq_id, aa in pocket["residues"]
+                     for atom in rng.sample(ATOM_NAMES, rng.randint(1, 3))]
+            data.append({"index": index, "id": pocket["number"], "area_sa": pocket["area"],
+                         "volume_sa": pocket["volume"], "area_ms": round(pocket["area"] * 1.4, 3),
+                         "volume_ms": round(pocket["volume"] * 1.6, 3), "atoms": atoms})
+        script = CASTPFOLD_SCRIPT % {"pockets": json.dumps(data), "job_ms": int(1000 * self.job_seconds)}
+        return PAGE.format(title="CASTpFold", body=CASTPFOLD_BODY.format(job=html.escape(job)), script=script)
+
+    def cavityplus_page(self) -> str:
+        script = CAVITYPLUS_SCRIPT % {"job_ms": int(1000 * self.job_seconds)}
+        return PAGE.format(title="CavityPlus", body=CAVITYPLUS_BODY, script=script)
+
+    def cavityplus_results(self, upload_id: str) -> str | None:
+        with self.lock:
+            upload = self.uploads.get(upload_id)
+        if upload is None:
+            return None
+        name, pockets = upload
+        rows = []
+        for pocket in pockets:
+            number = pocket["number"]
+            residues = ", ".join(f"{aa}-{seq_id}-{chain}" for chain, seq_id, aa in pocket["residues"])
+            drug_score = round(pocket["volume"] / 10, 2)
+            rows.append(
+                f'<tr><td>{number}</td><td>{drug_score}</td><td>{"Strong" if drug_score > 60 else "Weak"}</td>'
+                f'<td>{round(drug_score / 12, 2)}</td><td>{round(drug_score / 15, 2)}</td>'
+                f'<td>{len(pocket["residues"])}</td>'
+                f'<td><div class="more" data-cavity="{number}" style="color: blue; cursor: pointer;">more</div></td></tr>\n'
+                f'<tr id="more_{number}" class="collapse"><td colspan="7"><table class="table table-sm">'
+                f'<tr><th>Surface Area</th><td>{pocket["area"]}</td></tr>'
+                f'<tr><th>Volume</th><td>{pocket["volume"]}</td></tr>'
+                f'<tr><th>Residues</th><td>{residues}</td></tr></table></td></tr>')
+        return (f'<div class="container"><h3>Results of {html.escape(name)}</h3>'
+                f'<button type="button" class="btn btn-link"><b>Download results</b></button>'
+                f'<div class="accordion"><div class="accordion-item">'
+                f'<h2 class="accordion-header"><button type="button" class="accordion-button">Cavity Results</button></h2>'
+                f'<div class="accordion-collapse collapse show"><div class="accordion-body"><table class="table">'
+                f'<thead><tr><th>Cavity</th><th>DrugScore</th><th>Druggability</th><th>Max pKd</th><th>Avg pKd</th>'
+                f'<th>Residues</th><th></th></tr></thead>\n<tbody>\n' + "\n".join(rows) +
+                '</tbody></table></div></div></div></div></div>')
+
+    def prankweb_page(self) -> str:
+        return PAGE.format(title="PrankWeb", body=PRANKWEB_BODY, script=PRANKWEB_SCRIPT)
+
+    def prankweb_viewer(self, prediction_id: str) -> str:
+        script = PRANKWEB_VIEWER_SCRIPT % {"prediction": json.dumps(prediction_id),
+                                           "job_ms": int(1000 * self.job_seconds)}
+        return PAGE.format(title="PrankWeb prediction", body='<div id="app">Prediction is running...</div>',
+                           script=script)
+
+    def prankweb_zip(self, prediction_id: str) -> bytes | None:
+        """Prediction data as downloaded from PrankWeb: structure.pdb_predictions.csv, structure.pdb_residues.csv"""
+        with self.lock:
+            upload = self.uploads.get(prediction_id)
+        if upload is None:
+            return None
+        _, pockets = upload
+        predictions = ["name     ,rank, score, probability, sas_points, surf_atoms, residue_ids"]
+        labels = {}
+        for pocket in pockets:
+            residue_ids = " ".join(f"{chain}_{seq_id}" for chain, seq_id, _ in pocket["residues"])
+            predictions.append(f"pocket{pocket['number']}  ,{pocket['number']:4d}, {pocket['volume'] / 100:.2f}, "
+                               f"{min(0.99, pocket['volume'] / 2000):.3f}, {len(pocket['residues']) * 3}, "
+                               f"{len(pocket['residues']) * 2}, {residue_ids}")
+            labels.update({seq_id: (chain, aa, pocket["number"]) for chain, seq_id, aa in pocket["residues"]})
+        residues = ["chain, residue_label, residue_name, score, zscore, probability, pocket"]
+        residues += [f"{chain}, {seq_id}, {aa}, 0.0, 0.0, 0.0, {number}"
+                     for seq_id, (chain, aa, number) in labels.items()]
+
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr("structure.pdb_predictions.csv", "\n".join(predictions) + "\n")
+            archive.writestr("structure.pdb_residues.csv", "\n".join(residues) + "\n")
+        return buffer.getvalue()
+
+    def serve(self, host: str = "127.0.0.1", port: int = 8765, background: bool = False) -> ThreadingHTTPServer:
+        """Starts the server; background=True serves from a daemon thread (stop it with server.shutdown())."""
+        handler = type("StandInSitesHandler", (_StandInSitesHandler,), {"sites": self})
+        server = ThreadingHTTPServer((host, port), handler)
+        server.daemon_threads = True
+        if background:
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+    @staticmethod
+    def config_lines(host: str, port: int) -> list[str]:
+        """config.ini values for running the scrapers against the stand-in sites."""
+        root = f"http://{host}:{port}"
+        return [f"base_url = {root}/castpfold/search",
+                f"cavity_plus_url = {root}/cavityplus/#/computation",
+                f"prank_web_url = {root}/prankweb/",
+                "castpfold_submit = False"]
+
+
+class _StandInSitesHandler(BaseHTTPRequestHandler):
+    sites: StandInSites
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+    def send(self, status: int, body: bytes | str, content_type: str = "text/html; charset=utf-8",
+             headers: dict | None = None) -> None:
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.sites.delay()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def page(self, render) -> None:
+        """A page of a site, failing with 503 at the configured error rate."""
+        if self.sites.chance(self.sites.error_rate):
+            self.send(503, "<h1>503 Service Unavailable</h1>")
+        else:
+            self.send(200, render())
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        path = url.path.rstrip("/")
+        sites = self.sites
+        if path == "/castpfold/search":
+            job = url.query.split("&")[0] or "job"
+            self.page(lambda: sites.castpfold_page(job))
+        elif path == "/cavityplus":
+            self.page(sites.cavityplus_page)
+        elif path.startswith("/cavityplus/api/result/"):
+            results = sites.cavityplus_results(path.rsplit("/", 1)[-1])
+            if results is None:
+                self.send(404, "Unknown upload")
+            else:
+                self.send(200, results)
+        elif path == "/prankweb":
+            self.page(sites.prankweb_page)
+        elif path == "/prankweb/viewer":
+            prediction_id = parse_qs(url.query).get("id", [""])[0]
+            self.page(lambda: sites.prankweb_viewer(prediction_id))
+        elif path.startswith("/prankweb/api/download/"):
+            prediction_id = path.rsplit("/", 1)[-1]
+            data = sites.prankweb_zip(prediction_id)
+            if data is None:
+                self.send(404, "Unknown prediction")
+            else:
+                self.send(200, data, "application/zip",
+                          {"Content-Disposition": f'attachment; filename="prankweb-{prediction_id}.zip"'})
+        elif path == "":
+            links = "".join(f'<li><a href="{link}">{link}</a></li>'
+                            for link in ("/castpfold/search?j_local", "/cavityplus/#/computation", "/prankweb/"))
+            self.send(200, f"<h2>Stand-in sites</h2><ul>{links}</ul>")
+        else:
+            self.send(404, "Not found")
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        path = url.path.rstrip("/")
+        if path not in ("/cavityplus/api/upload", "/prankweb/api/upload"):
+            self.send(404, "Not found")
+            return
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.sites.chance(self.sites.failure_rate):
+            self.send(503, json.dumps({"error": "injected failure"}), "application/json")
+            return
+        name = parse_qs(url.query).get("name", ["structure.pdb"])[0]
+        upload_id = self.sites.register_upload(name.rsplit(".", 1)[0], body)
+        self.send(200, json.dumps({"id": upload_id}), "application/json")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local stand-ins of the CASTpFold, CavityPlus and PrankWeb sites "
+                                                 "for offline (headless) scraper runs and benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Delay of every response, seconds (default: 0)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Extra random delay up to this, seconds (default: 0)")
+    parser.add_argument("--job-seconds", type=float, default=2.0,
+                        help="Time until the results of a job are shown, seconds (default: 2)")
+    parser.add_argument("--failure-rate", type=float, default=0.0,
+                        help="Probability of a failed upload / submission (default: 0)")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="Probability of an HTTP 503 of a page (default: 0)")
+    parser.add_argument("--seed", type=int, default=1, help="Seed of the pockets and the injected failures")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    sites = StandInSites(args.latency, args.jitter, args.job_seconds, args.failure_rate, args.error_rate, args.seed)
+    server = sites.serve(args.host, args.port)
+    logger.info(f"Stand-in sites on http://{args.host}:{args.port}/, for the scrapers set in config.ini:\n"
+                + "\n".join(sites.config_lines(args.host, args.port)))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCHMARKS_DIR)
+# The pipeline modules are imported flat (see UI_SELENIUM/utils.py)
+for folder in (REPO_ROOT, os.path.join(REPO_ROOT, "UI_SELENIUM"), os.path.join(REPO_ROOT, "PYMOL_SCRIPTS")):
+    if folder not in sys.path:
+        sys.path.insert(0, folder)
+
+from synthetic_data import SyntheticDataGenerator
+from consensus_builder import ConsensusBuilder
+from pm_coloring import prepare_for_pymol
+from pipeline_config import SeleniumConfig
+from prankweb_local_out_to_csv import process_p2rank_local_output
+from pupp_out_to_csv import process_pupp_out_directory
+from stage_timer import StageTimer
+from data_to_pm_input import verify_and_copy
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SCALES = (10, 100, 1000)
+BEST_CAVITY_STRATEGY = "pupp_longest_other_first"
+
+
+def git_revision() -> dict:
+    """Commit of the benchmarked tree and whether it had uncommitted changes (None outside of git)."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_ROOT,
+                                capture_output=True, text=True, check=True).stdout
+        return {"commit": commit, "dirty": bool(status.strip())}
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+
+
+class BenchmarkRun:
+    """
+    Times the offline stages of the pipeline on synthetic data (see SyntheticDataGenerator), per scale:
+
+        process_pupp_out_directory    PACUPP lining lists -> pupp workbooks
+        process_p2rank_local_output   P2Rank predict_* CSVs -> p2rk workbooks
+        data_to_pm_input              verify_and_copy of the Selenium output and the PDBs into PM_INPUT
+        process_multi_or_folder       consensus of all ORs (cold), then again with unchanged inputs (warm)
+        prepare_for_pymol             PyMol scripts of all ORs
+
+    Generating the data is not timed. Results (seconds and ms per OR of each stage) go to a JSON file
+    with the git commit, so runs of different commits can be compared (--compare).
+    """
+
+    def __init__(self, workdir, seed: int = 1, residues: int = 320):
+        self.workdir = workdir
+        self.seed = seed
+        self.residues = residues
+        self.results: list[dict] = []
+
+    def timed(self, stage: str, n_ors: int, func, *args, **kwargs):
+        start = time.perf_counter()
+        value = func(*args, **kwargs)
+        seconds = time.perf_counter() - start
+        self.results.append({"stage": stage, "n_ors": n_ors, "seconds": round(seconds, 4),
+                             "per_or_ms": round(1000 * seconds / n_ors, 3)})
+        logger.info(f"{stage:<36} {n_ors:>6} ORs {seconds:>10.3f} s {1000 * seconds / n_ors:>10.2f} ms/OR")
+        return value
+
+    def run_scale(self, n_ors: int) -> None:
+        root = os.path.join(self.workdir, f"ors_{n_ors}")
+        if os.path.exists(root):
+            shutil.rmtree(root)
+        logger.info(f"Generating synthetic data of {n_ors} ORs in {root}")
+        folders = SyntheticDataGenerator(self.seed, self.residues).generate(root, n_ors)
+        pm_input = os.path.join(root, "PM_INPUT")
+        pm_output = os.path.join(root, "PM_OUTPUT")
+        os.makedirs(pm_input)
+        os.makedirs(pm_output)
+
+        config = SeleniumConfig(output_dir=folders["output"], prankweb_local_output=folders["p2rank"])
+        pdb_files = sorted(os.listdir(folders["input"]))
+
+        self.timed("process_pupp_out_directory", n_ors, process_pupp_out_directory, folders["pupp"], config)
+        self.timed("process_p2rank_local_output", n_ors, process_p2rank_local_output, pdb_files, config)
+        self.timed("data_to_pm_input", n_ors, verify_and_copy, folders["input"], folders["output"], pm_input)
+        cavities, consensus_results = self.timed("process_multi_or_folder", n_ors,
+                                                 ConsensusBuilder.process_multi_or_folder,
+                                                 pm_input, BEST_CAVITY_STRATEGY)
+        self.timed("process_multi_or_folder (unchanged)", n_ors,
+                   ConsensusBuilder.process_multi_or_folder, pm_input, BEST_CAVITY_STRATEGY)
+        self.timed("prepare_for_pymol", n_ors, prepare_for_pymol, pm_input, pm_output, cavities,
+                   copy_input=True, consensus_results=consensus_results)
+
+    def report(self, scales) -> dict:
+        return {
+            **git_revision(),
+            "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": self.seed,
+            "residues": self.residues,
+            "scales": list(scales),
+            "results": self.results,
+            "spans": StageTimer.summary(),
+        }
+
+
+def compare(current: dict, baseline: dict) -> list[str]:
+    """Lines of 'stage, n_ors, baseline s, current s, ratio' for the stages measured in both runs."""
+    baseline_seconds = {(r["stage"], r["n_ors"]): r["seconds"] for r in baseline["results"]}
+    lines = [f"{'stage':<36} {'ORs':>6} {'baseline s':>11} {'current s':>10} {'ratio':>7}"]
+    for result in current["results"]:
+        before = baseline_seconds.get((result["stage"], result["n_ors"]))
+        if before is None:
+            continue
+        ratio = result["seconds"] / before if before else float("inf")
+        lines.append(f"{result['stage']:<36} {result['n_ors']:>6} {before:>11.3f} {result['seconds']:>10.3f} "
+                     f"{ratio:>7.2f}")
+    return lines
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline benchmark of the parsing, consensus and PyMol stages "
+                                                 "on synthetic data")
+    parser.add_argument("--scales", type=int, nargs="+", default=list(DEFAULT_SCALES),
+                        help=f"Numbers of ORs to benchmark (default: {' '.join(map(str, DEFAULT_SCALES))}, "
+                             f"up to 10000 for a full run)")
+    parser.add_argument("--seed", type=int, default=1, help="Seed of the synthetic data (default: 1)")
+    parser.add_argument("--residues", type=int, default=320, help="Residues per synthetic OR (default: 320)")
+    parser.add_argument("--workdir", default=os.path.join(BENCHMARKS_DIR, "data"),
+                        help="Folder for the synthetic data lakes (default: benchmarks/data)")
+    parser.add_argument("--output", help="Results JSON (default: benchmarks/results/bench_{commit}_{time}.json)")
+    parser.add_argument("--compare", help="Results JSON of an earlier run to compare with")
+    parser.add_argument("--keep-data", action="store_true", help="Keep the synthetic data lakes after the run")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    # The pipeline logs every OR, only the benchmark lines are of interest here
+    logging.getLogger().setLevel(logging.WARNING)
+    logger.setLevel(logging.INFO)
+
+    run = BenchmarkRun(args.workdir, args.seed, args.residues)
+    for n_ors in args.scales:
+        run.run_scale(n_ors)
+        if not args.keep_data:
+            shutil.rmtree(os.path.join(args.workdir, f"ors_{n_ors}"), ignore_errors=True)
+
+    report = run.report(args.scales)
+    output = args.output or os.path.join(
+        BENCHMARKS_DIR, "results",
+        f"bench_{(report['commit'] or 'nogit')[:8]}_{datetime.now().strftime('%y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    logger.info(f"Benchmark results written to {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            logger.info("\n".join(compare(report, json.load(f))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCHMARKS_DIR)
+
+# Heavy third-party packages, the ones a start is checked for
+HEAVY_MODULES = ("selenium", "castpfoldpy", "pandas", "openpyxl", "pymol2")
+
+# Entry point (sub)commands: folder the entry point runs in, the imports of its start (the entry module and
+# the modules the subcommand loads), the heavy modules it must not load and its startup budget in seconds
+STARTUPS = {
+    "main.py -r pupp": {
+        "cwd": "UI_SELENIUM",
+        "code": "import main; main.prediction(main.MethodType.PUPP)",
+        "excluded": ("selenium", "castpfoldpy", "pandas"),
+        "budget": 0.3,
+    },
+    "main.py -r p2rk": {
+        "cwd": "UI_SELENIUM",
+        "code": "import main; main.prediction(main.MethodType.P2RK)",
+        "excluded": ("selenium", "castpfoldpy"),
+        "budget": 0.8,
+    },
+    "main.py": {
+        "cwd": "UI_SELENIUM",
+        "code": "import main; [main.prediction(method) for method in main.MethodType]",
+        "excluded": (),
+        "budget": 2.0,
+    },
+    "pm_main.py": {
+        "cwd": "PYMOL_SCRIPTS",
+        "code": "import pm_main",
+        "excluded": ("selenium", "castpfoldpy", "pymol2"),
+        "budget": 0.8,
+    },
+    "data_to_pm_input.py": {
+        "cwd": "",
+        "code": "import data_to_pm_input",
+        "excluded": ("selenium", "castpfoldpy", "pandas", "pymol2"),
+        "budget": 0.2,
+    },
+    "cavity_pipeline.py": {
+        "cwd": "",
+        "code": "import cavity_pipeline",
+        "excluded": ("selenium", "castpfoldpy", "pandas", "openpyxl", "pymol2"),
+        "budget": 0.2,
+    },
+    "methods_summary.py": {
+        "cwd": "UI_SELENIUM",
+        "code": "import methods_summary",
+        "excluded": ("selenium", "castpfoldpy", "pandas", "openpyxl", "pymol2"),
+        "budget": 0.2,
+    },
+}
+
+# Run in a fresh interpreter: seconds of the imports and the heavy modules they loaded
+PROBE = """
+import json, sys, time
+sys.path[:0] = [{cwd!r}, {root!r}]
+start = time.perf_counter()
+{code}
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(name: str, repeat: int) -> dict:
+    """Median import seconds of the start over repeat fresh interpreters, the loaded heavy modules and the verdict"""
+    startup = STARTUPS[name]
+    cwd = os.path.join(REPO_ROOT, startup["cwd"])
+    probe = PROBE.format(cwd=cwd, root=REPO_ROOT, code=startup["code"], heavy=HEAVY_MODULES)
+    seconds, heavy = [], []
+    for _ in range(repeat):
+        completed = subprocess.run([sys.executable, "-c", probe], cwd=cwd, capture_output=True, text=True)
+        if completed.returncode != 0:
+            error = (completed.stderr.strip().splitlines() or ["failed"])[-1]
+            return {"startup": name, "seconds": None, "budget": startup["budget"], "heavy": [], "status": error}
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        seconds.append(result["seconds"])
+        heavy = result["heavy"]
+
+    median = statistics.median(seconds)
+    unexpected = [module for module in heavy if module in startup["excluded"]]
+    if unexpected:
+        status = f"loads {', '.join(unexpected)}"
+    elif median > startup["budget"]:
+        status = "over budget"
+    else:
+        status = "ok"
+    return {"startup": name, "seconds": round(median, 3), "budget": startup["budget"], "heavy": heavy,
+            "status": status}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Startup (import) time of the entry points and their subcommands "
+                                                 "against their budgets")
+    parser.add_argument("startups", nargs="*", default=list(STARTUPS),
+                        help=f"Startups to measure (default: all of {', '.join(STARTUPS)})")
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters per startup, the median counts")
+    args = parser.parse_args()
+
+    results = [measure(name, args.repeat) for name in args.startups]
+    print(f"{'startup':<22} {'seconds':>8} {'budget':>7}  {'heavy modules':<36} status")
+    for result in results:
+        seconds = f"{result['seconds']:.3f}" if result["seconds"] is not None else "-"
+        print(f"{result['startup']:<22} {seconds:>8} {result['budget']:>7.1f}  "
+              f"{', '.join(result['heavy']) or '-':<36} {result['status']}")
+    # Starts that could not be imported (e.g. no Selenium installed) are reported, but do not fail the check
+    if any(result["status"] == "over budget" or result["status"].startswith("loads ") for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import math
+import os
+import random
+
+import openpyxl
+
+AMINO_ACIDS = ("ALA", "ARG", "ASN", "ASP", "CYS", "GLN", "GLU", "GLY", "HIS", "ILE",
+               "LEU", "LYS", "MET", "PHE", "PRO", "SER", "THR", "TRP", "TYR", "VAL")
+BACKBONE_ATOMS = (("N", "N"), ("CA", "C"), ("C", "C"), ("O", "O"))
+METHODS = ("cspf", "cvpl", "p2rk", "pupp")
+
+
+class SyntheticDataGenerator:
+    """
+    Synthetic, reproducible (seeded) inputs of the pipeline in a benchmark data lake folder:
+
+        input/{OR}.pdb                                  AlphaFold-style structure, pLDDT in the B-factor column
+        pacupp_python_feedup/{OR}_cavities_xfine_small_{APOLAR|POLAR}_cav{n}_lining.txt   PACUPP lining lists
+        p2rank/predict_{OR}/{OR}.pdb_predictions.csv, {OR}.pdb_residues.csv              P2Rank local output
+        output/{OR}/{OR}_cspf_residues.xlsx, {OR}_cvpl_residues.xlsx                     CASTpFold / CavityPlus workbooks
+
+    Every OR has a few "true" pockets, each method reports 5 cavities scattered around them,
+    so the methods partially agree as in real data and the consensus is not trivial.
+    """
+
+    CAVITIES = 5
+
+    def __init__(self, seed: int = 1, residues: int = 320, cavity_size: int = 18):
+        self.rng = random.Random(seed)
+        self.residues = residues
+        self.cavity_size = cavity_size
+
+    @staticmethod
+    def or_names(count: int) -> list[str]:
+        return [f"HsOR{i}_1" for i in range(1, count + 1)]
+
+    def sequence(self) -> list[str]:
+        return [self.rng.choice(AMINO_ACIDS) for _ in range(self.residues)]
+
+    def pdb_text(self, sequence: list[str]) -> str:
+        """Backbone atoms on a helix (positive coordinates, fixed-width PDB columns), one pLDDT per residue."""
+        lines = []
+        serial = 1
+        for i, residue_name in enumerate(sequence, start=1):
+            plddt = min(99.0, max(20.0, self.rng.gauss(82, 12)))
+            angle = math.radians(100 * i)
+            for k, (atom, element) in enumerate(BACKBONE_ATOMS):
+                x = 50 + 2.3 * math.cos(angle) + 0.4 * k
+                y = 50 + 2.3 * math.sin(angle)
+                z = 10 + 1.5 * i + 0.3 * k
+                lines.append(f"ATOM  {serial:5d}  {atom:<3} {residue_name} A{i:4d}    "
+                             f"{x:8.3f}{y:8.3f}{z:8.3f}  1.00{plddt:6.2f}           {element}")
+                serial += 1
+        lines.append("TER")
+        lines.append("END")
+        return "\n".join(lines) + "\n"
+
+    def cavities(self, pockets: list[int]) -> dict[int, list[int]]:
+        """5 cavities (cavity number -> sorted seq ids), each around one of the pockets, jittered per method."""
+        cavities = {}
+        for n in range(1, self.CAVITIES + 1):
+            center = self.rng.choice(pockets) + self.rng.randint(-8, 8)
+            span = self.cavity_size * 2
+            seq_ids = {min(self.residues, max(1, center + self.rng.randint(-span, span)))
+                       for _ in range(self.cavity_size)}
+            cavities[n] = sorted(seq_ids)
+        return cavities
+
+    @staticmethod
+    def write_residue_workbook(path, cavities: dict[int, list[int]], sequence: list[str]) -> None:
+        """Residue workbook of the CASTpFold / CavityPlus layout: one 'Cavity n' sheet per cavity."""
+        workbook = openpyxl.Workbook()
+        workbook.remove(workbook.active)
+        for n, seq_ids in cavities.items():
+            sheet = workbook.create_sheet(f"Cavity {n}")
+            sheet.append(["Cavity Number", "Chain", "Seq ID", "AA"])
+            for seq_id in seq_ids:
+                sheet.append([n, "A", seq_id, sequence[seq_id - 1]])
+        workbook.save(path)
+
+    @staticmethod
+    def write_pupp_files(feedup_dir, or_name: str, cavities: dict[int, list[int]], sequence: list[str]) -> None:
+        """PACUPP lining lists: an APOLAR and a POLAR file per cavity, header ending with the 'AltLoc' line."""
+        for n, seq_ids in cavities.items():
+            for polarity in ("APOLAR", "POLAR"):
+                half = seq_ids[::2] if polarity == "APOLAR" else seq_ids[1::2]
+                path = os.path.join(feedup_dir, f"{or_name}_cavities_xfine_small_{polarity}_cav{n}_lining.txt")
+                with open(path, "w") as f:
+                    f.write(f"Lining residues of {polarity.lower()} cavity {n}\n\n")
+                    f.write("Atom  AltLoc  Res  SeqNo  Chain\n")
+                    for seq_id in half:
+                        f.write(f"CA  {sequence[seq_id - 1]}  {seq_id}  A\n")
+
+    @staticmethod
+    def write_p2rank_output(p2rank_dir, or_name: str, cavities: dict[int, list[int]], sequence: list[str]) -> None:
+        predict_dir = os.path.join(p2rank_dir, f"predict_{or_name}")
+        os.makedirs(predict_dir, exist_ok=True)
+        with open(os.path.join(predict_dir, f"{or_name}.pdb_predictions.csv"), "w") as f:
+            f.write("name     ,rank, score, probability, sas_points, surf_atoms, residue_ids\n")
+            for n, seq_ids in cavities.items():
+                residue_ids = " ".join(f"A_{seq_id}" for seq_id in seq_ids)
+                f.write(f"pocket{n}  ,{n:4d}, {20 - n:.2f}, {0.9 - n / 10:.3f}, {40 + n}, {30 + n}, {residue_ids}\n")
+        with open(os.path.join(predict_dir, f"{or_name}.pdb_residues.csv"), "w") as f:
+            f.write("chain, residue_label, residue_name, score, zscore, probability, pocket\n")
+            for i, residue_name in enumerate(sequence, start=1):
+                f.write(f"A, {i}, {residue_name}, 0.0, 0.0, 0.0, 0\n")
+
+    def generate(self, root, or_count: int) -> dict[str, str]:
+        """Writes the inputs of or_count ORs under root, returns the folders by role."""
+        folders = {role: os.path.join(root, name) for role, name in
+                   (("input", "input"), ("output", "output"), ("pupp", "pacupp_python_feedup"), ("p2rank", "p2rank"))}
+        for folder in folders.values():
+            os.makedirs(folder, exist_ok=True)
+
+        for or_name in self.or_names(or_count):
+            sequence = self.sequence()
+            with open(os.path.join(folders["input"], f"{or_name}.pdb"), "w") as f:
+                f.write(self.pdb_text(sequence))
+
+            pockets = [self.rng.randint(20, self.residues - 20) for _ in range(3)]
+            or_output = os.path.join(folders["output"], or_name)
+            os.makedirs(or_output, exist_ok=True)
+            for method in ("cspf", "cvpl"):
+                self.write_residue_workbook(os.path.join(or_output, f"{or_name}_{method}_residues.xlsx"),
+                                            self.cavities(pockets), sequence)
+            self.write_pupp_files(folders["pupp"], or_name, self.cavities(pockets), sequence)
+            self.write_p2rank_output(folders["p2rank"], or_name, self.cavities(pockets), sequence)
+        return folders
@@ -0,0 +1,296 @@
+import argparse
+from datetime import datetime
+from functools import cached_property
+import logging
+import os
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.abspath(__file__))
+# The modules of UI_SELENIUM and PYMOL_SCRIPTS are imported flat, see UI_SELENIUM/utils.py
+sys.path.insert(0, os.path.join(REPO_ROOT, "UI_SELENIUM"))
+from utils import PYMOL_SCRIPTS_DIR  # puts PYMOL_SCRIPTS on the import path
+
+from batch_progress import BatchProgress
+from file_namer import MethodType
+from file_staging import FileStaging
+from pipeline_config import PipelineConfig
+from pipeline_logging import PipelineLogging
+from run_profiler import RunProfiler
+from service_latency import ServiceLatency
+from stage_timer import StageTimer
+
+logger = logging.getLogger(__name__)
+
+# Stages in pipeline order: the 4 predictions, staging of their output into PM_INPUT (data_to_pm_input.py),
+# consensus and PyMol scripts (pm_main.py)
+STAGES = ("pupp", "p2rk", "cspf", "cvpl", "stage", "consensus", "pymol")
+PREDICTIONS = {method.value: method for method in MethodType}
+# Stages reading or writing the data lake of each config section (config.ini, pm_config.ini)
+DATA_LAKE_STAGES = {
+    "selenium": ("pupp", "p2rk", "cspf", "cvpl", "stage"),
+    "visualization": ("stage", "consensus", "pymol"),
+}
+
+
+def parse_stages(value: str) -> list[str]:
+    stages = [stage.strip() for stage in value.split(",") if stage.strip()]
+    unknown = [stage for stage in stages if stage not in STAGES]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown stage(s) {', '.join(unknown)}, allowed: {', '.join(STAGES)}")
+    # Always run in pipeline order, whatever the order given
+    return [stage for stage in STAGES if stage in stages]
+
+
+class PipelineRun:
+    """
+    One run of the pipeline in a single process, the replacement of main_pipeline_post_alphafold_predictions.ps1
+    (run_pacupp.bash, run_prankweb.bash, main.py, data_to_pm_input.py -c, pm_main.py).
+    The config is loaded (PipelineConfig) and the input pdbs listed once, a stage hands its results over to
+    the next ones:
+
+        pupp / p2rk     the folders the local tools wrote to, read by the processing of their output
+                        (set as pacupp_python_feedup / prankweb_local_output of the config)
+        stage           the staged ORs, their pdbs and missing methods (verify_and_copy), kept in staged:
+                        the consensus and pymol stages process only these ORs of PM_INPUT
+        consensus       the applied cavity masks and the ConsensusResult per OR, the pymol stage
+                        writes the scripts from them instead of reading the consensus workbooks again
+
+    Modules are imported by the stages needing them (Selenium, pandas, ... only when they run).
+    """
+
+    def __init__(self, args: argparse.Namespace, config: PipelineConfig):
+        self.args = args
+        self.config = config
+        self.staged: dict | None = None
+        self.final_cavities = None
+        self.consensus_results = None
+
+    @cached_property
+    def pdb_files(self) -> list[str]:
+        """The input pdbs, listed before the stage stage moves them to PM_INPUT"""
+        import main as predictions
+
+        input_dir = self.config.selenium.input_dir
+        pdb_files = sorted(predictions.get_pdb_files(input_dir))
+        if not pdb_files:
+            logger.warning(f"No input .pdb files found in {input_dir}, no new cavity residues files are expected")
+        return pdb_files
+
+    @cached_property
+    def cavity_masks(self):
+        import pm_main
+
+        return pm_main.load_cavity_masks(self.config.visualization.use_cavities)
+
+    def run_predictions(self, stages: list[str]) -> None:
+        """The selected predictions as main.py runs them: PACUPP and P2Rank for all pdbs, then CASTpFold and
+        CavityPlus per pdb, in one batch progress"""
+        import main as predictions
+        from local_predictors import run_p2rank, run_pacupp
+
+        config = self.config.selenium
+        methods = [PREDICTIONS[stage] for stage in stages]
+        pdb_files = self.pdb_files
+        pdb_paths = [os.path.join(config.input_dir, pdb_file) for pdb_file in pdb_files]
+        if MethodType.CSPF in methods or MethodType.CVPL in methods:
+            ServiceLatency.configure(config.latency_histograms, self.config.performance.timeout_factor)
+        run_tools = bool(pdb_files) and not self.args.skip_tools
+
+        with BatchProgress("predictions", len(pdb_files) * len(methods), "predictions") as progress:
+            if MethodType.PUPP in methods:
+                if run_tools:
+                    config.pacupp_python_feedup = run_pacupp(pdb_paths, config)
+                predictions.run_batch_method_stage(
+                    pdb_files, MethodType.PUPP,
+                    lambda: predictions.prediction(MethodType.PUPP)(config.pacupp_python_feedup, config),
+                    config, progress)
+            if MethodType.P2RK in methods:
+                if run_tools:
+                    config.prankweb_local_output = run_p2rank(pdb_paths, config)
+                predictions.run_batch_method_stage(
+                    pdb_files, MethodType.P2RK, lambda: predictions.prediction(MethodType.P2RK)(pdb_files, config),
+                    config, progress)
+            for pdb_file in pdb_files:
+                for method in (MethodType.CSPF, MethodType.CVPL):
+                    if method in methods:
+                        logger.info(f"Starting {method.value} for {pdb_file}")
+                        predictions.run_method_stage(pdb_file, method, predictions.prediction(method), config, progress)
+
+    def run_stage(self) -> None:
+        """
+        Prediction outputs and pdbs staged into PM_INPUT (data_to_pm_input.py -c). With --no-clean or --update the
+        existing OR folders are kept and only changed files are staged (data_to_pm_input.py -u, by mtime unless
+        --update hash), so the consensus and pymol stages can skip the unchanged ORs.
+        """
+        import data_to_pm_input
+
+        selenium, visualization = self.config.selenium, self.config.visualization
+        update = self.args.update or ("mtime" if self.args.no_clean else None)
+        self.staged = data_to_pm_input.verify_and_copy(
+            selenium.input_dir, selenium.output_dir, visualization.pm_input_dir,
+            clean_before_copy=update is None, save_after_copy=self.args.save_after_copy,
+            staging_mode=self.args.link_mode or visualization.staging_mode, update=update, lake_db=self.config.lake_db)
+        logger.info(f"Staged {len(self.staged['ors'])} ORs into {visualization.pm_input_dir}")
+
+    @property
+    def staged_ors(self) -> list[str] | None:
+        """The ORs staged in this run, None (all ORs of PM_INPUT) if the stage stage did not run"""
+        return self.staged["ors"] if self.staged is not None else None
+
+    def run_consensus(self) -> None:
+        import pm_main
+
+        self.final_cavities, self.consensus_results = pm_main.build_consensus(
+            self.config, self.cavity_masks, consensus_method=self.args.consensus_method, force=self.args.force,
+            fact_table=not self.args.no_fact_table, or_names=self.staged_ors)
+
+    def run_pymol(self) -> None:
+        import pm_main
+
+        final_cavities = self.final_cavities if self.consensus_results is not None else self.cavity_masks
+        pm_main.prepare_scripts(self.config, final_cavities, self.consensus_results, self.args.session_mode,
+                                self.args.force, or_names=self.staged_ors)
+        if self.args.render:
+            from pymol_batch_renderer import PymolBatchRenderer
+
+            workers = self.args.render_workers
+            if workers is None:
+                workers = self.config.performance.render_workers
+            PymolBatchRenderer.render_output_folder(self.config.visualization.pm_output_dir, workers,
+                                                    self.args.render_png, self.args.force)
+
+    def run(self, stages: list[str]) -> bool:
+        """Runs the stages in order, stops at the first failing one (the later ones depend on it), False then"""
+        # The predictions make up one step, like main.py
+        steps = []
+        for stage in stages:
+            if stage in PREDICTIONS:
+                if not steps or steps[-1][0] != "predictions":
+                    steps.append(("predictions", []))
+                steps[-1][1].append(stage)
+            else:
+                steps.append((stage, None))
+
+        runners = {"stage": self.run_stage, "consensus": self.run_consensus, "pymol": self.run_pymol}
+        with BatchProgress("pipeline", len(steps), "stages") as progress:
+            for step, predictions in steps:
+                logger.info(f"Pipeline stage {step}" + (f" ({', '.join(predictions)})" if predictions else "")
+                            + f" at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", extra={'color': '\033[36m'})
+                try:
+                    with progress.job(step), StageTimer.span(f"pipeline_{step}"):
+                        if predictions:
+                            self.run_predictions(predictions)
+                        else:
+                            runners[step]()
+                except Exception as e:
+                    logger.critical(f"Pipeline stage {step} failed, the later stages are not run: "
+                                    f"{type(e).__name__}: {e}", exc_info=True)
+                    progress.finish("aborted")
+                    return False
+        return True
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        prog="cavity_pipeline.py",
+        description="Cavity pipeline in one process: predictions, staging into PM_INPUT, consensus and PyMol scripts")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    run_parser = subparsers.add_parser("run", help="Run pipeline stages")
+    run_parser.add_argument(
+        "--stages",
+        type=parse_stages,
+        default=list(STAGES),
+        help=f"Comma separated stages to run, in pipeline order (default: {','.join(STAGES)})"
+    )
+    run_parser.add_argument(
+        "--skip-tools",
+        action="store_true",
+        help="pupp / p2rk only process the existing PACUPP and P2Rank output, Jmol and P2Rank are not run"
+    )
+    run_parser.add_argument(
+        "--no-clean",
+        action="store_true",
+        help="stage: do not clean PM_INPUT before copying, keep the OR folders and stage only changed files "
+             "(data_to_pm_input.py -u mtime)"
+    )
+    run_parser.add_argument(
+        "-u", "--update",
+        choices=list(FileStaging.COMPARE),
+        default=None,
+        help="stage: like --no-clean, changed files compared by size and mtime, or by content hash"
+    )
+    run_parser.add_argument(
+        "-s", "--save-after-copy",
+        action="store_true",
+        help="stage: always copy the input PDB files instead of moving them"
+    )
+    run_parser.add_argument(
+        "-l", "--link-mode",
+        choices=list(FileStaging.MODES),
+        default=None,
+        help="stage: how files are staged (auto, reflink, hardlink, copy), default is staging_mode of pm_config.ini"
+    )
+    run_parser.add_argument(
+        "-m", "--consensus-method",
+        type=int,
+        choices=[1, 2],
+        default=1,
+        help="consensus: consensus method, default is 1"
+    )
+    run_parser.add_argument(
+        "-f", "--force",
+        action="store_true",
+        help="consensus / pymol: rebuild all ORs, even if their inputs did not change since the last run"
+    )
+    run_parser.add_argument(
+        "--no-fact-table",
+        action="store_true",
+        help="consensus: do not append this run's consensus rows to the cross-OR fact table"
+    )
+    run_parser.add_argument(
+        "--session-mode",
+        choices=["per_method", "per_or"],
+        default=None,
+        help="pymol: per_method or per_or sessions, default is pymol_session_mode of pm_config.ini"
+    )
+    run_parser.add_argument(
+        "--render",
+        action="store_true",
+        help="pymol: render the scripts headlessly into .pse sessions (needs pymol2)"
+    )
+    run_parser.add_argument(
+        "--render-workers",
+        type=int,
+        default=None,
+        help="pymol: number of PyMOL worker processes for --render, default is performance.workers of pm_config.ini"
+    )
+    run_parser.add_argument(
+        "--render-png",
+        action="store_true",
+        help="pymol: with --render, also ray trace a .png image for every script"
+    )
+    PipelineConfig.add_arguments(run_parser)
+    RunProfiler.add_arguments(run_parser)
+    args = parser.parse_args()
+
+    timestamp = datetime.now().strftime("%y%m%d_%H%M")
+    log_dir = os.path.join(REPO_ROOT, "logs")
+    PipelineLogging.setup(log_dir, f"cavity_pipeline_{timestamp}")
+    StageTimer.configure(log_dir, f"cavity_pipeline_{timestamp}")
+    BatchProgress.configure(log_dir, f"cavity_pipeline_{timestamp}")
+    logger.info(f"Starting cavity pipeline, stages: {', '.join(args.stages)}")
+    data_lakes = tuple(section for section, stages in DATA_LAKE_STAGES.items() if set(stages) & set(args.stages))
+    config = PipelineConfig.load(args.config_overrides, data_lakes)
+
+    with RunProfiler.profile(args.profile, log_dir, "cavity_pipeline", args.profile_top, StageTimer):
+        succeeded = PipelineRun(args, config).run(args.stages)
+
+    StageTimer.log_summary()
+    ServiceLatency.log_report()
+    logger.info(f"End of cavity pipeline ({'completed' if succeeded else 'failed'}) at "
+                f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    return 0 if succeeded else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
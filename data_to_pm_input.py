@@ -1,51 +1,55 @@
 import argparse
-import configparser
 from datetime import datetime
 import logging
 import os
 import shutil
+import sys
+import time
 
-from UI_SELENIUM.methods_summary import get_methods_summary
+# The modules of UI_SELENIUM and PYMOL_SCRIPTS are imported flat, see UI_SELENIUM/utils.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "UI_SELENIUM"))
+from utils import PYMOL_SCRIPTS_DIR  # puts PYMOL_SCRIPTS on the import path
+
+from file_staging import FileStaging
+from methods_summary import get_methods_summary
+from output_inventory import build_inventory
+from pipeline_config import PipelineConfig
+from pipeline_logging import PipelineLogging
+from run_manifest import RunManifest
+from run_profiler import RunProfiler
 
 # Set a logger for this very script
 logger = logging.getLogger(__name__)
 
-# Color formatting class for console output
-class ColorFormatter(logging.Formatter):
-    COLORS = {
-        logging.DEBUG: "\033[37m",     # Gray
-        logging.INFO: "\033[0m",       # Default
-        logging.WARNING: "\033[33m",   # Yellow
-        logging.ERROR: "\033[31m",     # Red
-        logging.CRITICAL: "\033[41m",  # Red background
-    }
-
-    RESET = "\033[0m"
-
-    def format(self, record):
-        color = self.COLORS.get(record.levelno, self.RESET)
-
-        if record.levelno >= logging.WARNING:
-            msg = f"{record.levelname}: {record.getMessage()}"
-        else:
-            msg = record.getMessage()
-
-        return f"{color}{msg}{self.RESET}"
-# End of ColorFormatter class
-
-
 
 def verify_and_copy(
     selenium_input_dir: str,
     selenium_output_dir: str,
     pymol_input_dir: str,
     clean_before_copy: bool = False,
-    save_after_copy: bool = False
-) -> None:
+    save_after_copy: bool = False,
+    staging_mode: str = "auto",
+    update: str | None = None,
+    lake_db: str | None = None,
+    inventory: dict | None = None
+) -> dict:
     """
     Verify XLSX outputs per OR_NAME (case-insensitive) and copy
     OR_NAME folders and PDB files into the PyMOL input directory.
+
+    Files are staged by reflinks / hard links where possible (staging_mode, see FileStaging).
+    update ('mtime' or 'hash'): only changed files are staged and the existing OR_NAME folders are kept,
+    otherwise every OR_NAME folder is replaced. OR_NAMEs whose run manifest records them as staged and unchanged
+    (RunManifest.staged_unchanged) are not compared file by file.
+    lake_db: SQLite data lake file, the staged OR_NAMEs (tables and PDB) are imported into it as well.
+    inventory: index of selenium_output_dir (output_inventory.build_inventory), built here if not given.
+
+    Returns the staged OR_NAMEs, their staged PDB paths and the missing methods per OR_NAME:
+        {"ors": [...], "pdb_paths": {or_name: path}, "missing_methods": {or_name: [method, ...]}}
     """
+    staging = FileStaging(staging_mode, compare=update)
+    started = datetime.now()
+    start = time.perf_counter()
 
     # ------------------------------------------------------------------
     # Sanity checks
@@ -96,40 +100,48 @@ def verify_and_copy(
     # ------------------------------------------------------------------
     parent_dir = os.path.dirname(pymol_input_dir)
 
+    # The output tree is scanned once, the index serves both the summary and the copy
+    if inventory is None:
+        inventory = build_inventory(selenium_output_dir)
+
     missing_dict = get_methods_summary(
         selenium_output_dir=selenium_output_dir,
-        data_lake_dir=parent_dir
+        data_lake_dir=parent_dir,
+        inventory=inventory
     )
 
     # ------------------------------------------------------------------
     # Collect OR_NAME directories
     # ------------------------------------------------------------------
-    or_names = [
-        name
-        for name in os.listdir(selenium_output_dir)
-        if name != "OLD_DATA"
-        and os.path.isdir(os.path.join(selenium_output_dir, name))
-    ]
+    or_names = list(inventory["ors"])
 
     # ------------------------------------------------------------------
     # Copy OR_NAME directories
     # ------------------------------------------------------------------
+    unchanged_ors = 0
     for or_name in or_names:
         src_dir = os.path.join(selenium_output_dir, or_name)
         dst_dir = os.path.join(pymol_input_dir, or_name)
 
-        if os.path.exists(dst_dir):
+        if update is not None and RunManifest.staged_unchanged(src_dir, dst_dir, inventory["ors"][or_name]["files"]):
+            unchanged_ors += 1
+            continue
+
+        if os.path.exists(dst_dir) and update is None:
             logger.info(
                 f"+++++ Directory already exists and will be overwritten: "
                 f"{dst_dir}"
             )
             shutil.rmtree(dst_dir)
 
-        shutil.copytree(src_dir, dst_dir)
+        # The run manifest is merged (not staged): the PM_INPUT copy gets its own stages
+        staging.stage_tree(src_dir, dst_dir, exclude=(RunManifest.MANIFEST_NAME,),
+                           files=inventory["ors"][or_name]["files"])
 
     # ------------------------------------------------------------------
     # Move {OR_NAME}.pdb
     # ------------------------------------------------------------------
+    pdb_paths = {}
     for or_name in or_names:
         pdb_found = next(
             (
@@ -159,7 +171,7 @@ def verify_and_copy(
         )
 
         if save_after_copy:
-            shutil.copy2(source_path, dest_path)
+            staging.stage_file(source_path, dest_path)
 
             logger.info(
                 f"Copied PDB file (save-after-copy enabled): "
@@ -168,7 +180,7 @@ def verify_and_copy(
 
         else:
             if or_name in missing_dict:
-                shutil.copy2(source_path, dest_path)
+                staging.stage_file(source_path, dest_path)
 
                 logger.warning(
                     f"PDB file copied but not moved for OR_NAME='{or_name}' "
@@ -181,6 +193,36 @@ def verify_and_copy(
                     f"Moved PDB file: {pdb_found} to {dest_path}"
                 )
 
+        pdb_paths[or_name] = dest_path
+
+    # ------------------------------------------------------------------
+    # Run manifests: Selenium records + staging stage + staged pdb
+    # ------------------------------------------------------------------
+    stage = RunManifest.stage_record(started, time.perf_counter() - start, staging_mode=staging_mode, update=update)
+    for or_name in or_names:
+        src_dir = os.path.join(selenium_output_dir, or_name)
+        dst_dir = os.path.join(pymol_input_dir, or_name)
+        pdb_record = None
+        if or_name in pdb_paths:
+            known = RunManifest.known_record(RunManifest.read(src_dir), pdb_paths[or_name])
+            pdb_record = RunManifest.file_record(pdb_paths[or_name], known)
+        RunManifest.merge_from(src_dir, dst_dir,
+                               stages={"data_to_pm_input": {**stage, "missing_methods": missing_dict.get(or_name)}},
+                               pdb=pdb_record)
+
+    logger.info(f"Staging to {pymol_input_dir} ({staging_mode}): {staging.summary()}"
+                + (f", {unchanged_ors} OR_NAMEs unchanged according to their run manifests" if unchanged_ors else ""))
+
+    if lake_db:
+        # pandas (of the lake repository) is only needed here
+        from lake_repository import FolderLakeRepository, SqliteLakeRepository, transfer
+
+        with SqliteLakeRepository(lake_db) as database:
+            counts = transfer(FolderLakeRepository(pymol_input_dir), database, or_names)
+        logger.info(f"Imported {len(or_names)} OR_NAMEs into {lake_db}: "
+                    f"{counts['written']} tables written, {counts['unchanged']} unchanged")
+
+    return {"ors": or_names, "pdb_paths": pdb_paths, "missing_methods": missing_dict}
 
 
 def main() -> None:
@@ -192,44 +234,10 @@ def main() -> None:
     log_dir = f"{script_dir}/logs"
     os.makedirs(log_dir, exist_ok=True)
 
-    handler = logging.StreamHandler()
-    handler.setFormatter(ColorFormatter())
-
-    file_handler = logging.FileHandler(f"{log_dir}/log_data_to_pm_{timestamp}.log")
-    file_handler.setFormatter(
-        logging.Formatter("%(asctime)s %(levelname)s: %(message)s")
-    )
-
-    logging.basicConfig(
-        level=logging.INFO,
-        handlers=[
-             handler, file_handler
-        ]
-    )
-    # end of logger settings
+    PipelineLogging.setup(log_dir, f"log_data_to_pm_{timestamp}")
 
     script_dir = os.path.dirname(os.path.abspath(__file__))  # folder of this very script
     logger.info(f"\n!!!!!! Script Data_to_PM_INPUT running at directory: {script_dir} !!!! ")
-    selenium_config = configparser.ConfigParser()
-    selenium_config_path = os.path.join(script_dir, "UI_SELENIUM/config.ini")
-    selenium_config.read(selenium_config_path, encoding="utf-8")
-
-    pymoll_config = configparser.ConfigParser()
-    pymoll_config_path = os.path.join(script_dir, "PYMOL_SCRIPTS/pm_config.ini")
-    pymoll_config.read(pymoll_config_path, encoding="utf-8")
-
-    data_lake_dir = os.path.join("UI_SELENIUM", selenium_config['DEFAULT']['data_lake_dir'])
-    data_lake_dir2 = os.path.join("PYMOL_SCRIPTS", pymoll_config['visualization']['data_lake_dir'])
-
-    selenium_input_dir = os.path.join(data_lake_dir, selenium_config['DEFAULT']['input_dir'])
-    selenium_output_dir = os.path.join(data_lake_dir, selenium_config['DEFAULT']['output_dir'])
-
-    pymol_input_dir = os.path.join(data_lake_dir2, pymoll_config['visualization']['pm_input_dir'])
-
-    logger.info("\n\n===============================================================================================")
-    logger.info(f"Starting verification and copying: \n {selenium_input_dir}, {selenium_output_dir} -> {pymol_input_dir} completed")
-    logger.info("===============================================================================================\n\n")
-
     parser = argparse.ArgumentParser(
         description="Prepare PyMOL input data from Selenium pipeline output"
     )
@@ -245,15 +253,51 @@ def main() -> None:
         help="Always copy PDB files instead of moving them"
     )
 
+    parser.add_argument(
+        "-l", "--link-mode",
+        choices=list(FileStaging.MODES),
+        default=None,
+        help="How files are staged: auto (reflink, else hard link, else copy), reflink, hardlink or copy, "
+             "default is staging_mode of pm_config.ini"
+    )
+    parser.add_argument(
+        "-u", "--update",
+        choices=list(FileStaging.COMPARE),
+        default=None,
+        help="Stage only changed files (compared by size and mtime, or by content hash), keep existing OR folders"
+    )
+
+    parser.add_argument(
+        "--lake-db",
+        default=None,
+        help="SQLite data lake file (in the data lake) to import the staged ORs into, default is lake_db of pm_config.ini"
+    )
+    PipelineConfig.add_arguments(parser)
+    # Handled by RunProfiler.run() (see __main__), listed here for the help and the argument check
+    RunProfiler.add_arguments(parser)
+
     args = parser.parse_args()
     clean_before = args.clean_before_copy
     save_after = args.save_after_copy
 
+    config = PipelineConfig.load(args.config_overrides)
+    selenium_input_dir = config.selenium.input_dir
+    selenium_output_dir = config.selenium.output_dir
+    pymol_input_dir = config.visualization.pm_input_dir
+
+    logger.info("\n\n===============================================================================================")
+    logger.info(f"Starting verification and copying: \n {selenium_input_dir}, {selenium_output_dir} -> {pymol_input_dir} completed")
+    logger.info("===============================================================================================\n\n")
+
+    lake_db = os.path.join(config.visualization.data_lake_dir, args.lake_db) if args.lake_db else config.lake_db
     verify_and_copy(selenium_input_dir, selenium_output_dir, pymol_input_dir,
-                    clean_before_copy=clean_before, save_after_copy=save_after)
+                    clean_before_copy=clean_before, save_after_copy=save_after,
+                    staging_mode=args.link_mode or config.visualization.staging_mode, update=args.update,
+                    lake_db=lake_db)
     logger.info("===============================================================================================")
     logger.info(f"Verify and copy from {selenium_input_dir}, {selenium_output_dir} -> {pymol_input_dir} completed")
     logger.info("===============================================================================================")
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    # --profile cpu|mem runs main() under cProfile / tracemalloc, the reports go to the logs folder
+    RunProfiler.run(main, os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs"), "data_to_pm_input")
\ No newline at end of file
@@ -1,37 +1,20 @@
 import argparse
-import configparser
 from datetime import datetime
 import logging
 import os
 import shutil
-from UI_SELENIUM.file_namer import MethodType
+import sys
 
-# Set a logger for this very script
-logger = logging.getLogger(__name__)
-
-# Color formatting class for console output
-class ColorFormatter(logging.Formatter):
-    COLORS = {
-        logging.DEBUG: "\033[37m",     # Gray
-        logging.INFO: "\033[0m",       # Default
-        logging.WARNING: "\033[33m",   # Yellow
-        logging.ERROR: "\033[31m",     # Red
-        logging.CRITICAL: "\033[41m",  # Red background
-    }
-
-    RESET = "\033[0m"
+# The modules of UI_SELENIUM and PYMOL_SCRIPTS are imported flat, see UI_SELENIUM/utils.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "UI_SELENIUM"))
+from utils import PYMOL_SCRIPTS_DIR  # puts PYMOL_SCRIPTS on the import path
 
-    def format(self, record):
-        color = self.COLORS.get(record.levelno, self.RESET)
-
-        if record.levelno >= logging.WARNING:
-            msg = f"{record.levelname}: {record.getMessage()}"
-        else:
-            msg = record.getMessage()
-
-        return f"{color}{msg}{self.RESET}"
-# End of ColorFormatter class
+from file_namer import MethodType
+from pipeline_config import PipelineConfig
+from pipeline_logging import PipelineLogging
 
+# Set a logger for this very script
+logger = logging.getLogger(__name__)
 
 
 def verify_and_copy(
@@ -190,44 +173,10 @@ def main() -> None:
     log_dir = f"{script_dir}/logs"
     os.makedirs(log_dir, exist_ok=True)
 
-    handler = logging.StreamHandler()
-    handler.setFormatter(ColorFormatter())
-
-    file_handler = logging.FileHandler(f"{log_dir}/log_data_to_pm_{timestamp}.log")
-    file_handler.setFormatter(
-        logging.Formatter("%(asctime)s %(levelname)s: %(message)s")
-    )
-
-    logging.basicConfig(
-        level=logging.INFO,
-        handlers=[
-             handler, file_handler
-        ]
-    )
-    # end of logger settings
+    PipelineLogging.setup(log_dir, f"log_data_to_pm_{timestamp}")
 
     script_dir = os.path.dirname(os.path.abspath(__file__))  # folder of this very script
     logger.info(f"\n!!!!!! Script Data_to_PM_INPUT running at directory: {script_dir} !!!! ")
-    selenium_config = configparser.ConfigParser()
-    selenium_config_path = os.path.join(script_dir, "UI_SELENIUM/config.ini")
-    selenium_config.read(selenium_config_path, encoding="utf-8")
-
-    pymoll_config = configparser.ConfigParser()
-    pymoll_config_path = os.path.join(script_dir, "PYMOL_SCRIPTS/pm_config.ini")
-    pymoll_config.read(pymoll_config_path, encoding="utf-8")
-
-    data_lake_dir = os.path.join("UI_SELENIUM", selenium_config['DEFAULT']['data_lake_dir'])
-    data_lake_dir2 = os.path.join("PYMOL_SCRIPTS", pymoll_config['visualization']['data_lake_dir'])
-
-    selenium_input_dir = os.path.join(data_lake_dir, selenium_config['DEFAULT']['input_dir'])
-    selenium_output_dir = os.path.join(data_lake_dir, selenium_config['DEFAULT']['output_dir'])
-
-    pymol_input_dir = os.path.join(data_lake_dir2, pymoll_config['visualization']['pm_input_dir'])
-
-    logger.info("\n\n===============================================================================================")
-    logger.info(f"Starting verification and copying: \n {selenium_input_dir}, {selenium_output_dir} -> {pymol_input_dir} completed")
-    logger.info("===============================================================================================\n\n")
-
     parser = argparse.ArgumentParser(
         description="Prepare PyMOL input data from Selenium pipeline output"
     )
@@ -237,10 +186,20 @@ def main() -> None:
         action="store_true",
         help="Clean pymol_input_dir before copying"
     )
+    PipelineConfig.add_arguments(parser)
 
     args = parser.parse_args()
     clean_before = args.clean_before_copy
 
+    config = PipelineConfig.load(args.config_overrides)
+    selenium_input_dir = config.selenium.input_dir
+    selenium_output_dir = config.selenium.output_dir
+    pymol_input_dir = config.visualization.pm_input_dir
+
+    logger.info("\n\n===============================================================================================")
+    logger.info(f"Starting verification and copying: \n {selenium_input_dir}, {selenium_output_dir} -> {pymol_input_dir} completed")
+    logger.info("===============================================================================================\n\n")
+
     verify_and_copy(selenium_input_dir, selenium_output_dir, pymol_input_dir,
                     clean_before_copy=clean_before)
     logger.info("===============================================================================================")
@@ -28,7 +28,7 @@ if ($LASTEXITCODE -ne 0) {
     exit 1
 }
 
-python -m UI_SELENIUM.methods_summary
+python .\UI_SELENIUM\methods_summary.py
 Write-Output "4 predictions .ps1 script completed"
 
 
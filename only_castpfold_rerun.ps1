@@ -21,7 +21,7 @@ if ($LASTEXITCODE -ne 0) {
     exit 1
 }
 
-#python -m UI_SELENIUM.methods_summary
+#python .\UI_SELENIUM\methods_summary.py
 python data_to_pm_input.py -c
 Write-Output "only castpfold plus .ps1 script completed"
 